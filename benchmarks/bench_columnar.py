@@ -0,0 +1,82 @@
+"""
+Row-by-row vs columnar normalization of list results.
+
+Starts from the text values MySQL sends over the wire and times the whole
+client-side path of a list endpoint: the driver decoding each cell (Decimal for
+DECIMAL columns on the DictCursor path, float for the DOUBLE-cast columns of
+the tuple path), then normalize_keys / calculate_total / format_response_nested
+per row vs DespesaFrame. No database is needed.
+
+    python -m benchmarks.bench_columnar                 # 10k, 100k, 1M rows
+    python -m benchmarks.bench_columnar --rows 10000 50000 --repeat 1
+"""
+import argparse
+import random
+import time
+from decimal import Decimal
+from typing import Callable, List, Optional
+
+from database.columnar import DespesaFrame
+from database.connection_db import normalize_keys_list
+from database.constants import MESES
+
+DICT_KEYS = ['ID', 'DESPESA'] + [mes.upper() for mes in MESES] + ['TOTAL']
+
+def make_wire_rows(n: int, seed: int = 42) -> List[List[Optional[str]]]:
+    """Rows as (id, despesa, 12 months, total) text cells, ~10% NULL months."""
+    rng = random.Random(seed)
+    rows = []
+    for i in range(n):
+        months = [None if rng.random() < 0.1 else f"{rng.uniform(0, 5000):.2f}" for _ in MESES]
+        total = f"{sum(float(v) for v in months if v is not None):.2f}"
+        rows.append([str(i + 1), f"Despesa {i}", *months, total])
+    return rows
+
+def row_by_row(wire_rows):
+    dict_rows = [
+        dict(zip(DICT_KEYS, [int(r[0]), r[1]] + [None if v is None else Decimal(v) for v in r[2:]]))
+        for r in wire_rows
+    ]
+    return normalize_keys_list(dict_rows)
+
+def columnar(wire_rows):
+    tuple_rows = [
+        (int(r[0]), r[1], *[None if v is None else float(v) for v in r[2:14]])
+        for r in wire_rows
+    ]
+    return DespesaFrame.from_tuples(tuple_rows).to_nested()
+
+def best_of(func: Callable[[], object], repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Row-by-row vs columnar normalization of list results.")
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    print(f"{'rows':>10} {'row-by-row':>12} {'columnar':>12} {'speedup':>8} {'monthly totals':>15}")
+    for n in args.rows:
+        wire_rows = make_wire_rows(n)
+
+        # Both paths must produce the same response before timing them
+        sample = wire_rows[:1000]
+        assert [r['annual_total'] for r in row_by_row(sample)] == [r['annual_total'] for r in columnar(sample)]
+
+        row_time = best_of(lambda: row_by_row(wire_rows), args.repeat)
+        frame_time = best_of(lambda: columnar(wire_rows), args.repeat)
+
+        # Aggregates over an already-loaded frame vs summing per row in Python
+        frame = DespesaFrame.from_tuples([(0, '', *[None if v is None else float(v) for v in r[2:14]]) for r in wire_rows])
+        agg_time = best_of(frame.monthly_totals, args.repeat)
+
+        print(f"{n:>10} {row_time:>11.3f}s {frame_time:>11.3f}s {row_time / frame_time:>7.1f}x {agg_time * 1000:>13.1f}ms")
+    return 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,88 @@
+"""
+Per-value vs column currency parsing.
+
+Compares the per-cell str.replace chain + try/except that calculate_total used
+with parse_brl_column on one column of spreadsheet-style cells. Two inputs:
+"sheet" repeats amounts the way a budget sheet does (blanks, "R$ -" cells and a
+few thousand distinct values), "distinct" has a different amount in every cell.
+
+    python -m benchmarks.bench_currency                 # 1M cells
+    python -m benchmarks.bench_currency --cells 100000 --repeat 1
+"""
+import argparse
+import random
+import time
+from decimal import Decimal
+from typing import Any, Callable, List, Optional
+
+from database.currency import parse_brl_column
+
+def legacy_parse(values: List[Any]) -> List[float]:
+    """The per-value branch calculate_total ran for every cell before database.currency."""
+    results = []
+    for valor in values:
+        if valor is not None:
+            if isinstance(valor, Decimal):
+                results.append(float(valor))
+            elif isinstance(valor, str):
+                try:
+                    clean_valor = valor.replace('R$', '').replace(' ', '').replace('.', '').replace(',', '.')
+                    if not clean_valor:
+                        results.append(0.0)
+                        continue
+                    results.append(float(clean_valor))
+                except ValueError:
+                    results.append(0.0)
+            else:
+                results.append(float(valor))
+        else:
+            results.append(0.0)
+    return results
+
+def brl(amount: float) -> str:
+    integer, cents = f"{amount:.2f}".split('.')
+    return f" R$ {int(integer):,}".replace(',', '.') + f",{cents} "
+
+def make_cells(n: int, distinct: bool, seed: int = 42) -> List[Optional[str]]:
+    rng = random.Random(seed)
+    pool = [brl(rng.uniform(1, 20000)) for _ in range(5000)]
+    cells = []
+    for _ in range(n):
+        roll = rng.random()
+        if roll < 0.15:
+            cells.append('')
+        elif roll < 0.20:
+            cells.append(' R$ -   ')
+        else:
+            cells.append(brl(rng.uniform(1, 20000)) if distinct else rng.choice(pool))
+    return cells
+
+def best_of(func: Callable[[], object], repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Per-value vs column currency parsing.")
+    parser.add_argument('--cells', type=int, default=1_000_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    print(f"{'input':>10} {'cells':>10} {'per-value':>11} {'column':>11} {'speedup':>8}")
+    for label, distinct in (('sheet', False), ('distinct', True)):
+        cells = make_cells(args.cells, distinct)
+
+        # Same numbers on input both paths understand ("R$ -" is an error in the old path, 0 in the new one)
+        parsed, errors = parse_brl_column(cells, blank=0.0)
+        assert not errors and parsed == legacy_parse(cells)
+
+        legacy_time = best_of(lambda: legacy_parse(cells), args.repeat)
+        column_time = best_of(lambda: parse_brl_column(cells, blank=0.0), args.repeat)
+        print(f"{label:>10} {args.cells:>10} {legacy_time:>10.3f}s {column_time:>10.3f}s {legacy_time / column_time:>7.1f}x")
+    return 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,252 @@
+"""
+Micro-benchmarks of the per-row data-shaping functions, with a regression gate.
+
+Cases: calculate_total (Decimal months and the messy BRL strings of
+planilha_financeira_banco.csv), normalize_keys, format_response_nested,
+normalize_keys_list, the CSV row mapping of the import (map_csv_rows) and the
+export row builder (export_rows written through csv.writer). Inputs are
+synthetic and seeded, so every run sees the same rows. The BRL cells are drawn
+from the spreadsheet's own month cells (" R$ 1.248,81 ", " R$ -   ", blanks) plus
+generated ones in the same format.
+
+For every case and size it reports rows per second (best of the timed rounds)
+and, from extra untimed calls, the peak bytes allocated during a call (tracemalloc)
+and the memory blocks its result holds, per row. No database is needed.
+
+Throughput is also stored relative to a reference loop (`reference_loop`: fixed
+dict, Decimal and str work of the same kind, never edited), which takes the
+machine's speed out of the comparison. Each of the --repeat rounds times the case
+for at least MIN_LOOP_SECONDS and then the reference for as long, with the garbage
+collector off, and the median of the per-round ratios is kept: short rounds
+interleave finely, so a load spike hits a few pairs instead of a whole case and
+the median drops them. --save-baseline stores the results; later runs compare
+against that file and exit with status 1 when a case's relative throughput drops
+more than --threshold, or it allocates more than --threshold above the baseline.
+The absolute rows/s are reported but not gated, so a baseline recorded on one
+machine holds on another.
+
+    python -m benchmarks.bench_hotpaths                            # compare with benchmarks/baselines/hotpaths.json
+    python -m benchmarks.bench_hotpaths --save-baseline            # record a new baseline
+    python -m benchmarks.bench_hotpaths --sizes 100 --threshold 0.1 --json
+"""
+import argparse
+import csv
+import gc
+import io
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from database.batch_operations import CSV_IMPORT_MAPPING, export_rows, map_csv_rows
+from database.connection_db import calculate_total, format_response_nested, normalize_keys, normalize_keys_list
+from database.constants import MESES
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(HERE, 'baselines', 'hotpaths.json')
+SPREADSHEET = os.path.join(os.path.dirname(HERE), 'planilha_financeira_banco.csv')
+
+# Short on purpose: many short rounds cancel load swings better than a few long ones
+MIN_LOOP_SECONDS = 0.02
+REFERENCE_ROWS = 1_000
+CSV_HEADERS = list(CSV_IMPORT_MAPPING)
+
+def spreadsheet_cells() -> List[str]:
+    """Every month cell of the sample spreadsheet, as written (padding, "R$ -", blanks)."""
+    with open(SPREADSHEET, newline='', encoding='utf-8') as f:
+        return [row[mes.upper()] for row in csv.DictReader(f) for mes in MESES]
+
+def brl(amount: float) -> str:
+    integer, cents = f"{amount:.2f}".split('.')
+    return f" R$ {int(integer):,}".replace(',', '.') + f",{cents} "
+
+class Inputs:
+    """Seeded synthetic rows in each shape the hot paths receive."""
+
+    def __init__(self, n: int, seed: int = 42):
+        rng = random.Random(seed)
+        sheet = spreadsheet_cells()
+        self.n = n
+        # DictCursor rows: upper-case keys, Decimal months, ~10% NULL
+        self.db_rows = []
+        # The same rows with BRL text months, as the spreadsheet holds them
+        self.brl_rows = []
+        # Tuples from the export's server-side cursor
+        self.tuples = []
+        # csv.DictReader rows of an import file
+        self.csv_rows = []
+        for i in range(n):
+            amounts = [None if rng.random() < 0.1 else round(rng.uniform(0, 5000), 2) for _ in MESES]
+            months = {mes.upper(): None if a is None else Decimal(f"{a:.2f}") for mes, a in zip(MESES, amounts)}
+            self.db_rows.append({'ID': i + 1, 'DESPESA': f"Despesa {i}", **months})
+            texts = [rng.choice(sheet) if rng.random() < 0.5 else ('' if a is None else brl(a)) for a in amounts]
+            self.brl_rows.append({'id': i + 1, 'despesa': f"Despesa {i}", **dict(zip(MESES, texts))})
+            self.tuples.append((i + 1, f"Despesa {i}", *[None if a is None else Decimal(f"{a:.2f}") for a in amounts]))
+            self.csv_rows.append(dict(zip(CSV_HEADERS, [f"Despesa {i}"] + texts)))
+        self.lower_rows = [normalize_keys(row) for row in self.db_rows]
+
+def write_export(rows) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(export_rows(rows))
+    return buffer.getvalue()
+
+# name -> builds the zero-argument call for a given input set
+CASES: Dict[str, Callable[[Inputs], Callable[[], Any]]] = {
+    "calculate_total[decimal]": lambda d: lambda: [calculate_total(r) for r in d.lower_rows],
+    "calculate_total[brl]": lambda d: lambda: [calculate_total(r) for r in d.brl_rows],
+    "normalize_keys": lambda d: lambda: [normalize_keys(r) for r in d.db_rows],
+    "format_response_nested": lambda d: lambda: [format_response_nested(r) for r in d.lower_rows],
+    "normalize_keys_list": lambda d: lambda: normalize_keys_list(d.db_rows),
+    "map_csv_rows": lambda d: lambda: map_csv_rows(d.csv_rows),
+    "export_rows": lambda d: lambda: write_export(d.tuples),
+}
+
+def reference_loop(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    The yardstick for the machine's speed: fixed pure-Python work of the kind the
+    cases do (dict reads and builds, Decimal to float, str methods). Do not change
+    it, or recorded baselines no longer compare.
+    """
+    out = []
+    for row in rows:
+        shaped = {}
+        for key, value in row.items():
+            shaped[key.lower()] = float(value) if isinstance(value, Decimal) else value
+        shaped['label'] = str(shaped['despesa']).strip().upper()
+        out.append(shaped)
+    return out
+
+def _timed_loop(call: Callable[[], Any], min_seconds: float) -> Tuple[float, float]:
+    """(seconds per call, seconds the loop took), calling until at least `min_seconds` went by."""
+    loops = 0
+    start = time.perf_counter()
+    while True:
+        call()
+        loops += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_seconds:
+            return elapsed / loops, elapsed
+
+def rows_per_second(call: Callable[[], Any], n: int, repeat: int, reference: Callable[[], Any]) -> Tuple[float, float]:
+    """
+    (best rows/s of `call`, its speed relative to the reference loop). Each of the
+    `repeat` rounds times the case and then the reference for as long, so both see
+    the same machine load and clock speed; the relative speed is the median of the
+    per-round ratios.
+    """
+    best = float('inf')
+    ratios = []
+    for _ in range(repeat):
+        gc.collect()
+        gc.disable()
+        try:
+            seconds, elapsed = _timed_loop(call, MIN_LOOP_SECONDS)
+            reference_seconds, _ = _timed_loop(reference, elapsed)
+        finally:
+            gc.enable()
+        best = min(best, seconds)
+        ratios.append((n / seconds) / (REFERENCE_ROWS / reference_seconds))
+    return n / best, statistics.median(ratios)
+
+def allocations(call: Callable[[], Any], n: int) -> Tuple[float, float]:
+    """(peak bytes allocated during a call, memory blocks held by its result) per row."""
+    blocks_before = sys.getallocatedblocks()
+    result = call()
+    blocks = sys.getallocatedblocks() - blocks_before
+    del result
+    tracemalloc.start()
+    call()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / n, blocks / n
+
+def run(sizes: List[int], repeat: int, only: Optional[List[str]] = None) -> Dict[str, Dict[str, float]]:
+    reference_rows = Inputs(REFERENCE_ROWS).db_rows
+    reference = lambda: reference_loop(reference_rows)
+    results = {}
+    for n in sizes:
+        inputs = Inputs(n)
+        for name, build in CASES.items():
+            if only and name not in only:
+                continue
+            call = build(inputs)
+            call()
+            peak, blocks = allocations(call, n)
+            speed, relative = rows_per_second(call, n, repeat, reference)
+            results[f"{name}@{n}"] = {
+                "rows_per_sec": round(speed, 1),
+                "relative_speed": round(relative, 4),
+                "peak_bytes_per_row": round(peak, 1),
+                "result_blocks_per_row": round(blocks, 2),
+            }
+    return results
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]], threshold: float) -> List[str]:
+    regressions = []
+    for key, current in results.items():
+        base = baseline.get(key)
+        if not base:
+            continue
+        if current["relative_speed"] < base["relative_speed"] * (1 - threshold):
+            regressions.append(
+                f"{key}: {current['relative_speed']:.3f}x the reference loop vs baseline {base['relative_speed']:.3f}x"
+            )
+        # A few bytes of noise on tiny inputs are not a regression
+        if current["peak_bytes_per_row"] > base["peak_bytes_per_row"] * (1 + threshold) + 64:
+            regressions.append(f"{key}: {current['peak_bytes_per_row']:.0f} B/row peak vs baseline {base['peak_bytes_per_row']:.0f}")
+    return regressions
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Micro-benchmarks of the per-row data-shaping hot paths.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 1_000, 10_000], help="Rows per call")
+    parser.add_argument('--repeat', type=int, default=21, help="Timed rounds per case (the median ratio is kept)")
+    parser.add_argument('--case', action='append', choices=list(CASES), help="Only these cases (repeatable)")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true', help="Write the results as the new baseline")
+    parser.add_argument('--threshold', type=float, default=0.25, help="Allowed loss of throughput / growth of allocations")
+    parser.add_argument('--json', action='store_true', help="Print the results as JSON")
+    args = parser.parse_args(argv)
+
+    results = run(args.sizes, args.repeat, args.case)
+    baseline: Dict[str, Dict[str, float]] = {}
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+
+    if args.json:
+        print(json.dumps({"results": results}, indent=2))
+    else:
+        print(f"{'case':<36} {'rows/s':>12} {'x ref':>8} {'vs base':>8} {'peak B/row':>11} {'blocks/row':>11}")
+        for key, r in results.items():
+            base = baseline.get(key)
+            delta = f"{r['relative_speed'] / base['relative_speed'] - 1:+.0%}" if base else '-'
+            print(f"{key:<36} {r['rows_per_sec']:>12,.0f} {r['relative_speed']:>8.3f} {delta:>8} "
+                  f"{r['peak_bytes_per_row']:>11,.0f} {r['result_blocks_per_row']:>11.2f}")
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, 'w') as f:
+            json.dump({"python": sys.version.split()[0], "results": results}, f, indent=2)
+            f.write('\n')
+        print(f"Baseline written to {args.baseline}", file=sys.stderr)
+        return 0
+
+    if not baseline:
+        print(f"No baseline at {args.baseline}; run with --save-baseline first.", file=sys.stderr)
+        return 0
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print(f"FAIL: {len(regressions)} regression(s) beyond {args.threshold:.0%}:", file=sys.stderr)
+        for line in regressions:
+            print(f"    {line}", file=sys.stderr)
+        return 1
+    print(f"OK: no case regressed beyond {args.threshold:.0%} of the baseline.", file=sys.stderr)
+    return 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
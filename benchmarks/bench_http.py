@@ -0,0 +1,359 @@
+"""
+End-to-end HTTP load test of the API against a throwaway local MySQL.
+
+Starts a private mysqld (fresh datadir in a temp directory, loopback port) unless
+--server points at an existing disposable one, runs the app under uvicorn
+against it, seeds --rows despesas and --users users through the API itself (so
+the summary, history and checkpoints are built the way production builds them),
+then drives a weighted mix of requests from --concurrency clients for
+--duration seconds. Prints, or writes to --output, one JSON document with p50,
+p95, p99, max latency, throughput and errors per endpoint, and the run
+configuration, so runs can be diffed.
+
+Needs MySQL 8 (mysqld on PATH, or --mysqld), uvicorn and httpx.
+
+    python -m benchmarks.bench_http                                   # 10k rows, 16 clients, 30 s
+    python -m benchmarks.bench_http --rows 50000 --concurrency 64 --duration 60 --output run.json
+    python -m benchmarks.bench_http --mix list=5,filter=3,login=1 --workers 4
+    python -m benchmarks.bench_http --server 127.0.0.1:3307 --wipe   # reuse a disposable server
+
+Workloads (--mix name=weight,...): list, filter, batch_update, import, export,
+analytics, login.
+"""
+import argparse
+import asyncio
+import csv
+import getpass
+import io
+import json
+import math
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import ExitStack
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import httpx
+import pymysql
+
+from database.constants import MESES
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_MIX = "list=30,filter=20,batch_update=15,analytics=15,login=10,import=5,export=5"
+USER_PASSWORD = "benchmark-password"
+CSV_HEADERS = ['Despesa', 'Jan', 'Fev', 'Mar', 'Abr', 'Mai', 'Jun', 'Jul', 'Ago', 'Set', 'Out', 'Nov', 'Dez']
+SEED_CHUNK = 500
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def wait_until(check: Callable[[], bool], timeout: float, what: str) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if check():
+                return
+        except Exception:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Timed out waiting for {what}")
+
+# --- local database -------------------------------------------------------
+
+class LocalMySQL:
+    """A mysqld with its own datadir under a temp directory, removed on stop()."""
+
+    def __init__(self, mysqld: str):
+        self.mysqld = mysqld
+        self.tmpdir = tempfile.mkdtemp(prefix="bench-mysql-")
+        self.datadir = os.path.join(self.tmpdir, 'data')
+        self.port = free_port()
+        self.process: Optional[subprocess.Popen] = None
+
+    def _base_args(self) -> List[str]:
+        return [self.mysqld, '--no-defaults', f'--datadir={self.datadir}', f'--user={getpass.getuser()}']
+
+    def start(self) -> Dict[str, str]:
+        subprocess.run(self._base_args() + ['--initialize-insecure'], check=True, capture_output=True)
+        self.process = subprocess.Popen(
+            self._base_args() + [
+                f'--port={self.port}', '--bind-address=127.0.0.1', '--mysqlx=OFF',
+                f'--socket={os.path.join(self.tmpdir, "mysqld.sock")}',
+                f'--pid-file={os.path.join(self.tmpdir, "mysqld.pid")}',
+                f'--log-error={os.path.join(self.tmpdir, "error.log")}',
+            ],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        wait_until(self._ping, 60, "mysqld to accept connections")
+        return {'DB_HOST': '127.0.0.1', 'DB_PORT': str(self.port), 'DB_USER': 'root', 'DB_PASSWORD': ''}
+
+    def _ping(self) -> bool:
+        pymysql.connect(host='127.0.0.1', port=self.port, user='root', password='').close()
+        return True
+
+    def stop(self) -> None:
+        if self.process is not None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+def prepare_schema(db_env: Dict[str, str]) -> None:
+    """(Re)creates an empty finacias database; the app's init_db creates the tables."""
+    connection = pymysql.connect(
+        host=db_env['DB_HOST'], port=int(db_env['DB_PORT']), user=db_env['DB_USER'], password=db_env['DB_PASSWORD']
+    )
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("DROP DATABASE IF EXISTS finacias")
+            cursor.execute("CREATE DATABASE IF NOT EXISTS finacias CHARACTER SET utf8mb4")
+        connection.commit()
+    finally:
+        connection.close()
+
+# --- app under test -------------------------------------------------------
+
+def start_app(db_env: Dict[str, str], workers: int, extra_env: Dict[str, str]) -> Tuple[subprocess.Popen, str]:
+    port = free_port()
+    env = {**os.environ, **db_env, 'DB_NAME': 'finacias', 'DB_CHARSET': 'utf8mb4', **extra_env}
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'main:app', '--host', '127.0.0.1', '--port', str(port),
+         '--workers', str(workers), '--log-level', 'warning', '--no-access-log'],
+        cwd=REPO_ROOT, env=env,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    wait_until(lambda: httpx.get(f"{base_url}/metrics", timeout=2).status_code == 200, 120, "the app to start")
+    return process, base_url
+
+def stop_app(process: subprocess.Popen) -> None:
+    process.terminate()
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+# --- synthetic data -------------------------------------------------------
+
+def make_despesa(rng: random.Random, i: int) -> Dict[str, Any]:
+    row = {"despesa": f"Despesa {rng.choice(['Aluguel', 'Mercado', 'Luz', 'Internet', 'Escola', 'Saude'])} {i}"}
+    row.update({mes: None if rng.random() < 0.1 else round(rng.uniform(0, 5000), 2) for mes in MESES})
+    return row
+
+def brl(amount: float) -> str:
+    integer, cents = f"{amount:.2f}".split('.')
+    return f"R$ {int(integer):,}".replace(',', '.') + f",{cents}"
+
+def make_csv(rng: random.Random, rows: int) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_HEADERS)
+    for i in range(rows):
+        writer.writerow([f"Importada {i}"] + ['' if rng.random() < 0.1 else brl(rng.uniform(0, 5000)) for _ in MESES])
+    return buffer.getvalue().encode('utf-8')
+
+def seed(base_url: str, rows: int, users: int, seed_value: int) -> Dict[str, Any]:
+    rng = random.Random(seed_value)
+    start = time.perf_counter()
+    ids: List[int] = []
+    with httpx.Client(base_url=base_url, timeout=120) as client:
+        for offset in range(0, rows, SEED_CHUNK):
+            batch = [make_despesa(rng, i) for i in range(offset, min(rows, offset + SEED_CHUNK))]
+            response = client.post("/despesas/batch/create", json=batch)
+            response.raise_for_status()
+            ids.extend(row["id"] for row in response.json())
+        emails = []
+        for i in range(users):
+            email = f"bench{i}@example.com"
+            response = client.post("/users", json={"username": f"bench{i}", "email": email, "password": USER_PASSWORD})
+            if response.status_code not in (201, 400):
+                response.raise_for_status()
+            emails.append(email)
+    return {"ids": ids, "emails": emails, "seconds": round(time.perf_counter() - start, 3)}
+
+# --- workloads ------------------------------------------------------------
+
+Workload = Callable[[httpx.AsyncClient, random.Random, Dict[str, Any]], Awaitable[httpx.Response]]
+
+async def op_list(client, rng, state):
+    return await client.get("/despesas", params={"limit": 100})
+
+async def op_filter(client, rng, state):
+    params = rng.choice([
+        {"min_total": rng.randint(0, 30000)},
+        {"month": rng.choice(MESES), "min_val": rng.randint(0, 2500), "max_val": rng.randint(2500, 5000)},
+        {"despesa_like": rng.choice(['Aluguel', 'Mercado', 'Luz', 'Internet'])},
+    ])
+    return await client.get("/despesas/filter", params={**params, "limit": 100})
+
+async def op_batch_update(client, rng, state):
+    updates = [{"id": rng.choice(state["ids"]), rng.choice(MESES): round(rng.uniform(0, 5000), 2)} for _ in range(20)]
+    return await client.post("/despesas/batch/update", json={"updates": updates})
+
+async def op_import(client, rng, state):
+    return await client.post("/despesas/import/csv", files={"file": ("bench.csv", make_csv(rng, 50), "text/csv")})
+
+async def op_export(client, rng, state):
+    return await client.get("/despesas/export/csv")
+
+async def op_analytics(client, rng, state):
+    path = rng.choice(["/despesas/analytics/monthly", "/despesas/analytics/top", "/despesas/analytics/trends"])
+    return await client.get(path)
+
+async def op_login(client, rng, state):
+    return await client.post("/login", json={"email": rng.choice(state["emails"]), "password": USER_PASSWORD})
+
+WORKLOADS: Dict[str, Workload] = {
+    "list": op_list,
+    "filter": op_filter,
+    "batch_update": op_batch_update,
+    "import": op_import,
+    "export": op_export,
+    "analytics": op_analytics,
+    "login": op_login,
+}
+
+def parse_mix(text: str) -> Dict[str, float]:
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in WORKLOADS:
+            raise ValueError(f"Unknown workload '{name}'; choose from {', '.join(WORKLOADS)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+async def drive(base_url: str, state: Dict[str, Any], mix: Dict[str, float], concurrency: int,
+                duration: float, warmup: float, seed_value: int) -> Dict[str, Any]:
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    samples: Dict[str, List[float]] = {name: [] for name in names}
+    errors: Dict[str, Dict[str, int]] = {name: {} for name in names}
+    measure_from = time.perf_counter() + warmup
+    stop_at = measure_from + duration
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+        async def client_loop(index: int) -> None:
+            rng = random.Random(seed_value * 1000 + index)
+            while True:
+                started = time.perf_counter()
+                if started >= stop_at:
+                    return
+                name = rng.choices(names, weights)[0]
+                try:
+                    response = await WORKLOADS[name](client, rng, state)
+                    await response.aread()
+                    outcome = None if response.status_code < 400 else str(response.status_code)
+                except httpx.HTTPError as e:
+                    outcome = type(e).__name__
+                if started < measure_from:
+                    continue
+                if outcome is None:
+                    samples[name].append(time.perf_counter() - started)
+                else:
+                    errors[name][outcome] = errors[name].get(outcome, 0) + 1
+
+        await asyncio.gather(*(client_loop(i) for i in range(concurrency)))
+
+    endpoints = {}
+    for name in names:
+        latencies = sorted(samples[name])
+        endpoints[name] = {
+            "requests": len(latencies),
+            "errors": errors[name],
+            "throughput_rps": round(len(latencies) / duration, 2),
+            "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3) if latencies else 0.0,
+            "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+            "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+            "max_ms": round(latencies[-1] * 1000, 3) if latencies else 0.0,
+        }
+    total = sum(e["requests"] for e in endpoints.values())
+    return {
+        "endpoints": endpoints,
+        "total": {
+            "requests": total,
+            "errors": sum(sum(e.values()) for e in errors.values()),
+            "throughput_rps": round(total / duration, 2),
+        },
+    }
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="End-to-end HTTP load test against a throwaway local MySQL.")
+    parser.add_argument('--rows', type=int, default=10_000, help="Despesas seeded before the run")
+    parser.add_argument('--users', type=int, default=20, help="Users seeded for the login workload")
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=30.0, help="Measured seconds")
+    parser.add_argument('--warmup', type=float, default=5.0, help="Seconds of load before measuring")
+    parser.add_argument('--mix', default=DEFAULT_MIX, help="Workload weights, e.g. list=3,login=1")
+    parser.add_argument('--workers', type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--bcrypt-rounds', type=int, default=None, help="BCRYPT_ROUNDS for the app (default: the app's)")
+    parser.add_argument('--mysqld', default=shutil.which('mysqld'), help="mysqld binary for the throwaway server")
+    parser.add_argument('--server', help="host:port of an existing disposable MySQL (user root, empty password)")
+    parser.add_argument('--wipe', action='store_true', help="Required with --server: drops and recreates finacias")
+    parser.add_argument('--output', help="Write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    mix = parse_mix(args.mix)
+    extra_env = {"BCRYPT_ROUNDS": str(args.bcrypt_rounds)} if args.bcrypt_rounds else {}
+
+    with ExitStack() as stack:
+        if args.server:
+            if not args.wipe:
+                parser.error("--server drops the finacias database; pass --wipe to confirm")
+            host, _, port = args.server.partition(':')
+            db_env = {'DB_HOST': host, 'DB_PORT': port or '3306', 'DB_USER': 'root', 'DB_PASSWORD': ''}
+        else:
+            if not args.mysqld:
+                parser.error("mysqld not found on PATH; pass --mysqld or --server")
+            server = LocalMySQL(args.mysqld)
+            stack.callback(server.stop)
+            print(f"Starting a throwaway mysqld on port {server.port}...", file=sys.stderr)
+            db_env = server.start()
+        prepare_schema(db_env)
+
+        process, base_url = start_app(db_env, args.workers, extra_env)
+        stack.callback(stop_app, process)
+
+        print(f"Seeding {args.rows} despesas and {args.users} users...", file=sys.stderr)
+        state = seed(base_url, args.rows, args.users, args.seed)
+        print(f"Driving {args.concurrency} clients for {args.duration:g}s (+{args.warmup:g}s warmup)...", file=sys.stderr)
+        result = asyncio.run(drive(base_url, state, mix, args.concurrency, args.duration, args.warmup, args.seed))
+
+    report = {
+        "config": {
+            "rows": args.rows, "users": args.users, "concurrency": args.concurrency,
+            "duration_s": args.duration, "warmup_s": args.warmup, "workers": args.workers,
+            "mix": mix, "seed": args.seed, "bcrypt_rounds": args.bcrypt_rounds,
+        },
+        "seed_seconds": state["seconds"],
+        **result,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
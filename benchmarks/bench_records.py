@@ -0,0 +1,96 @@
+"""
+Memory of a listing request: dict rows vs compact DespesaRecords.
+
+"before" is the old path: DictCursor rows (Decimal months) -> normalize_keys ->
+format_response_nested -> DespesaResponseNested validation -> JSON. "after" is
+tuple rows (DOUBLE months) -> DespesaFrame -> DespesaRecord -> dump_records (orjson).
+For each it reports the memory held per row once the listing is built, the
+Python objects allocated per row (live blocks) and the peak traced memory of
+the whole request. No database is needed.
+
+    python -m benchmarks.bench_records                  # 10k and 100k rows
+    python -m benchmarks.bench_records --rows 50000
+"""
+import argparse
+import gc
+import json
+import random
+import sys
+import time
+import tracemalloc
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, Optional
+
+from pydantic import TypeAdapter
+
+from database.columnar import frame_to_records
+from database.connection_db import normalize_keys_list
+from database.constants import MESES
+from database.records import dump_records
+from models.schemas import DespesaResponseNested
+
+DICT_KEYS = ['ID', 'DESPESA'] + [mes.upper() for mes in MESES] + ['TOTAL']
+RESPONSE_ADAPTER = TypeAdapter(List[DespesaResponseNested])
+
+def make_rows(n: int, seed: int = 42):
+    rng = random.Random(seed)
+    dict_rows, tuple_rows = [], []
+    for i in range(n):
+        months = [None if rng.random() < 0.1 else round(rng.uniform(0, 5000), 2) for _ in MESES]
+        total = round(sum(v for v in months if v is not None), 2)
+        name = f"Despesa {i}"
+        dict_rows.append(dict(zip(DICT_KEYS, [i + 1, name] + [None if v is None else Decimal(str(v)) for v in months] + [Decimal(str(total))])))
+        tuple_rows.append((i + 1, name, *months))
+    return dict_rows, tuple_rows
+
+def build_before(dict_rows):
+    return RESPONSE_ADAPTER.validate_python(normalize_keys_list(dict_rows))
+
+def serialize_before(models) -> str:
+    return json.dumps(RESPONSE_ADAPTER.dump_python(models, mode='json'), ensure_ascii=False, separators=(',', ':'))
+
+def build_after(tuple_rows):
+    return frame_to_records(tuple_rows)
+
+def measure(build: Callable[[Any], Any], serialize: Callable[[Any], Any], source, n: int) -> Dict[str, float]:
+    gc.collect()
+    blocks_before = sys.getallocatedblocks()
+    tracemalloc.start()
+    start = time.perf_counter()
+    listing = build(source)
+    held, _ = tracemalloc.get_traced_memory()
+    blocks_held = sys.getallocatedblocks() - blocks_before
+    body = serialize(listing)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del listing, body
+    return {
+        "bytes_per_row": held / n,
+        "objects_per_row": blocks_held / n,
+        "peak_mib": peak / 2 ** 20,
+        "seconds": elapsed,
+    }
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Memory of a listing request: dict rows vs compact DespesaRecords.")
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000])
+    args = parser.parse_args(argv)
+
+    print(f"{'rows':>8} {'path':>7} {'bytes/row':>10} {'objects/row':>12} {'peak MiB':>9} {'time':>8}")
+    for n in args.rows:
+        dict_rows, tuple_rows = make_rows(n)
+        sample = dict_rows[:100], tuple_rows[:100]
+        assert json.loads(serialize_before(build_before(sample[0]))) == json.loads(dump_records(build_after(sample[1])))
+
+        for label, build, serialize, source in (
+            ('before', build_before, serialize_before, dict_rows),
+            ('after', build_after, dump_records, tuple_rows),
+        ):
+            result = measure(build, serialize, source, n)
+            print(f"{n:>8} {label:>7} {result['bytes_per_row']:>10.0f} {result['objects_per_row']:>12.1f} "
+                  f"{result['peak_mib']:>9.1f} {result['seconds']:>7.2f}s")
+    return 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,122 @@
+"""
+Awaitable versions of the data-access functions used by the `async def` routes.
+
+pymysql is blocking, so each call runs on a bounded thread pool instead of the
+event loop. The executor is sized to the connection pool (DB_POOL_MAX_SIZE) by
+default, so queued calls wait for a thread rather than for a connection.
+"""
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, BinaryIO, Callable, Dict, List, Optional, Tuple, TypeVar
+
+from database import batch_operations, connection_db
+from database.records import DespesaRecord
+
+T = TypeVar('T')
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                max_workers = int(os.getenv('DB_EXECUTOR_MAX_WORKERS', os.getenv('DB_POOL_MAX_SIZE', '10')))
+                _executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="db-executor")
+    return _executor
+
+def shutdown_executor() -> None:
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+            _executor = None
+
+async def run_in_db(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Runs a blocking data-access call on the DB executor and awaits its result."""
+    loop = asyncio.get_running_loop()
+    # Carries the request's context variables (per-request query stats) onto the executor thread
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(get_executor(), context.run, functools.partial(func, *args, **kwargs))
+
+# Module attributes are looked up at call time so the wrappers always hit the current implementation.
+
+async def get_all_despesas() -> List[DespesaRecord]:
+    return await run_in_db(connection_db.get_all_despesas)
+
+async def batch_update_despessas(updates: List[Dict[str, Any]], user_id: Optional[int] = None) -> List[DespesaRecord]:
+    return await run_in_db(batch_operations.batch_update_despessas, updates, user_id)
+
+async def batch_delete_despessas(ids: List[int]) -> int:
+    return await run_in_db(batch_operations.batch_delete_despessas, ids)
+
+async def batch_create_despessas(despessas: List[Dict[str, Any]], chunk_size: Optional[int] = None) -> List[DespesaRecord]:
+    return await run_in_db(batch_operations.batch_create_despessas, despessas, chunk_size)
+
+async def import_despesas_csv(binary_file: BinaryIO, chunk_size: Optional[int] = None, on_error: str = "skip_row") -> Dict[str, Any]:
+    return await run_in_db(batch_operations.import_despesas_csv, binary_file, chunk_size, on_error)
+
+async def calculate_column_sum(column: str) -> float:
+    return await run_in_db(batch_operations.calculate_column_sum, column)
+
+async def calculate_column_average(column: str) -> float:
+    return await run_in_db(batch_operations.calculate_column_average, column)
+
+async def apply_excel_formula(target_id: int, target_month: str, formula: str, value: float, user_id: Optional[int] = None) -> Dict[str, Any]:
+    return await run_in_db(batch_operations.apply_excel_formula, target_id, target_month, formula, value, user_id)
+
+async def apply_range_formula(
+    months: List[str], formula: str, value: float, ids: Optional[List[int]] = None,
+    filters: Optional[Dict[str, Any]] = None, user_id: Optional[int] = None
+) -> List[DespesaRecord]:
+    return await run_in_db(batch_operations.apply_range_formula, months, formula, value, ids, filters, user_id)
+
+async def get_despesa_history(
+    despesa_id: int, field: Optional[str] = None, limit: Optional[int] = None, cursor_token: Optional[str] = None
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    return await run_in_db(batch_operations.get_despesa_history, despesa_id, field, limit, cursor_token)
+
+async def revert_cell_value(despesa_id: int, field: str, version_id: int, user_id: Optional[int] = None) -> Dict[str, Any]:
+    return await run_in_db(batch_operations.revert_cell_value, despesa_id, field, version_id, user_id)
+
+async def get_despesas_as_of(at: datetime, ids: Optional[List[int]] = None) -> List[DespesaRecord]:
+    return await run_in_db(batch_operations.get_despesas_as_of, at, ids)
+
+async def restore_despesas_as_of(at: datetime, ids: Optional[List[int]] = None, user_id: Optional[int] = None) -> Dict[str, Any]:
+    return await run_in_db(batch_operations.restore_despesas_as_of, at, ids, user_id)
+
+async def create_checkpoint() -> Dict[str, Any]:
+    return await run_in_db(batch_operations.create_checkpoint)
+
+async def get_checkpoints() -> List[Dict[str, Any]]:
+    return await run_in_db(batch_operations.get_checkpoints)
+
+async def get_monthly_analytics() -> Dict[str, float]:
+    return await run_in_db(batch_operations.get_monthly_analytics)
+
+async def get_top_expenses(limit: int = 10) -> List[DespesaRecord]:
+    return await run_in_db(batch_operations.get_top_expenses, limit)
+
+async def paginate_expenses(
+    order_by: str = 'id',
+    direction: str = 'asc',
+    limit: Optional[int] = None,
+    cursor_token: Optional[str] = None,
+    filters: Optional[Dict[str, Any]] = None
+) -> Tuple[List[DespesaRecord], Optional[str]]:
+    return await run_in_db(batch_operations.paginate_expenses, order_by, direction, limit, cursor_token, filters)
+
+async def check_consistency(despesa_id: int) -> Dict[str, Any]:
+    return await run_in_db(batch_operations.check_consistency, despesa_id)
+
+async def detect_anomalies(despesa_id: int, threshold_percent: float = 200.0) -> List[Dict[str, Any]]:
+    return await run_in_db(batch_operations.detect_anomalies, despesa_id, threshold_percent)
+
+async def find_duplicates(name: str) -> List[Dict[str, Any]]:
+    return await run_in_db(batch_operations.find_duplicates, name)
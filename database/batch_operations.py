@@ -1,13 +1,28 @@
-from functools import lru_cache
-from database.connection_db import get_connection, calculate_total, normalize_keys, format_response_nested
-from typing import List, Dict, Any, Optional
-from decimal import Decimal
+import csv
+import io
+import os
+import pymysql.cursors
+from database.connection_db import get_connection, calculate_total, normalize_keys, format_response_nested, to_cents
+from database.cache import cached, bump_table_version
+from database.constants import MESES
+from database.monthly_summary import apply_summary_delta, read_summary, SUMMARY_COLUMNS
+from database.pagination import SORTABLE_COLUMNS, clamp_page_size, decode_cursor, encode_cursor, keyset_clause
+from database.search import normalize_term, relevance_keyset_clause, relevance_select, search_clause
+from database.columnar import FRAME_SELECT_SQL, frame_to_records
+from database.currency import parse_brl_column
+from database.records import DespesaRecord
+from database.storage import get_storage
+from database.history import history_page
+from database.snapshots import (
+    created_entries, deleted_entries, list_checkpoints, log_history, state_as_of, take_checkpoint
+)
+from models.schemas import DespesaCreate
+from typing import List, Dict, Any, BinaryIO, Iterable, Iterator, Optional, Sequence, Tuple
+from datetime import datetime
+from decimal import Decimal, ROUND_HALF_UP
 
 def clear_caches():
-    calculate_column_sum.cache_clear()
-    calculate_column_average.cache_clear()
-    get_monthly_analytics.cache_clear()
-    get_top_expenses.cache_clear()
+    bump_table_version()
 
 def log_change(cursor, despesa_id: int, field: str, old_value: Optional[float], new_value: Optional[float], user_id: Optional[int]):
     sql = """
@@ -16,54 +31,94 @@ def log_change(cursor, despesa_id: int, field: str, old_value: Optional[float],
     """
     cursor.execute(sql, (despesa_id, field, old_value, new_value, user_id))
 
-def batch_update_despessas(updates: List[Dict[str, Any]], user_id: Optional[int] = None) -> List[Dict[str, Any]]:
+def log_changes(cursor, changes: List[Tuple[int, str, Optional[float], Optional[float], Optional[int]]]):
+    """Writes many history rows with a single executemany (rewritten by pymysql into one multi-row INSERT)."""
+    log_history(cursor, changes)
+
+def _update_by_case(cursor, new_values: Dict[int, Dict[str, Any]]) -> None:
+    """One UPDATE for many rows: each touched column becomes a CASE over the ids."""
+    columns = list(dict.fromkeys(col for fields in new_values.values() for col in fields))
+    set_parts = []
+    params: List[Any] = []
+    for col in columns:
+        whens = []
+        for despesa_id, fields in new_values.items():
+            if col in fields:
+                whens.append("WHEN %s THEN %s")
+                params.extend([despesa_id, fields[col]])
+        set_parts.append(f"{col} = CASE id {' '.join(whens)} ELSE {col} END")
+
+    ids = list(new_values.keys())
+    id_placeholders = ', '.join(['%s'] * len(ids))
+    sql = f"UPDATE finacias.controle_financeira_teste SET {', '.join(set_parts)} WHERE id IN ({id_placeholders})"
+    cursor.execute(sql, params + ids)
+
+def batch_update_despessas(updates: List[Dict[str, Any]], user_id: Optional[int] = None) -> List[DespesaRecord]:
+    """
+    Set-based batch update: one locked prefetch of every target row, diffs and totals
+    computed in memory, one executemany for history and one CASE-based UPDATE; the
+    merged rows are returned without a re-read. Several items for the same id are
+    merged, later values winning.
+    """
+    pending: Dict[int, Dict[str, Any]] = {}
+    for item in updates:
+        despesa_id = item.get('id')
+        if not despesa_id:
+            continue
+        # Filter out None values and 'id'
+        update_fields = {k: to_cents(v) if k in MESES else v for k, v in item.items() if v is not None and k != 'id'}
+        if update_fields:
+            pending.setdefault(despesa_id, {}).update(update_fields)
+    if not pending:
+        return []
+
     connection = get_connection()
-    results = []
     try:
         with connection.cursor() as cursor:
-            for item in updates:
-                despesa_id = item.get('id')
-                if not despesa_id:
-                    continue
-                
-                # Fetch current values for history and total calculation
-                cursor.execute("SELECT * FROM finacias.controle_financeira_teste WHERE id = %s", (despesa_id,))
-                current = cursor.fetchone()
-                if not current:
-                    continue
-                
-                current = normalize_keys(current)
-                
-                # Filter out None values and 'id'
-                update_fields = {k: v for k, v in item.items() if v is not None and k != 'id'}
-                
-                if not update_fields:
+            ids = list(pending.keys())
+            placeholders = ', '.join(['%s'] * len(ids))
+
+            # Fetch current values for history and total calculation
+            cursor.execute(
+                f"SELECT * FROM finacias.controle_financeira_teste WHERE id IN ({placeholders}) FOR UPDATE", ids
+            )
+            # The raw rows are the summary's "before" image, as stored (total included)
+            raw_rows = {row['id']: row for row in cursor.fetchall()}
+            current_rows = {despesa_id: normalize_keys(row) for despesa_id, row in raw_rows.items()}
+
+            history = []
+            new_values: Dict[int, Dict[str, Any]] = {}
+            updated_records: Dict[int, Dict[str, Any]] = {}
+            for despesa_id, update_fields in pending.items():
+                current = current_rows.get(despesa_id)
+                if current is None:
                     continue
-                    
-                # Log history for each changed field
+
                 for field, new_val in update_fields.items():
                     old_val = current.get(field.lower())
                     if old_val != new_val:
-                        log_change(cursor, despesa_id, field, old_val, new_val, user_id)
-                
-                # Calculate new total
+                        history.append((despesa_id, field, old_val, new_val, user_id))
+
                 merged = current.copy()
                 merged.update(update_fields)
-                new_total = calculate_total(merged)
-                update_fields['total'] = new_total
-                
-                set_clause = ", ".join([f"{k} = %s" for k in update_fields.keys()])
-                sql = f"UPDATE finacias.controle_financeira_teste SET {set_clause} WHERE id = %s"
-                cursor.execute(sql, list(update_fields.values()) + [despesa_id])
-                
-                # Get updated record
-                cursor.execute("SELECT * FROM finacias.controle_financeira_teste WHERE id = %s", (despesa_id,))
-                updated_record = cursor.fetchone()
-                results.append(format_response_nested(normalize_keys(updated_record)))
-            
+                merged['total'] = calculate_total(merged)
+                new_values[despesa_id] = {**update_fields, 'total': merged['total']}
+                updated_records[despesa_id] = merged
+
+            if not new_values:
+                connection.commit()
+                return []
+
+            log_changes(cursor, history)
+
+            # One UPDATE for the whole batch
+            _update_by_case(cursor, new_values)
+            updated_ids = list(new_values.keys())
+
+            apply_summary_delta(cursor, [(raw_rows[i], updated_records[i]) for i in updated_ids])
             connection.commit()
             clear_caches()
-            return results
+            return [DespesaRecord.from_mapping(updated_records[i]) for i in updated_ids]
     except Exception as e:
         connection.rollback()
         raise e
@@ -75,53 +130,118 @@ def batch_delete_despessas(ids: List[int]) -> int:
     try:
         with connection.cursor() as cursor:
             placeholders = ', '.join(['%s'] * len(ids))
+            cursor.execute(
+                f"SELECT * FROM finacias.controle_financeira_teste WHERE id IN ({placeholders}) FOR UPDATE", ids
+            )
+            deleted_rows = cursor.fetchall()
+            
             sql = f"DELETE FROM finacias.controle_financeira_teste WHERE id IN ({placeholders})"
             cursor.execute(sql, ids)
+            deleted_count = cursor.rowcount
+            log_history(cursor, deleted_entries(deleted_rows))
+            apply_summary_delta(cursor, [(row, None) for row in deleted_rows])
             connection.commit()
             clear_caches()
-            return cursor.rowcount
+            return deleted_count
     except Exception as e:
         connection.rollback()
         raise e
     finally:
         connection.close()
 
-def batch_create_despessas(despessas: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+INSERT_COLUMNS = ['despesa'] + MESES + ['total']
+
+BULK_INSERT_CHUNK_SIZE = int(os.getenv('DB_BULK_INSERT_CHUNK_SIZE', '500'))
+
+def _read_back_block(cursor, first_id: int, chunk: List[Dict[str, Any]]) -> Optional[List[Dict[str, Any]]]:
+    """
+    The rows of a multi-row INSERT whose first id is first_id, or None when they are not
+    the expected block: ids are first_id, first_id + step, ... only when no concurrent
+    "bulk insert" interleaved its own ids (innodb_autoinc_lock_mode=2), so the rows found
+    must also be ours, in insertion order.
+    """
+    step = get_storage().insert_id_step(cursor)
+    ids = [first_id + index * step for index in range(len(chunk))]
+    cursor.execute(
+        f"SELECT * FROM finacias.controle_financeira_teste WHERE id IN ({', '.join(['%s'] * len(ids))}) ORDER BY id", ids
+    )
+    rows = cursor.fetchall()
+    if len(rows) != len(chunk) or any(row['despesa'] != data.get('despesa') for row, data in zip(rows, chunk)):
+        return None
+    return rows
+
+def _insert_one_by_one(cursor, sql: str, chunk_params: List[List[Any]]) -> List[Dict[str, Any]]:
+    """Fallback for servers that did not allocate one block: one INSERT per row, each with its own lastrowid."""
+    ids = []
+    for params in chunk_params:
+        cursor.execute(sql, params)
+        ids.append(cursor.lastrowid)
+    cursor.execute(
+        f"SELECT * FROM finacias.controle_financeira_teste WHERE id IN ({', '.join(['%s'] * len(ids))}) ORDER BY id", ids
+    )
+    return cursor.fetchall()
+
+def bulk_insert_despessas(despessas: List[Dict[str, Any]], chunk_size: Optional[int] = None) -> List[DespesaRecord]:
+    """
+    Inserts rows with one multi-row INSERT per chunk and reads each chunk back by the ids
+    the server allocated. When those ids are not one block (interleaved concurrent inserts)
+    the chunk is rolled back and inserted again row by row. Every chunk is its own
+    transaction: a failure rolls back the current chunk and re-raises, while chunks
+    committed before it are kept.
+    """
+    chunk_size = chunk_size or BULK_INSERT_CHUNK_SIZE
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be positive")
+
+    columns = ', '.join(INSERT_COLUMNS)
+    row_placeholders = '(' + ', '.join(['%s'] * len(INSERT_COLUMNS)) + ')'
+    single_row_sql = f"INSERT INTO finacias.controle_financeira_teste ({columns}) VALUES {row_placeholders}"
+
     connection = get_connection()
     results = []
     try:
         with connection.cursor() as cursor:
-            for data in despessas:
-                # Calculate total
-                data['total'] = calculate_total(data)
-                
-                insert_data = {k: v for k, v in data.items() 
-                              if k not in ['id', 'created_at', 'updated_at']}
-                
-                columns = ', '.join(insert_data.keys())
-                placeholders = ', '.join(['%s'] * len(insert_data))
-                sql = f"INSERT INTO finacias.controle_financeira_teste ({columns}) VALUES ({placeholders})"
-                cursor.execute(sql, list(insert_data.values()))
-                
-                despesa_id = cursor.lastrowid
-                cursor.execute("SELECT * FROM finacias.controle_financeira_teste WHERE id = %s", (despesa_id,))
-                result = cursor.fetchone()
-                results.append(format_response_nested(normalize_keys(result)))
-            
-            connection.commit()
-            clear_caches()
+            for start in range(0, len(despessas), chunk_size):
+                chunk = despessas[start:start + chunk_size]
+                chunk_params = []
+                for data in chunk:
+                    data['total'] = calculate_total(data)
+                    chunk_params.append([data.get(col) if col == 'despesa' else data.get(col, 0.0) for col in INSERT_COLUMNS])
+
+                sql = f"INSERT INTO finacias.controle_financeira_teste ({columns}) VALUES {', '.join([row_placeholders] * len(chunk))}"
+                try:
+                    cursor.execute(sql, [value for params in chunk_params for value in params])
+                    # lastrowid of a multi-row INSERT is the first id it allocated
+                    rows = _read_back_block(cursor, cursor.lastrowid, chunk)
+                    if rows is None:
+                        connection.rollback()
+                        rows = _insert_one_by_one(cursor, single_row_sql, chunk_params)
+                    log_history(cursor, created_entries(row['id'] for row in rows))
+                    apply_summary_delta(cursor, [(None, row) for row in rows])
+                    connection.commit()
+                except Exception:
+                    connection.rollback()
+                    raise
+
+                results.extend(DespesaRecord.from_mapping(normalize_keys(r)) for r in rows)
             return results
-    except Exception as e:
-        connection.rollback()
-        raise e
     finally:
+        if results:
+            clear_caches()
         connection.close()
 
-@lru_cache(maxsize=128)
+def batch_create_despessas(despessas: List[Dict[str, Any]], chunk_size: Optional[int] = None) -> List[DespesaRecord]:
+    return bulk_insert_despessas(despessas, chunk_size)
+
+@cached("calculate_column_sum")
 def calculate_column_sum(column: str) -> float:
     connection = get_connection()
     try:
         with connection.cursor() as cursor:
+            if column.lower() in SUMMARY_COLUMNS:
+                summary = read_summary(cursor, [column.lower()]).get(column.lower())
+                return float(summary['total_sum']) if summary and summary['total_sum'] else 0.0
+            
             sql = f"SELECT SUM({column}) as total FROM finacias.controle_financeira_teste"
             cursor.execute(sql)
             result = cursor.fetchone()
@@ -129,11 +249,17 @@ def calculate_column_sum(column: str) -> float:
     finally:
         connection.close()
 
-@lru_cache(maxsize=128)
+@cached("calculate_column_average")
 def calculate_column_average(column: str) -> float:
     connection = get_connection()
     try:
         with connection.cursor() as cursor:
+            if column.lower() in SUMMARY_COLUMNS:
+                summary = read_summary(cursor, [column.lower()]).get(column.lower())
+                if not summary or not summary['row_count'] or not summary['total_sum']:
+                    return 0.0
+                return float(summary['total_sum']) / summary['row_count']
+            
             sql = f"SELECT AVG({column}) as average FROM finacias.controle_financeira_teste"
             cursor.execute(sql)
             result = cursor.fetchone()
@@ -142,15 +268,17 @@ def calculate_column_average(column: str) -> float:
         connection.close()
 
 def apply_excel_formula(target_id: int, target_month: str, formula: str, value: float, user_id: Optional[int] = None) -> Dict[str, Any]:
+    """One locked read and one UPDATE of the cell and the total; the returned row is the locked one with the new values."""
     connection = get_connection()
     try:
         with connection.cursor() as cursor:
-            cursor.execute(f"SELECT {target_month}, total FROM finacias.controle_financeira_teste WHERE id = %s", (target_id,))
+            cursor.execute("SELECT * FROM finacias.controle_financeira_teste WHERE id = %s FOR UPDATE", (target_id,))
             current = cursor.fetchone()
             if not current:
                 raise ValueError("Despesa not found")
             
-            old_val = float(current[target_month]) if current[target_month] else 0.0
+            row = normalize_keys(current)
+            old_val = float(row[target_month]) if row[target_month] else 0.0
             new_val = old_val
             
             if formula == "multiply":
@@ -165,152 +293,427 @@ def apply_excel_formula(target_id: int, target_month: str, formula: str, value:
             elif formula == "percentage":
                 new_val = old_val * (value / 100)
             
-            # Update record
-            cursor.execute(f"UPDATE finacias.controle_financeira_teste SET {target_month} = %s WHERE id = %s", (new_val, target_id))
-            
-            # Recalculate total
-            cursor.execute("SELECT * FROM finacias.controle_financeira_teste WHERE id = %s", (target_id,))
-            full_record = normalize_keys(cursor.fetchone())
-            new_total = calculate_total(full_record)
-            cursor.execute("UPDATE finacias.controle_financeira_teste SET total = %s WHERE id = %s", (new_total, target_id))
+            row[target_month] = new_val = to_cents(new_val)
+            row['total'] = calculate_total(row)
+            cursor.execute(
+                f"UPDATE finacias.controle_financeira_teste SET {target_month} = %s, total = %s WHERE id = %s",
+                (new_val, row['total'], target_id)
+            )
             
             log_change(cursor, target_id, target_month, old_val, new_val, user_id)
+            apply_summary_delta(cursor, [(current, row)])
             
             connection.commit()
             clear_caches()
-            
-            cursor.execute("SELECT * FROM finacias.controle_financeira_teste WHERE id = %s", (target_id,))
-            return format_response_nested(normalize_keys(cursor.fetchone()))
+            return format_response_nested(row)
     except Exception as e:
         connection.rollback()
         raise e
     finally:
         connection.close()
 
-def get_despesa_history(despesa_id: int) -> List[Dict[str, Any]]:
+CENT = Decimal('0.01')
+# MySQL keeps 4 more decimal places than the DECIMAL(10, 2) dividend (div_precision_increment) before ROUND(..., 2)
+DIVISION_SCALE = Decimal('0.000001')
+
+def _formula_operator(formula: str, value: float) -> Tuple[str, Decimal]:
+    """The SQL operator and exact operand for a formula; percentage is a multiplication by value / 100."""
+    operand = Decimal(str(value))
+    if formula == "multiply":
+        return '*', operand
+    if formula == "divide":
+        if operand == 0:
+            raise ValueError("Division by zero")
+        return '/', operand
+    if formula == "add":
+        return '+', operand
+    if formula == "subtract":
+        return '-', operand
+    if formula == "percentage":
+        return '*', operand / 100
+    raise ValueError(f"Unknown formula: {formula}")
+
+def _apply_operator(old: Any, operator: str, operand: Decimal) -> float:
+    """The value `ROUND(COALESCE(col, 0) <operator> operand, 2)` gives in MySQL, computed in Python."""
+    old = Decimal(str(old)) if old is not None else Decimal('0')
+    if operator == '*':
+        result = old * operand
+    elif operator == '/':
+        result = (old / operand).quantize(DIVISION_SCALE, rounding=ROUND_HALF_UP)
+    elif operator == '+':
+        result = old + operand
+    else:
+        result = old - operand
+    return float(result.quantize(CENT, rounding=ROUND_HALF_UP))
+
+def apply_range_formula(
+    months: List[str],
+    formula: str,
+    value: float,
+    ids: Optional[List[int]] = None,
+    filters: Optional[Dict[str, Any]] = None,
+    user_id: Optional[int] = None
+) -> List[DespesaRecord]:
+    """
+    Applies a formula to every (row, month) cell of a range in one transaction: one
+    locked read of the target rows (by ids or by the filter), one INSERT ... SELECT
+    for the history of every changed cell and one UPDATE doing the arithmetic and the
+    totals in SQL. The returned rows are computed in memory with the same arithmetic.
+    """
+    if (ids is None) == (filters is None):
+        raise ValueError("Use either ids or filter")
+    months = list(dict.fromkeys(months))
+    invalid = [month for month in months if month not in MESES]
+    if not months or invalid:
+        raise ValueError(f"Invalid months: {invalid or months}")
+    operator, operand = _formula_operator(formula, value)
+
     connection = get_connection()
     try:
         with connection.cursor() as cursor:
-            sql = "SELECT * FROM finacias.despesa_history WHERE despesa_id = %s ORDER BY timestamp DESC"
-            cursor.execute(sql, (despesa_id,))
-            return cursor.fetchall()
+            if ids is not None:
+                if not ids:
+                    return []
+                placeholders = ', '.join(['%s'] * len(ids))
+                where, params = f" WHERE id IN ({placeholders})", list(ids)
+            else:
+                where, params = _filter_clause(filters)
+            cursor.execute(f"SELECT * FROM finacias.controle_financeira_teste{where} FOR UPDATE", params)
+            raw_rows = cursor.fetchall()
+            if not raw_rows:
+                connection.rollback()
+                return []
+
+            # The filter is evaluated once: the other statements target the locked ids
+            target_ids = [row['id'] for row in raw_rows]
+            id_placeholders = ', '.join(['%s'] * len(target_ids))
+            new_value = {month: f"ROUND(COALESCE({month}, 0) {operator} %s, 2)" for month in months}
+
+            history_selects = []
+            history_params: List[Any] = []
+            for month in months:
+                history_selects.append(
+                    f"SELECT id, %s, {month}, {new_value[month]}, %s FROM finacias.controle_financeira_teste "
+                    f"WHERE id IN ({id_placeholders}) AND NOT ({month} <=> {new_value[month]})"
+                )
+                history_params.extend([month, operand, user_id, *target_ids, operand])
+            cursor.execute(
+                "INSERT INTO finacias.despesa_history (despesa_id, field, old_value, new_value, user_id) "
+                + " UNION ALL ".join(history_selects),
+                history_params
+            )
+
+            # total is assigned first, from the new month expressions: MySQL runs assignments left
+            # to right and SQLite evaluates them all against the old row, so both read the old months
+            total = " + ".join(new_value[mes] if mes in new_value else f"COALESCE({mes}, 0)" for mes in MESES)
+            set_parts = [f"total = {total}"] + [f"{month} = {new_value[month]}" for month in months]
+            cursor.execute(
+                f"UPDATE finacias.controle_financeira_teste SET {', '.join(set_parts)} WHERE id IN ({id_placeholders})",
+                [operand] * (2 * len(months)) + target_ids
+            )
+
+            changes = []
+            for raw in raw_rows:
+                updated = normalize_keys(raw)
+                for month in months:
+                    updated[month] = _apply_operator(updated.get(month), operator, operand)
+                updated['total'] = calculate_total(updated)
+                changes.append((raw, updated))
+
+            apply_summary_delta(cursor, changes)
+            connection.commit()
+            clear_caches()
+            return [DespesaRecord.from_mapping(updated) for _, updated in changes]
+    except Exception as e:
+        connection.rollback()
+        raise e
+    finally:
+        connection.close()
+
+def get_despesa_history(
+    despesa_id: int,
+    field: Optional[str] = None,
+    limit: Optional[int] = None,
+    cursor_token: Optional[str] = None
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """One keyset page of a despesa's history (newest first) and the token for the next page."""
+    connection = get_connection()
+    try:
+        with connection.cursor() as cursor:
+            return history_page(cursor, despesa_id, field, limit, cursor_token)
     finally:
         connection.close()
 
 def revert_cell_value(despesa_id: int, field: str, version_id: int, user_id: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Reads the history entry and locks the row in one joined SELECT, then writes the
+    cell and the total with one UPDATE; the returned row is built in memory.
+    """
+    if field not in MESES:
+        raise ValueError(f"Invalid field: {field}")
     connection = get_connection()
     try:
         with connection.cursor() as cursor:
-            # Get the value from history
-            cursor.execute("SELECT old_value FROM finacias.despesa_history WHERE id = %s AND despesa_id = %s AND field = %s", (version_id, despesa_id, field))
-            history_entry = cursor.fetchone()
-            if not history_entry:
-                raise ValueError("History version not found")
-            
-            revert_value = history_entry['old_value']
-            
-            # Get current value for history logging
-            cursor.execute(f"SELECT {field} FROM finacias.controle_financeira_teste WHERE id = %s", (despesa_id,))
+            cursor.execute("""
+                SELECT d.*, h.old_value AS reverted_value
+                FROM finacias.controle_financeira_teste d
+                JOIN finacias.despesa_history h ON h.despesa_id = d.id
+                WHERE h.id = %s AND h.despesa_id = %s AND h.field = %s
+                FOR UPDATE
+            """, (version_id, despesa_id, field))
             current = cursor.fetchone()
-            current_val = float(current[field]) if current and current[field] else 0.0
+            if not current:
+                raise ValueError("History version not found")
             
-            # Update
-            cursor.execute(f"UPDATE finacias.controle_financeira_teste SET {field} = %s WHERE id = %s", (revert_value, despesa_id))
+            revert_value = current.pop('reverted_value')
+            revert_value = float(revert_value) if revert_value is not None else None
+            row = normalize_keys(current)
+            current_val = float(row[field]) if row[field] else 0.0
             
-            # Recalculate total
-            cursor.execute("SELECT * FROM finacias.controle_financeira_teste WHERE id = %s", (despesa_id,))
-            full_record = normalize_keys(cursor.fetchone())
-            new_total = calculate_total(full_record)
-            cursor.execute("UPDATE finacias.controle_financeira_teste SET total = %s WHERE id = %s", (new_total, despesa_id))
+            row[field] = revert_value
+            row['total'] = calculate_total(row)
+            cursor.execute(
+                f"UPDATE finacias.controle_financeira_teste SET {field} = %s, total = %s WHERE id = %s",
+                (revert_value, row['total'], despesa_id)
+            )
             
-            log_change(cursor, despesa_id, field, current_val, float(revert_value), user_id)
+            log_change(cursor, despesa_id, field, current_val, revert_value, user_id)
+            apply_summary_delta(cursor, [(current, row)])
             
             connection.commit()
             clear_caches()
-            
-            cursor.execute("SELECT * FROM finacias.controle_financeira_teste WHERE id = %s", (despesa_id,))
-            return format_response_nested(normalize_keys(cursor.fetchone()))
+            return format_response_nested(row)
     except Exception as e:
         connection.rollback()
         raise e
     finally:
         connection.close()
 
-@lru_cache(maxsize=1)
-def get_monthly_analytics() -> Dict[str, float]:
+def _amount(value: Any) -> Optional[float]:
+    return float(value) if value is not None else None
+
+def get_despesas_as_of(at: datetime, ids: Optional[List[int]] = None) -> List[DespesaRecord]:
+    """Every row (or only `ids`) as it stood at `at`, newest id first like the listings."""
     connection = get_connection()
-    meses = ['janeiro', 'fevereiro', 'marco', 'abril', 'maio', 'junho',
-             'julho', 'agosto', 'setembro', 'outubro', 'novembro', 'dezembro']
-    totals = {}
     try:
         with connection.cursor() as cursor:
-            for mes in meses:
-                cursor.execute(f"SELECT SUM({mes}) as total FROM finacias.controle_financeira_teste")
-                res = cursor.fetchone()
-                totals[mes] = float(res['total']) if res and res['total'] else 0.0
-            return totals
+            _, state = state_as_of(cursor, at, ids)
+            return [DespesaRecord.from_mapping(normalize_keys(state[i])) for i in sorted(state, reverse=True)]
     finally:
         connection.close()
 
-@lru_cache(maxsize=10)
-def get_top_expenses(limit: int = 10) -> List[Dict[str, Any]]:
+def restore_despesas_as_of(at: datetime, ids: Optional[List[int]] = None, user_id: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Brings every row (or only `ids`) back to its state at `at` in one transaction:
+    changed months are rewritten with one CASE-based UPDATE, rows deleted since are
+    re-inserted with their ids and rows created since are deleted. Names are not
+    versioned, so existing rows keep theirs. The restore is logged like any other write.
+    """
     connection = get_connection()
     try:
         with connection.cursor() as cursor:
-            cursor.execute("SELECT * FROM finacias.controle_financeira_teste ORDER BY total DESC LIMIT %s", (limit,))
-            results = cursor.fetchall()
-            return [format_response_nested(normalize_keys(r)) for r in results]
+            if ids is not None:
+                if not ids:
+                    return {"at": at, "checkpoint_id": None, "updated": 0, "recreated": 0, "deleted": 0}
+                where, params = f" WHERE id IN ({', '.join(['%s'] * len(ids))})", list(ids)
+            else:
+                where, params = "", []
+            cursor.execute(f"SELECT * FROM finacias.controle_financeira_teste{where} FOR UPDATE", params)
+            raw_rows = {row['id']: row for row in cursor.fetchall()}
+            current_rows = {despesa_id: normalize_keys(row) for despesa_id, row in raw_rows.items()}
+            checkpoint, state = state_as_of(cursor, at, ids)
+
+            history = []
+            new_values: Dict[int, Dict[str, Any]] = {}
+            changes = []
+            for despesa_id, current in current_rows.items():
+                target = state.get(despesa_id)
+                if target is None:
+                    continue
+                fields = {
+                    mes: _amount(target.get(mes)) for mes in MESES
+                    if _amount(target.get(mes)) != _amount(current.get(mes))
+                }
+                if not fields:
+                    continue
+                history.extend((despesa_id, mes, current.get(mes), value, user_id) for mes, value in fields.items())
+                restored = {**current, **fields}
+                restored['total'] = calculate_total(restored)
+                new_values[despesa_id] = {**fields, 'total': restored['total']}
+                changes.append((raw_rows[despesa_id], restored))
+            if new_values:
+                _update_by_case(cursor, new_values)
+
+            recreated = [normalize_keys(state[i]) for i in sorted(state) if i not in current_rows]
+            if recreated:
+                columns = ['id'] + INSERT_COLUMNS
+                row_placeholders = '(' + ', '.join(['%s'] * len(columns)) + ')'
+                cursor.execute(
+                    f"INSERT INTO finacias.controle_financeira_teste ({', '.join(columns)}) "
+                    f"VALUES {', '.join([row_placeholders] * len(recreated))}",
+                    [row.get(col) for row in recreated for col in columns]
+                )
+                history.extend(created_entries([row['id'] for row in recreated], user_id))
+                changes.extend((None, row) for row in recreated)
+
+            removed = [row for despesa_id, row in raw_rows.items() if despesa_id not in state]
+            if removed:
+                removed_ids = [row['id'] for row in removed]
+                cursor.execute(
+                    f"DELETE FROM finacias.controle_financeira_teste WHERE id IN ({', '.join(['%s'] * len(removed_ids))})",
+                    removed_ids
+                )
+                history.extend(deleted_entries(removed, user_id))
+                changes.extend((row, None) for row in removed)
+
+            log_changes(cursor, history)
+            apply_summary_delta(cursor, changes)
+            connection.commit()
+            if changes:
+                clear_caches()
+            return {
+                "at": at,
+                "checkpoint_id": checkpoint['id'],
+                "updated": len(new_values),
+                "recreated": len(recreated),
+                "deleted": len(removed)
+            }
+    except Exception as e:
+        connection.rollback()
+        raise e
     finally:
         connection.close()
 
-def filter_expenses(filters: Dict[str, Any]) -> List[Dict[str, Any]]:
+def create_checkpoint() -> Dict[str, Any]:
     connection = get_connection()
     try:
         with connection.cursor() as cursor:
-            query = "SELECT * FROM finacias.controle_financeira_teste WHERE 1=1"
-            params = []
-            
-            if filters.get('min_total'):
-                query += " AND total >= %s"
-                params.append(filters['min_total'])
-            if filters.get('max_total'):
-                query += " AND total <= %s"
-                params.append(filters['max_total'])
-            if filters.get('month') and (filters.get('min_month_val') is not None or filters.get('max_month_val') is not None):
-                month = filters['month']
-                if filters.get('min_month_val') is not None:
-                    query += f" AND {month} >= %s"
-                    params.append(filters['min_month_val'])
-                if filters.get('max_month_val') is not None:
-                    query += f" AND {month} <= %s"
-                    params.append(filters['max_month_val'])
-            if filters.get('despesa_like'):
-                query += " AND despesa LIKE %s"
-                params.append(f"%{filters['despesa_like']}%")
-            
-            cursor.execute(query, params)
-            results = cursor.fetchall()
-            return [format_response_nested(normalize_keys(r)) for r in results]
+            checkpoint = take_checkpoint(cursor)
+            connection.commit()
+            return checkpoint
+    except Exception as e:
+        connection.rollback()
+        raise e
     finally:
         connection.close()
 
-def sort_expenses(order_by: str, direction: str) -> List[Dict[str, Any]]:
+def get_checkpoints() -> List[Dict[str, Any]]:
     connection = get_connection()
     try:
         with connection.cursor() as cursor:
-            # Basic sanitization for order_by
-            allowed_cols = ['id', 'despesa', 'total', 'janeiro', 'fevereiro', 'marco', 'abril', 'maio', 'junho', 'julho', 'agosto', 'setembro', 'outubro', 'novembro', 'dezembro']
-            if order_by.lower() not in allowed_cols:
-                order_by = 'id'
-            
-            dir_str = "DESC" if direction.lower() == "desc" else "ASC"
-            sql = f"SELECT * FROM finacias.controle_financeira_teste ORDER BY {order_by} {dir_str}"
-            cursor.execute(sql)
-            results = cursor.fetchall()
-            return [format_response_nested(normalize_keys(r)) for r in results]
+            return list_checkpoints(cursor)
+    finally:
+        connection.close()
+
+@cached("get_monthly_analytics")
+def get_monthly_analytics() -> Dict[str, float]:
+    connection = get_connection()
+    try:
+        with connection.cursor() as cursor:
+            summary = read_summary(cursor, MESES)
+            totals = {}
+            for mes in MESES:
+                res = summary.get(mes)
+                totals[mes] = float(res['total_sum']) if res and res['total_sum'] else 0.0
+            return totals
+    finally:
+        connection.close()
+
+@cached("get_top_expenses")
+def get_top_expenses(limit: int = 10) -> List[DespesaRecord]:
+    connection = get_connection()
+    try:
+        with connection.cursor(pymysql.cursors.Cursor) as cursor:
+            cursor.execute(f"SELECT {FRAME_SELECT_SQL} FROM finacias.controle_financeira_teste ORDER BY total DESC LIMIT %s", (limit,))
+            return frame_to_records(cursor.fetchall())
+    finally:
+        connection.close()
+
+def _filter_clause(filters: Dict[str, Any]) -> Tuple[str, List[Any]]:
+    query = " WHERE 1=1"
+    params = []
+    
+    if filters.get('min_total'):
+        query += " AND total >= %s"
+        params.append(filters['min_total'])
+    if filters.get('max_total'):
+        query += " AND total <= %s"
+        params.append(filters['max_total'])
+    if filters.get('month') and (filters.get('min_month_val') is not None or filters.get('max_month_val') is not None):
+        month = filters['month']
+        if filters.get('min_month_val') is not None:
+            query += f" AND {month} >= %s"
+            params.append(filters['min_month_val'])
+        if filters.get('max_month_val') is not None:
+            query += f" AND {month} <= %s"
+            params.append(filters['max_month_val'])
+    term = normalize_term(filters.get('despesa_like'))
+    if term:
+        clause, clause_params = search_clause(term)
+        query += f" AND {clause}"
+        params.extend(clause_params)
+    return query, params
+
+def paginate_expenses(
+    order_by: str = 'id',
+    direction: str = 'asc',
+    limit: Optional[int] = None,
+    cursor_token: Optional[str] = None,
+    filters: Optional[Dict[str, Any]] = None
+) -> Tuple[List[DespesaRecord], Optional[str]]:
+    """
+    One keyset page of despesas ordered by (order_by, id). Returns the rows and the
+    token for the next page, or None on the last page.
+    """
+    order_by = order_by.lower() if order_by.lower() in SORTABLE_COLUMNS else 'id'
+    direction = 'desc' if direction.lower() == 'desc' else 'asc'
+    limit = clamp_page_size(limit)
+
+    filters = filters or {}
+    term = normalize_term(filters.get('despesa_like'))
+    if term:
+        # Text searches are ranked by relevance regardless of the requested column
+        order_by, direction = 'relevance', 'desc'
+
+    where, params = _filter_clause(filters)
+    if cursor_token:
+        last_value, last_id = decode_cursor(cursor_token, order_by, direction)
+        if term:
+            clause, clause_params = relevance_keyset_clause(term, last_value, last_id)
+        else:
+            clause, clause_params = keyset_clause(order_by, direction, last_value, last_id)
+        where += f" AND {clause}"
+        params.extend(clause_params)
+
+    dir_str = direction.upper()
+    if term:
+        relevance, relevance_params = relevance_select(term)
+        # The relevance expression lands in the trailing sort_key slot
+        select = f"{FRAME_SELECT_SQL}, {relevance.replace(' AS relevance', ' AS sort_key')}"
+        params = relevance_params + params
+        order_clause = "sort_key DESC, id DESC"
+    else:
+        # Stored sort value for the continuation token (the frame recomputes total)
+        select = f"{FRAME_SELECT_SQL}, {order_by} AS sort_key"
+        order_clause = f"id {dir_str}" if order_by == 'id' else f"{order_by} {dir_str}, id {dir_str}"
+    sql = f"SELECT {select} FROM finacias.controle_financeira_teste{where} ORDER BY {order_clause} LIMIT %s"
+
+    connection = get_connection()
+    try:
+        with connection.cursor(pymysql.cursors.Cursor) as cursor:
+            # One extra row tells whether another page exists
+            cursor.execute(sql, params + [limit + 1])
+            rows = cursor.fetchall()
     finally:
         connection.close()
 
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(order_by, direction, last[-1], last[0])
+    return frame_to_records(rows), next_cursor
+
 def check_consistency(despesa_id: int) -> Dict[str, Any]:
     connection = get_connection()
     try:
@@ -371,10 +774,213 @@ def find_duplicates(name: str) -> List[Dict[str, Any]]:
     connection = get_connection()
     try:
         with connection.cursor() as cursor:
-            # Simple LIKE check for similar names
-            sql = "SELECT * FROM finacias.controle_financeira_teste WHERE despesa LIKE %s"
-            cursor.execute(sql, (f"%{name}%",))
+            # Similar names through the full-text index, most similar first
+            term = normalize_term(name)
+            clause, clause_params = search_clause(term)
+            relevance, relevance_params = relevance_select(term)
+            sql = f"SELECT *, {relevance} FROM finacias.controle_financeira_teste WHERE {clause} ORDER BY relevance DESC, id DESC"
+            cursor.execute(sql, relevance_params + clause_params)
             results = cursor.fetchall()
             return [format_response_nested(normalize_keys(r)) for r in results]
     finally:
         connection.close()
+
+EXPORT_HEADERS = ['id', 'despesa'] + MESES + ['total_anual']
+
+EXPORT_CHUNK_ROWS = int(os.getenv('EXPORT_CSV_CHUNK_ROWS', '1000'))
+
+def export_rows(rows: Iterable[Sequence[Any]]) -> Iterator[Tuple[Any, ...]]:
+    """(id, despesa, 12 months) tuples as export rows, with the annual total appended."""
+    for row in rows:
+        # Same rounding as calculate_total, without building a dict per row
+        total = round(sum(float(v) for v in row[2:] if v is not None), 2)
+        yield (*row, total)
+
+def stream_despesas_csv(chunk_rows: Optional[int] = None) -> Iterator[str]:
+    """
+    Yields the CSV export in chunks of `chunk_rows` rows. Rows come from an unbuffered
+    server-side cursor and are formatted straight from tuples, so memory stays flat
+    regardless of table size. If the consumer stops early the connection is discarded
+    rather than drained.
+    """
+    chunk_rows = chunk_rows or EXPORT_CHUNK_ROWS
+    connection = get_connection()
+    finished = False
+    try:
+        cursor = connection.cursor(pymysql.cursors.SSCursor)
+        cursor.execute(
+            f"SELECT id, despesa, {', '.join(MESES)} FROM finacias.controle_financeira_teste ORDER BY id DESC"
+        )
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_HEADERS)
+        while True:
+            rows = cursor.fetchmany(chunk_rows)
+            if not rows:
+                break
+            writer.writerows(export_rows(rows))
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+
+        if buffer.tell():
+            yield buffer.getvalue()
+        cursor.close()
+        finished = True
+    finally:
+        if finished:
+            connection.close()
+        else:
+            connection.discard()
+
+# Expected format: Despesa,Jan,Fev,Mar,Abr,Mai,Jun,Jul,Ago,Set,Out,Nov,Dez
+CSV_IMPORT_MAPPING = {
+    'Despesa': 'despesa', 'Jan': 'janeiro', 'Fev': 'fevereiro', 'Mar': 'marco',
+    'Abr': 'abril', 'Mai': 'maio', 'Jun': 'junho', 'Jul': 'julho',
+    'Ago': 'agosto', 'Set': 'setembro', 'Out': 'outubro', 'Nov': 'novembro', 'Dez': 'dezembro'
+}
+
+IMPORT_CHUNK_SIZE = int(os.getenv('IMPORT_CSV_CHUNK_SIZE', '500'))
+MAX_IMPORT_ERRORS = 1000
+
+def _resolve_csv_headers(fieldnames: List[str]) -> Dict[str, Optional[str]]:
+    """model key -> CSV header, accepting the short headers ("Jan") and the full ones ("JANEIRO"), any case."""
+    by_name = {name.strip().lower(): name for name in fieldnames if name}
+    return {
+        model_key: by_name.get(csv_key.lower()) or by_name.get(model_key)
+        for csv_key, model_key in CSV_IMPORT_MAPPING.items()
+    }
+
+def map_csv_rows(rows: List[Dict[str, Any]]) -> List[Tuple[Optional[Dict[str, Any]], List[str]]]:
+    """
+    Maps a batch of CSV rows to validated DespesaCreate dicts. Each month column is
+    parsed in one parse_brl_column pass (blank cells import as 0). Returns, per row,
+    (mapped row, []) or (None, error messages).
+    """
+    if not rows:
+        return []
+    headers = _resolve_csv_headers(list(rows[0].keys()))
+    row_errors: List[List[str]] = [[] for _ in rows]
+    columns: Dict[str, List[Optional[float]]] = {}
+    for model_key in MESES:
+        header = headers[model_key]
+        values, cell_errors = parse_brl_column([row.get(header) for row in rows] if header else [None] * len(rows), blank=0.0)
+        columns[model_key] = values
+        for cell_error in cell_errors:
+            row_errors[cell_error.index].append(f"{header}: {cell_error.message}")
+
+    results: List[Tuple[Optional[Dict[str, Any]], List[str]]] = []
+    for i, row in enumerate(rows):
+        if row_errors[i]:
+            results.append((None, row_errors[i]))
+            continue
+        mapped_row = {'despesa': row.get(headers['despesa']) if headers['despesa'] else None}
+        mapped_row.update({model_key: columns[model_key][i] for model_key in MESES})
+        try:
+            results.append((DespesaCreate(**mapped_row).model_dump(), []))
+        except Exception as validation_error:
+            results.append((None, [str(validation_error)]))
+    return results
+
+def import_despesas_csv(binary_file: BinaryIO, chunk_size: Optional[int] = None, on_error: str = "skip_row") -> Dict[str, Any]:
+    """
+    Parses an uploaded CSV incrementally and inserts it in chunks of `chunk_size` rows,
+    each committed on its own. `on_error` decides what a bad row (or a failed chunk
+    insert) does: "skip_row" drops just that row, "abort_chunk" drops its whole chunk,
+    "abort_file" stops the import (chunks already committed are kept).
+    """
+    if on_error not in ("skip_row", "abort_chunk", "abort_file"):
+        raise ValueError(f"Unknown failure policy: {on_error}")
+    chunk_size = chunk_size or IMPORT_CHUNK_SIZE
+
+    report: Dict[str, Any] = {
+        "status": "success",
+        "imported_count": 0,
+        "rejected_count": 0,
+        "chunks": [],
+        "errors": []
+    }
+
+    def add_error(message: str):
+        if len(report["errors"]) < MAX_IMPORT_ERRORS:
+            report["errors"].append(message)
+
+    def flush(chunk_number: int, rows: List[Dict[str, Any]], rejected: int, errors: List[str]) -> bool:
+        accepted = 0
+        if rows and not (errors and on_error != "skip_row"):
+            try:
+                accepted = len(bulk_insert_despessas(rows, chunk_size=len(rows)))
+            except Exception as insert_error:
+                errors.append(f"Chunk {chunk_number}: {str(insert_error)}")
+        if errors and on_error != "skip_row":
+            # The whole chunk is rejected: nothing from it was written
+            rejected, accepted = rejected + len(rows), 0
+        elif accepted != len(rows):
+            rejected += len(rows) - accepted
+
+        report["imported_count"] += accepted
+        report["rejected_count"] += rejected
+        report["chunks"].append({
+            "chunk": chunk_number,
+            "rows_accepted": accepted,
+            "rows_rejected": rejected
+        })
+        for message in errors:
+            add_error(message)
+        return not (errors and on_error == "abort_file")
+
+    def process(chunk_number: int, raw_rows: List[Dict[str, Any]], first_line: int, read_errors: List[str]) -> bool:
+        """Parses one chunk of raw rows in batch and flushes it; False means stop the import."""
+        rows, rejected, errors = [], 0, []
+        stop = False
+        for line, (mapped, row_errors) in enumerate(map_csv_rows(raw_rows), start=first_line):
+            if mapped is not None:
+                rows.append(mapped)
+                continue
+            rejected += 1
+            errors.append(f"Row {line}: {'; '.join(row_errors)}")
+            if on_error == "abort_file":
+                # Rows after the first bad one are not part of the import
+                stop = True
+                break
+        errors.extend(read_errors)
+        if rows or rejected or errors:
+            stop = not flush(chunk_number, rows, rejected, errors) or stop
+        return not stop
+
+    stream = io.TextIOWrapper(binary_file, encoding='utf-8', newline='')
+    chunk_number = 1
+    raw_rows: List[Dict[str, Any]] = []
+    first_line = 1
+    aborted = False
+    try:
+        reader = csv.DictReader(stream)
+        line = 0
+        try:
+            for line, row in enumerate(reader, start=1):
+                raw_rows.append(row)
+                if len(raw_rows) >= chunk_size:
+                    keep_going = process(chunk_number, raw_rows, first_line, [])
+                    chunk_number += 1
+                    raw_rows, first_line = [], line + 1
+                    if not keep_going:
+                        aborted = True
+                        break
+        except (UnicodeDecodeError, csv.Error) as read_error:
+            # The rest of the file cannot be read; rows read so far are still handled by the policy
+            aborted = True
+            process(chunk_number, raw_rows, first_line, [f"Row {line + 1}: {str(read_error)}"])
+            raw_rows = []
+
+        if raw_rows and not aborted:
+            aborted = not process(chunk_number, raw_rows, first_line, [])
+    finally:
+        # Leave the upload's file object open for its owner
+        stream.detach()
+
+    if aborted:
+        report["status"] = "aborted"
+    elif report["rejected_count"]:
+        report["status"] = "partial"
+    return report
@@ -0,0 +1,320 @@
+"""
+Versioned result cache for the analytics queries.
+
+Every cache key embeds the current version of the table it was computed from.
+Write paths call `bump_table_version()`, which makes every older key unreachable
+at once, so invalidation never needs to enumerate keys. With the SQLite backend
+the version counter and the entries live in a file shared by all uvicorn workers
+on the host, so a write in one worker invalidates the others too.
+
+Configuration (environment):
+- ANALYTICS_CACHE_BACKEND: "memory" (default, per process) or "sqlite" (shared).
+- ANALYTICS_CACHE_PATH: SQLite file used by the shared backend (default
+  $XDG_CACHE_HOME/financial_control/cache.sqlite3). Its directory is created
+  0700 and the file 0600; a file or directory owned by another user, or a
+  directory other users can write to, is refused.
+- ANALYTICS_CACHE_TTL: seconds an entry stays valid even without writes (default 300).
+- ANALYTICS_CACHE_MAX_ENTRIES: entries kept before the oldest are evicted (default 1024).
+"""
+import functools
+import json
+import os
+import sqlite3
+import stat
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from database.records import DespesaRecord
+
+DESPESAS_TABLE = 'controle_financeira_teste'
+
+_MISSING = object()
+
+# Named tuples the shared backend can hand back as themselves
+_RECORD_TYPES = {'DespesaRecord': DespesaRecord}
+
+
+def _to_json(value: Any) -> Any:
+    """JSON-ready form of a cached value; tagged objects keep the types JSON lacks."""
+    if isinstance(value, tuple) and type(value).__name__ in _RECORD_TYPES:
+        return {"$record": type(value).__name__, "values": [_to_json(v) for v in value]}
+    if isinstance(value, (list, tuple)):
+        return [_to_json(v) for v in value]
+    if isinstance(value, dict):
+        return {str(k): _to_json(v) for k, v in value.items()}
+    if isinstance(value, Decimal):
+        return {"$decimal": str(value)}
+    if isinstance(value, datetime):
+        return {"$datetime": value.isoformat()}
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    raise TypeError(f"{type(value).__name__} values cannot be stored in the shared cache")
+
+def _from_json_object(obj: Dict[str, Any]) -> Any:
+    if "$record" in obj:
+        return _RECORD_TYPES[obj["$record"]](*obj["values"])
+    if "$decimal" in obj:
+        return Decimal(obj["$decimal"])
+    if "$datetime" in obj:
+        return datetime.fromisoformat(obj["$datetime"])
+    return obj
+
+def _dumps(value: Any) -> str:
+    return json.dumps(_to_json(value), separators=(',', ':'))
+
+def _loads(text: str) -> Any:
+    return json.loads(text, object_hook=_from_json_object)
+
+def default_cache_path() -> str:
+    cache_home = os.getenv('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_home, 'financial_control', 'cache.sqlite3')
+
+def _check_owner(path: str, st: os.stat_result) -> None:
+    if hasattr(os, 'getuid') and st.st_uid != os.getuid():
+        raise PermissionError(f"{path} is owned by another user; refusing to use it as the cache")
+
+def _prepare_private_file(path: str) -> None:
+    """Creates the cache file 0600 inside a 0700 directory, refusing anything another user controls."""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    dir_stat = os.stat(directory)
+    _check_owner(directory, dir_stat)
+    if dir_stat.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+        raise PermissionError(f"{directory} is writable by other users; point ANALYTICS_CACHE_PATH at a private directory")
+    fd = os.open(path, os.O_RDWR | os.O_CREAT | getattr(os, 'O_NOFOLLOW', 0), 0o600)
+    try:
+        file_stat = os.fstat(fd)
+        _check_owner(path, file_stat)
+        if file_stat.st_mode & 0o077:
+            os.fchmod(fd, 0o600)
+    finally:
+        os.close(fd)
+
+
+class InProcessBackend:
+    """LRU dict with per-entry expiry; only visible to the current process."""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[str, Tuple[float, Any]]' = OrderedDict()
+        self._versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return _MISSING
+            expires_at, value = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                return _MISSING
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def get_version(self, name: str) -> int:
+        with self._lock:
+            return self._versions.get(name, 0)
+
+    def bump_version(self, name: str) -> int:
+        with self._lock:
+            self._versions[name] = self._versions.get(name, 0) + 1
+            return self._versions[name]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def size(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+class SQLiteBackend:
+    """
+    Cache stored in a local SQLite file (WAL mode) so every worker process on the
+    host shares the same entries and version counters. Values are stored as JSON
+    and the file must be private to the current user (see `_prepare_private_file`).
+    Eviction is oldest-first.
+
+    Each cache sharing the file keeps its entries in its own `table`, so eviction,
+    `clear()` and `size()` of one never touch another's entries.
+    """
+
+    _PURGE_EVERY = 100
+
+    def __init__(self, path: str, max_entries: int = 1024, table: str = 'cache_entries'):
+        if not table.isidentifier():
+            raise ValueError(f"Invalid cache table name: {table!r}")
+        self.path = path
+        self.max_entries = max_entries
+        self.table = table
+        self._local = threading.local()
+        self._sets = 0
+        self._sets_lock = threading.Lock()
+        _prepare_private_file(path)
+        conn = self._conn()
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                created_at REAL NOT NULL
+            )
+        """)
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_created ON {table} (created_at)")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS cache_versions (
+                name TEXT PRIMARY KEY,
+                version INTEGER NOT NULL
+            )
+        """)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Any:
+        row = self._conn().execute(
+            f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or row[1] < time.time():
+            return _MISSING
+        return _loads(row[0])
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        now = time.time()
+        conn = self._conn()
+        conn.execute(
+            f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at, created_at) VALUES (?, ?, ?, ?)",
+            (key, _dumps(value), now + ttl, now)
+        )
+        with self._sets_lock:
+            self._sets += 1
+            purge = self._sets % self._PURGE_EVERY == 0
+        if purge:
+            conn.execute(f"DELETE FROM {self.table} WHERE expires_at < ?", (now,))
+        conn.execute(f"""
+            DELETE FROM {self.table} WHERE key IN (
+                SELECT key FROM {self.table} ORDER BY created_at
+                LIMIT MAX((SELECT COUNT(*) FROM {self.table}) - ?, 0)
+            )
+        """, (self.max_entries,))
+
+    def delete(self, key: str) -> None:
+        self._conn().execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+
+    def get_version(self, name: str) -> int:
+        row = self._conn().execute("SELECT version FROM cache_versions WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else 0
+
+    def bump_version(self, name: str) -> int:
+        conn = self._conn()
+        conn.execute("""
+            INSERT INTO cache_versions (name, version) VALUES (?, 1)
+            ON CONFLICT(name) DO UPDATE SET version = version + 1
+        """, (name,))
+        return self.get_version(name)
+
+    def clear(self) -> None:
+        self._conn().execute(f"DELETE FROM {self.table}")
+
+    def size(self) -> int:
+        return self._conn().execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+
+class VersionedCache:
+    """Memoizes function results under keys bound to a table version, with hit/miss counters."""
+
+    def __init__(self, backend, ttl: float = 300.0):
+        self.backend = backend
+        self.ttl = ttl
+        self._hits = 0
+        self._misses = 0
+        self._lock = threading.Lock()
+
+    def call(self, namespace: str, table: str, func: Callable, args: tuple, kwargs: dict) -> Any:
+        version = self.backend.get_version(table)
+        key = f"{table}:{version}:{namespace}:{args!r}:{sorted(kwargs.items())!r}"
+        value = self.backend.get(key)
+        if value is not _MISSING:
+            with self._lock:
+                self._hits += 1
+            return value
+        with self._lock:
+            self._misses += 1
+        value = func(*args, **kwargs)
+        self.backend.set(key, value, self.ttl)
+        return value
+
+    def bump(self, table: str = DESPESAS_TABLE) -> int:
+        return self.backend.bump_version(table)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits, misses = self._hits, self._misses
+        return {
+            "backend": type(self.backend).__name__,
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": round(hits / (hits + misses), 4) if hits + misses else 0.0,
+            "entries": self.backend.size(),
+            "version": self.backend.get_version(DESPESAS_TABLE),
+        }
+
+
+def _build_cache() -> VersionedCache:
+    backend_name = os.getenv('ANALYTICS_CACHE_BACKEND', 'memory').lower()
+    max_entries = int(os.getenv('ANALYTICS_CACHE_MAX_ENTRIES', '1024'))
+    if backend_name == 'sqlite':
+        path = os.getenv('ANALYTICS_CACHE_PATH') or default_cache_path()
+        backend = SQLiteBackend(path, max_entries)
+    elif backend_name == 'memory':
+        backend = InProcessBackend(max_entries)
+    else:
+        raise ValueError(f"Unknown ANALYTICS_CACHE_BACKEND: {backend_name}")
+    return VersionedCache(backend, ttl=float(os.getenv('ANALYTICS_CACHE_TTL', '300')))
+
+_cache: Optional[VersionedCache] = None
+_cache_lock = threading.Lock()
+
+def get_cache() -> VersionedCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = _build_cache()
+    return _cache
+
+def cached(namespace: str, table: str = DESPESAS_TABLE) -> Callable:
+    """Replacement for lru_cache: memoizes through the process-wide VersionedCache."""
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return get_cache().call(namespace, table, func, args, kwargs)
+        return wrapper
+    return decorator
+
+def bump_table_version(table: str = DESPESAS_TABLE) -> int:
+    """Invalidates every cached result derived from `table`, in all workers sharing the backend."""
+    return get_cache().bump(table)
@@ -0,0 +1,91 @@
+"""
+Columnar batch path for the list endpoints.
+
+Rows are read from a tuple cursor as (id, despesa, janeiro..dezembro, ...) with
+the month columns already cast to DOUBLE by MySQL, loaded once into an (N x 12)
+float array, and totals / per-month aggregates are computed with vectorized
+NumPy operations. Per-row output (compact DespesaRecords, or dicts from
+`to_nested()`) is only built at the end. NULL months are carried as NaN and
+come back out as None.
+"""
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from database.constants import MESES
+from database.records import DespesaRecord
+
+# "+ 0E0" makes MySQL send DOUBLEs, which pymysql decodes to float without building Decimals
+MONTHS_AS_DOUBLE_SQL = ', '.join(f"{mes} + 0E0 AS {mes}" for mes in MESES)
+
+# Column list matching DespesaFrame.from_tuples: id, despesa, 12 months
+FRAME_SELECT_SQL = f"id, despesa, {MONTHS_AS_DOUBLE_SQL}"
+
+
+class DespesaFrame:
+    __slots__ = ('ids', 'names', 'months', 'totals')
+
+    def __init__(self, ids: List[int], names: List[Any], months: np.ndarray):
+        self.ids = ids
+        self.names = names
+        self.months = months
+        # Same result as calculate_total: NULLs count as zero, rounded to cents
+        self.totals = np.round(np.nansum(months, axis=1), 2) if len(ids) else np.zeros(0)
+
+    @classmethod
+    def from_tuples(cls, rows: Sequence[Sequence[Any]]) -> 'DespesaFrame':
+        """Builds a frame from rows shaped like FRAME_SELECT_SQL (extra trailing columns are ignored)."""
+        if not rows:
+            return cls([], [], np.zeros((0, len(MESES))))
+        ids = [row[0] for row in rows]
+        names = [row[1] for row in rows]
+        # None becomes NaN under dtype=float
+        months = np.array([row[2:2 + len(MESES)] for row in rows], dtype=np.float64)
+        return cls(ids, names, months)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def monthly_totals(self) -> Dict[str, float]:
+        sums = np.nansum(self.months, axis=0) if len(self) else np.zeros(len(MESES))
+        return dict(zip(MESES, np.round(sums, 2).tolist()))
+
+    def _month_rows(self) -> List[List[Optional[float]]]:
+        missing = np.isnan(self.months)
+        if missing.any():
+            # One masked assignment instead of a per-cell NaN check in Python
+            boxed = self.months.astype(object)
+            boxed[missing] = None
+            return boxed.tolist()
+        return self.months.tolist()
+
+    def to_records(self) -> List[DespesaRecord]:
+        """One compact DespesaRecord per row."""
+        if not len(self):
+            return []
+        make = tuple.__new__
+        return [
+            make(DespesaRecord, (despesa_id, name, *row_months, total))
+            for despesa_id, name, row_months, total in zip(self.ids, self.names, self._month_rows(), self.totals.tolist())
+        ]
+
+    def to_nested(self) -> List[Dict[str, Any]]:
+        """The format_response_nested shape for every row."""
+        if not len(self):
+            return []
+        return [
+            {
+                "id": despesa_id,
+                "despesa": name,
+                "monthly_data": dict(zip(MESES, row_months)),
+                "annual_total": total
+            }
+            for despesa_id, name, row_months, total in zip(self.ids, self.names, self._month_rows(), self.totals.tolist())
+        ]
+
+
+def frame_to_nested(rows: Optional[Sequence[Sequence[Any]]]) -> List[Dict[str, Any]]:
+    return DespesaFrame.from_tuples(rows or []).to_nested()
+
+def frame_to_records(rows: Optional[Sequence[Sequence[Any]]]) -> List[DespesaRecord]:
+    return DespesaFrame.from_tuples(rows or []).to_records()
@@ -1,8 +1,22 @@
 import pymysql.cursors
 import os
+import threading
+from decimal import Decimal, ROUND_HALF_UP
 from dotenv import load_dotenv
 from typing import List, Dict, Optional, Any, cast 
-from decimal import Decimal
+from database.connection_pool import ConnectionPool, PooledConnection
+from database.cache import bump_table_version
+from database.columnar import FRAME_SELECT_SQL, frame_to_records
+from database.currency import sum_brl
+from database.constants import MESES
+from database.records import DespesaRecord
+from database.history import ensure_history_indexes
+from database.monthly_summary import apply_summary_delta, ensure_summary
+from database.pagination import ensure_sort_indexes
+from database.search import ensure_search_index
+from database.storage import get_storage
+from database.user_cache import get_user_cache
+from database.snapshots import created_entries, deleted_entries, ensure_snapshots, log_history
 
 load_dotenv()
 
@@ -44,73 +58,86 @@ def normalize_keys_list(data_list: List[Dict[str, Any]]) -> List[Dict[str, Any]]
     return [format_response_nested(normalize_keys(item)) for item in data_list]
 
 
-def get_connection() -> pymysql.connections.Connection:
-    return pymysql.connect(
-        host=os.environ['DB_HOST'],
-        user=os.environ['DB_USER'],
-        password=os.environ['DB_PASSWORD'],
-        database=os.environ['DB_NAME'],
-        charset=os.environ['DB_CHARSET'],
-        cursorclass=pymysql.cursors.DictCursor
-    )
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+def get_pool() -> ConnectionPool:
+    """Returns the process-wide pool of STORAGE_BACKEND connections, created from the DB_POOL_* settings on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                pool = ConnectionPool(
+                    get_storage().connect,
+                    min_size=int(os.getenv('DB_POOL_MIN_SIZE', '1')),
+                    max_size=int(os.getenv('DB_POOL_MAX_SIZE', '10')),
+                    idle_timeout=float(os.getenv('DB_POOL_IDLE_TIMEOUT', '300')),
+                    health_check_interval=float(os.getenv('DB_POOL_HEALTH_CHECK_INTERVAL', '30')),
+                    checkout_timeout=float(os.getenv('DB_POOL_CHECKOUT_TIMEOUT', '30')),
+                )
+                pool.start_reaper()
+                _pool = pool
+    return _pool
+
+def close_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+def pool_stats() -> Optional[Dict[str, int]]:
+    """Stats of the pool, or None before the first connection was requested (never opens one)."""
+    pool = _pool
+    return pool.stats() if pool is not None else None
+
+def get_connection() -> PooledConnection:
+    """Borrows a connection from the pool; call close() to give it back."""
+    return get_pool().acquire()
 
 def calculate_total(data: Dict[str, Any]) -> float:
-    """Calcula o total de todos os meses"""
-    meses = ['janeiro', 'fevereiro', 'marco', 'abril', 'maio', 'junho',
-             'julho', 'agosto', 'setembro', 'outubro', 'novembro', 'dezembro']
-    
-    total = 0.0
-    for mes in meses:
-        valor = data.get(mes)
-        if valor is not None:
-            if isinstance(valor, Decimal):
-                total += float(valor)
-            elif isinstance(valor, str):
-                try:
-                    # Clean string: remove R$, spaces, dots (thousands), replace comma with dot
-                    clean_valor = valor.replace('R$', '').replace(' ', '').replace('.', '').replace(',', '.')
-                    if not clean_valor:
-                        continue
-                    total += float(clean_valor)
-                except ValueError:
-                    # If conversion fails, assume 0
-                    total += 0.0
-            else:
-                total += float(valor)
-    
-    return round(total, 2)
+    """Calcula o total de todos os meses (valores inválidos contam como zero)"""
+    # Twelve cells go through the scalar path; parse_brl_column pays off only for whole columns
+    return round(sum_brl([data.get(mes) for mes in MESES]), 2)
+
+CENT = Decimal('0.01')
+
+def to_cents(value: Any) -> Any:
+    """Rounds an amount the way the DECIMAL(10, 2) columns store it, so rows built in memory match the table."""
+    if value is None or isinstance(value, str):
+        return value
+    return float(Decimal(str(value)).quantize(CENT, rounding=ROUND_HALF_UP))
 
 def create_despesa(data: Dict[str, Any]) -> Dict[str, Any]:
+    """One INSERT; the returned row is built from the inserted values instead of being read back."""
     connection = get_connection()
     try:
         with connection.cursor() as cursor:
-            # Calculate total before inserting
-            data['total'] = calculate_total(data)
-            
-            insert_data = {k: v for k, v in data.items() 
-                          if k not in ['id', 'created_at', 'updated_at']}
+            insert_data = {k: to_cents(v) if k in MESES else v for k, v in data.items()
+                           if k not in ['id', 'total', 'created_at', 'updated_at']}
+            insert_data['total'] = calculate_total(insert_data)
             
             columns = ', '.join(insert_data.keys())
             placeholders = ', '.join(['%s'] * len(insert_data))
             sql = f"INSERT INTO finacias.controle_financeira_teste ({columns}) VALUES ({placeholders})"
             cursor.execute(sql, list(insert_data.values()))
-            connection.commit()
             
-            despesa_id = cursor.lastrowid
-            cursor.execute("SELECT * FROM finacias.controle_financeira_teste WHERE id = %s", (despesa_id,))
-            result = cursor.fetchone()
+            row = {'id': cursor.lastrowid, **insert_data}
+            log_history(cursor, created_entries([row['id']]))
+            apply_summary_delta(cursor, [(None, row)])
+            connection.commit()
+            bump_table_version()
             
-            return format_response_nested(normalize_keys(cast(Dict[str, Any], result)))
+            return format_response_nested(normalize_keys(row))
     finally:
         connection.close()
 
-def get_all_despesas() -> List[Dict[str, Any]]:
+def get_all_despesas() -> List[DespesaRecord]:
     connection = get_connection()
     try:
-        with connection.cursor() as cursor:
-            cursor.execute("SELECT * FROM finacias.controle_financeira_teste ORDER BY id DESC")
-            result = cursor.fetchall()
-            return normalize_keys_list(cast(List[Dict[str, Any]], result)) if result else []
+        with connection.cursor(pymysql.cursors.Cursor) as cursor:
+            cursor.execute(f"SELECT {FRAME_SELECT_SQL} FROM finacias.controle_financeira_teste ORDER BY id DESC")
+            return frame_to_records(cursor.fetchall())
     finally:
         connection.close()
 
@@ -125,48 +152,41 @@ def get_despesa_by_id(despesa_id: int) -> Optional[Dict[str, Any]]:
         connection.close()
 
 def update_despesa(despesa_id: int, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    One locked read and one UPDATE: the new total is computed from the locked row
+    merged with the changes, and the merged row is what gets returned.
+    """
     connection = get_connection()
     try:
         with connection.cursor() as cursor:
-            # Get current data to merge (using internal get to avoid nested format loop if called recursively, but here we call public which formats... wait.
-            # actually we need raw data for update logic.
-            # FIX: get_despesa_by_id now returns nested. This breaks update logic which expects flat dict keys.
-            # I must separate "get for logic" vs "get for api".
-            # Or I can fix update_despesa to expect nested or re-flatten.
-            # Better approach: Create logical_get_despesa_by_id (flat) and public_get_despesa_by_id (nested).
-            # For now, let's reverse the format in update or just query directly.
-            
-            cursor.execute("SELECT * FROM finacias.controle_financeira_teste WHERE id = %s", (despesa_id,))
+            cursor.execute("SELECT * FROM finacias.controle_financeira_teste WHERE id = %s FOR UPDATE", (despesa_id,))
             current_raw = cursor.fetchone()
             
             if current_raw is None:
+                connection.rollback()
                 return None
             
-            despesa_atual = normalize_keys(cast(Dict[str, Any], current_raw))
-
-            # Merge current data with updates to calculate new total
-            merged_data = despesa_atual.copy()
-            merged_data.update({k: v for k, v in data.items() if v is not None})
-            
-            # Calculate new total
-            new_total = calculate_total(merged_data)
+            update_data = {k: to_cents(v) if k in MESES else v for k, v in data.items()
+                           if v is not None and k not in ['id', 'total']}
             
-            # Prepare update data including total
-            update_data = {k: v for k, v in data.items() 
-                          if v is not None and k not in ['id', 'total']}
+            merged = normalize_keys(cast(Dict[str, Any], current_raw))
+            history = [(despesa_id, k, merged.get(k), v, None) for k, v in update_data.items()
+                       if k in MESES and merged.get(k) != v]
+            merged.update(update_data)
+            merged['total'] = calculate_total(merged)
             
             # Always update total
-            update_data['total'] = new_total
+            update_data['total'] = merged['total']
             
             set_clause = ', '.join([f"{k} = %s" for k in update_data.keys()])
             sql = f"UPDATE finacias.controle_financeira_teste SET {set_clause} WHERE id = %s"
             cursor.execute(sql, list(update_data.values()) + [despesa_id])
-            connection.commit()
             
-            # Return nested
-            cursor.execute("SELECT * FROM finacias.controle_financeira_teste WHERE id = %s", (despesa_id,))
-            result = cursor.fetchone()
-            return format_response_nested(normalize_keys(cast(Dict[str, Any], result))) if result else None
+            log_history(cursor, history)
+            apply_summary_delta(cursor, [(current_raw, merged)])
+            connection.commit()
+            bump_table_version()
+            return format_response_nested(merged)
     finally:
         connection.close()
 
@@ -175,16 +195,36 @@ def delete_despesa(despesa_id: int) -> bool:
     connection = get_connection()
     try:
         with connection.cursor() as cursor:
+            cursor.execute("SELECT * FROM finacias.controle_financeira_teste WHERE id = %s FOR UPDATE", (despesa_id,))
+            current = cursor.fetchone()
+            if current is None:
+                connection.rollback()
+                return False
+            
             cursor.execute("DELETE FROM finacias.controle_financeira_teste WHERE id = %s", (despesa_id,))
+            log_history(cursor, deleted_entries([current]))
+            apply_summary_delta(cursor, [(current, None)])
             connection.commit()
-            return cursor.rowcount > 0
+            bump_table_version()
+            return True
     finally:
         connection.close()
 
 def init_db():
+    get_pool().warm()
     connection = get_connection()
     try:
         with connection.cursor() as cursor:
+            # Create Despesas Table
+            cursor.execute(f"""
+                CREATE TABLE IF NOT EXISTS finacias.controle_financeira_teste (
+                    id INT AUTO_INCREMENT PRIMARY KEY,
+                    despesa VARCHAR(100),
+                    {', '.join(f'{mes} DECIMAL(10, 2)' for mes in MESES)},
+                    total DECIMAL(10, 2)
+                )
+            """)
+            
             # Create Users Table
             cursor.execute("""
                 CREATE TABLE IF NOT EXISTS finacias.users (
@@ -210,17 +250,53 @@ def init_db():
                     INDEX (timestamp)
                 )
             """)
+            
+            # Composite (despesa_id, field, timestamp) indexes behind the history pages
+            ensure_history_indexes(cursor)
+            
+            # Create / backfill the per-month aggregates used by analytics
+            ensure_summary(cursor)
+            
+            # Composite (column, id) indexes for keyset pagination
+            ensure_sort_indexes(cursor)
+            
+            # ngram FULLTEXT index for the expense name search
+            ensure_search_index(cursor)
+            
+            # Checkpoint tables for point-in-time reads (and a first checkpoint)
+            ensure_snapshots(cursor)
             connection.commit()
     finally:
         connection.close()
 
+USER_COLUMNS = ('username', 'email', 'password_hash')
+
+def _load_user(column: str, value: Any) -> Optional[Dict[str, Any]]:
+    connection = get_connection()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT * FROM finacias.users WHERE {column} = %s", (value,))
+            return cursor.fetchone()
+    finally:
+        connection.close()
+
 def get_user_by_email(email: str) -> Optional[Dict[str, Any]]:
+    """The user with this email, without password_hash (served from the user cache)."""
+    return get_user_cache().by_email(email, lambda: _load_user('email', email))
+
+def get_user_credentials(email: str) -> Optional[Dict[str, Any]]:
+    """The user row with its password hash, for login (hash kept in process memory only, see UserCache.credentials)."""
+    return get_user_cache().credentials(email, lambda: _load_user('email', email))
+
+def get_user_by_id(user_id: int) -> Optional[Dict[str, Any]]:
+    return get_user_cache().by_id(user_id, lambda: _load_user('id', user_id))
+
+def get_all_users() -> List[Dict[str, Any]]:
     connection = get_connection()
     try:
         with connection.cursor() as cursor:
-            cursor.execute("SELECT * FROM finacias.users WHERE email = %s", (email,))
-            result = cursor.fetchone()
-            return result
+            cursor.execute("SELECT id, username, email FROM finacias.users ORDER BY id")
+            return cursor.fetchall()
     finally:
         connection.close()
 
@@ -234,6 +310,8 @@ def create_user_db(username: str, email: str, password_hash: str) -> Dict[str, A
             
             user_id = cursor.lastrowid
             
+            # Drops the negative entry left by the "already registered?" check
+            get_user_cache().invalidate(emails=[email], ids=[user_id])
             return {
                 "id": user_id,
                 "username": username,
@@ -242,4 +320,41 @@ def create_user_db(username: str, email: str, password_hash: str) -> Dict[str, A
     finally:
         connection.close()
 
+def update_user(user_id: int, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    connection = get_connection()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT * FROM finacias.users WHERE id = %s FOR UPDATE", (user_id,))
+            current = cursor.fetchone()
+            if current is None:
+                connection.rollback()
+                return None
+
+            changes = {k: v for k, v in data.items() if k in USER_COLUMNS}
+            if changes:
+                set_clause = ", ".join(f"{k} = %s" for k in changes)
+                cursor.execute(f"UPDATE finacias.users SET {set_clause} WHERE id = %s", list(changes.values()) + [user_id])
+            connection.commit()
+
+            updated = {**current, **changes}
+            get_user_cache().invalidate(emails=[current['email'], updated['email']], ids=[user_id])
+            return {"id": user_id, "username": updated['username'], "email": updated['email']}
+    finally:
+        connection.close()
+
+def delete_user(user_id: int) -> bool:
+    connection = get_connection()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT email FROM finacias.users WHERE id = %s FOR UPDATE", (user_id,))
+            current = cursor.fetchone()
+            if current is None:
+                connection.rollback()
+                return False
 
+            cursor.execute("DELETE FROM finacias.users WHERE id = %s", (user_id,))
+            connection.commit()
+            get_user_cache().invalidate(emails=[current['email']], ids=[user_id])
+            return True
+    finally:
+        connection.close()
@@ -0,0 +1,251 @@
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+import pymysql
+
+from database.instrumentation import InstrumentedCursor
+from monitoring.metrics import METRICS_ENABLED
+
+
+class PoolExhaustedError(Exception):
+    """Raised when no connection becomes available within the checkout timeout."""
+
+
+class PooledConnection:
+    """Wraps a raw connection so that close() hands it back to the pool."""
+
+    __slots__ = ('_pool', '_raw', '_closed')
+
+    def __init__(self, pool: 'ConnectionPool', raw: pymysql.connections.Connection):
+        self._pool = pool
+        self._raw = raw
+        self._closed = False
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self._pool.release(self._raw)
+
+    def discard(self) -> None:
+        """Closes the underlying connection instead of returning it, e.g. after an abandoned streaming read."""
+        if self._closed:
+            return
+        self._closed = True
+        self._pool._discard(self._raw)
+
+    def cursor(self, cursor_class: Optional[type] = None) -> Any:
+        """Opens a cursor on the raw connection, wrapped so statements are counted and timed."""
+        if self._closed:
+            raise pymysql.err.InterfaceError(0, "Connection already returned to the pool")
+        cursor = self._raw.cursor(cursor_class)
+        return InstrumentedCursor(cursor) if METRICS_ENABLED else cursor
+
+    def __getattr__(self, name: str) -> Any:
+        if self._closed:
+            raise pymysql.err.InterfaceError(0, "Connection already returned to the pool")
+        return getattr(self._raw, name)
+
+    def __enter__(self) -> 'PooledConnection':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of database connections (pymysql, or the SQLite adapter of database/storage.py).
+
+    - Keeps at least `min_size` connections open and never more than `max_size`.
+    - Connections idle for longer than `health_check_interval` are pinged on checkout
+      and replaced if the server dropped them.
+    - A background reaper closes connections above `min_size` that stayed idle
+      for more than `idle_timeout` seconds.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[], pymysql.connections.Connection],
+        min_size: int = 1,
+        max_size: int = 10,
+        idle_timeout: float = 300.0,
+        health_check_interval: float = 30.0,
+        checkout_timeout: float = 30.0,
+    ):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError("Invalid pool size: require 0 <= min_size <= max_size and max_size >= 1")
+
+        self._factory = factory
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self.checkout_timeout = checkout_timeout
+
+        # Idle connections with the monotonic time they were returned (LIFO keeps hot ones warm)
+        self._idle: Deque[Tuple[pymysql.connections.Connection, float]] = deque()
+        self._size = 0
+        self._cond = threading.Condition()
+        self._closed = False
+        self._reaper: Optional[threading.Thread] = None
+        self._stop_reaper = threading.Event()
+
+        self._checkouts = 0
+        self._created = 0
+        self._discarded = 0
+        self._waits = 0
+
+    def _open(self) -> pymysql.connections.Connection:
+        try:
+            raw = self._factory()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._created += 1
+        return raw
+
+    def _discard(self, raw: pymysql.connections.Connection) -> None:
+        try:
+            raw.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._size -= 1
+            self._discarded += 1
+            self._cond.notify()
+
+    def _is_healthy(self, raw: pymysql.connections.Connection, idle_since: float) -> bool:
+        if time.monotonic() - idle_since < self.health_check_interval:
+            return raw.open
+        try:
+            raw.ping(reconnect=False)
+            return True
+        except Exception:
+            return False
+
+    def warm(self) -> None:
+        """Opens connections until `min_size` are available."""
+        while True:
+            with self._cond:
+                if self._closed or self._size >= self.min_size:
+                    return
+                self._size += 1
+            raw = self._open()
+            with self._cond:
+                self._idle.append((raw, time.monotonic()))
+                self._cond.notify()
+
+    def acquire(self) -> PooledConnection:
+        deadline = time.monotonic() + self.checkout_timeout
+        while True:
+            with self._cond:
+                if self._closed:
+                    raise pymysql.err.InterfaceError(0, "Connection pool is closed")
+                while not self._idle and self._size >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolExhaustedError(
+                            f"No database connection available after {self.checkout_timeout}s "
+                            f"(max_size={self.max_size})"
+                        )
+                    self._waits += 1
+                    self._cond.wait(remaining)
+                    if self._closed:
+                        raise pymysql.err.InterfaceError(0, "Connection pool is closed")
+
+                if self._idle:
+                    raw, idle_since = self._idle.pop()
+                else:
+                    raw, idle_since = None, 0.0
+                    self._size += 1
+
+            if raw is None:
+                raw = self._open()
+            elif not self._is_healthy(raw, idle_since):
+                self._discard(raw)
+                continue
+
+            with self._cond:
+                self._checkouts += 1
+            return PooledConnection(self, raw)
+
+    def release(self, raw: pymysql.connections.Connection) -> None:
+        # End any transaction left open (including the implicit snapshot a plain
+        # SELECT starts) so the next borrower never sees stale or half-written state.
+        try:
+            raw.rollback()
+        except Exception:
+            self._discard(raw)
+            return
+
+        with self._cond:
+            if not self._closed:
+                self._idle.append((raw, time.monotonic()))
+                self._cond.notify()
+                return
+        self._discard(raw)
+
+    def reap(self) -> int:
+        """Closes idle connections above `min_size` that exceeded `idle_timeout`."""
+        now = time.monotonic()
+        expired = []
+        with self._cond:
+            # Oldest connections sit at the left end of the deque
+            while self._idle and self._size - len(expired) > self.min_size:
+                raw, idle_since = self._idle[0]
+                if now - idle_since < self.idle_timeout:
+                    break
+                self._idle.popleft()
+                expired.append(raw)
+        for raw in expired:
+            self._discard(raw)
+        return len(expired)
+
+    def start_reaper(self, interval: Optional[float] = None) -> None:
+        if self._reaper is not None:
+            return
+        interval = interval or max(1.0, min(self.idle_timeout, 60.0))
+
+        def _run() -> None:
+            while not self._stop_reaper.wait(interval):
+                try:
+                    self.reap()
+                except Exception:
+                    pass
+
+        self._reaper = threading.Thread(target=_run, name="db-pool-reaper", daemon=True)
+        self._reaper.start()
+
+    def close(self) -> None:
+        """Closes idle connections now; connections still checked out are closed on release."""
+        self._stop_reaper.set()
+        with self._cond:
+            self._closed = True
+            idle = [raw for raw, _ in self._idle]
+            self._idle.clear()
+            self._cond.notify_all()
+        for raw in idle:
+            self._discard(raw)
+        if self._reaper is not None:
+            self._reaper.join(timeout=5)
+            self._reaper = None
+
+    def stats(self) -> Dict[str, int]:
+        with self._cond:
+            return {
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._size - len(self._idle),
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "checkouts": self._checkouts,
+                "created": self._created,
+                "discarded": self._discarded,
+                "waits": self._waits,
+            }
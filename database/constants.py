@@ -0,0 +1,11 @@
+"""
+Column layout shared by every module that reads or writes despesa rows.
+
+MESES is the single definition of the month columns and their order: the
+INSERT column lists, the tuple records, the columnar frame, the summary table
+and the history replay all follow it, so they can't disagree about where a
+month sits.
+"""
+
+MESES = ['janeiro', 'fevereiro', 'marco', 'abril', 'maio', 'junho',
+         'julho', 'agosto', 'setembro', 'outubro', 'novembro', 'dezembro']
@@ -0,0 +1,184 @@
+"""
+Parsing of Brazilian-real amounts as they come out of the spreadsheet.
+
+One set of rules for every caller (calculate_total through `sum_brl`, the CSV import):
+- "R$" and whitespace are ignored: " R$ 1.248,81 " -> 1248.81
+- with a decimal comma, dots are thousands separators: "3.312,00" -> 3312.0
+- without a comma, a dot followed by exactly three digits is a thousands
+  separator ("1.248" -> 1248.0); any other dot is a decimal point ("100.50" -> 100.5)
+- a lone dash is zero: "R$ -   " -> 0.0
+- blanks are "no value" (the `blank` argument, 0.0 by default)
+- numbers (int, float, Decimal) are taken as they are
+
+`parse_brl_column` works on a whole column at once. A column of distinct values
+is cleaned with a handful of bytes operations over the joined column and converted
+with one map(float); a column that repeats values (the common case in a budget
+sheet) parses every distinct string once. Columns the joined pass cannot take
+as-is (invalid cells, negatives, odd whitespace) go cell by cell, and invalid
+cells come back as None plus a CurrencyParseError.
+"""
+import re
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+# Shorter columns (e.g. the 12 months of one row) are parsed cell by cell
+BATCH_MIN_CELLS = 256
+_SAMPLE_SIZE = 1024
+
+_SEP = '\x00'
+
+# A dot that is not followed by exactly three digits is a decimal point
+_DECIMAL_DOT = re.compile(r'\.(?!\d\d\d[.,\x00])')
+_DECIMAL_DOT_BYTES = re.compile(_DECIMAL_DOT.pattern.encode('ascii'))
+_COMMA_TO_DOT = bytes.maketrans(b',', b'.')
+_NUMBER = re.compile(r'-?(?:\d+(?:\.\d*)?|\.\d+)')
+
+class CurrencyParseError(NamedTuple):
+    index: int
+    value: Any
+    message: str
+
+def _parse_text(raw: str) -> Tuple[Optional[float], Optional[str]]:
+    """(value, None) on success, (None, None) for blanks, (None, message) when invalid."""
+    text = ''.join(raw.replace('R$', '').split())
+    if not text:
+        return None, None
+    if text == '-':
+        return 0.0, None
+    if ',' in text:
+        number = text.replace('.', '').replace(',', '.')
+    elif '.' in text and not _DECIMAL_DOT.search(text + _SEP):
+        number = text.replace('.', '')
+    else:
+        number = text
+    # An optional sign, then digits with at most one dot (what _NUMBER matches), without the regex
+    unsigned = number.lstrip('-')
+    if len(number) - len(unsigned) <= 1 and unsigned.replace('.', '', 1).isdecimal():
+        return float(number), None
+    return None, f"Invalid currency value: {raw!r}"
+
+def parse_brl(value: Any) -> Optional[float]:
+    """Parses one cell; returns None for blanks and raises ValueError for invalid values."""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        parsed, error = _parse_text(value)
+        if error:
+            raise ValueError(error)
+        return parsed
+    return float(value)
+
+def sum_brl(values: Iterable[Any]) -> float:
+    """
+    Sum of a few cells (one row's months), one at a time: numbers are added as they
+    are and strings go through the per-cell rules. Blanks and invalid cells count as zero.
+    """
+    total = 0.0
+    for value in values:
+        if value is None:
+            continue
+        kind = type(value)
+        if kind is float or kind is int or kind is Decimal:
+            total += float(value)
+        elif kind is str:
+            number, _ = _parse_text(value)
+            if number is not None:
+                total += number
+    return total
+
+def _parse_joined(values: Sequence[Any]) -> Optional[List[float]]:
+    """
+    Converts a column of well-formed ASCII strings with a few bytes operations over
+    the whole joined column (blanks and dashes become 0.0). Returns None whenever a
+    cell needs the per-cell rules, so the caller can fall back without guessing.
+    """
+    try:
+        joined = (_SEP.join(values) + _SEP).encode('ascii')
+    except (TypeError, UnicodeEncodeError):
+        return None
+    # float() would accept exponents and digit separators; decimal dots need the per-cell rules
+    if b'e' in joined or b'E' in joined or b'_' in joined or _DECIMAL_DOT_BYTES.search(joined):
+        return None
+    # One pass drops spaces and thousands dots and turns the decimal comma into a dot
+    joined = b'\x00' + joined.replace(b'R$', b'').translate(_COMMA_TO_DOT, b' .')
+    if b'\x00.\x00' in joined:
+        # A cell that was only a comma
+        return None
+    if b'-' in joined:
+        # Two passes: adjacent "-" cells share a separator, so one pass only empties every other one
+        joined = joined.replace(b'\x00-\x00', b'\x00\x00').replace(b'\x00-\x00', b'\x00\x00')
+    # Every cell gets a leading "0", so blanks become "0" (and negatives fall back)
+    cells = joined.replace(b'\x00', b'\x000').split(b'\x00')[1:-1]
+    if len(cells) != len(values):
+        return None
+    try:
+        return list(map(float, cells))
+    except ValueError:
+        return None
+
+def _parse_cells(values: Sequence[Any], blank: Optional[float], dedupe: bool) -> Tuple[List[Optional[float]], List[CurrencyParseError]]:
+    parsed_text: Dict[str, Tuple[Optional[float], Optional[str]]] = {}
+    results: List[Optional[float]] = []
+    errors: List[CurrencyParseError] = []
+    append = results.append
+
+    for index, value in enumerate(values):
+        if isinstance(value, str):
+            entry = parsed_text.get(value) if dedupe else None
+            if entry is None:
+                entry = _parse_text(value)
+                if dedupe:
+                    parsed_text[value] = entry
+            number, error = entry
+            if error:
+                errors.append(CurrencyParseError(index, value, error))
+                append(None)
+            else:
+                append(blank if number is None else number)
+        elif value is None:
+            append(blank)
+        elif isinstance(value, (int, float, Decimal)) and not isinstance(value, bool):
+            append(float(value))
+        else:
+            errors.append(CurrencyParseError(index, value, f"Unsupported currency value: {value!r}"))
+            append(None)
+
+    return results, errors
+
+def _mostly_repeated(values: Sequence[Any]) -> bool:
+    """
+    Birthday estimate, from the collisions in a sample, of how many distinct amounts
+    the column holds; deduplicating pays off when that is small next to the column.
+    Blank and "R$ -" cells are left out of the sample (the joined pass handles them cheaply).
+    """
+    sample = [v for v in values[:_SAMPLE_SIZE] if isinstance(v, str) and v.strip(' R$-')]
+    collisions = len(sample) - len(set(sample))
+    if not collisions:
+        return False
+    distinct_estimate = len(sample) ** 2 / (2 * collisions)
+    return distinct_estimate * 4 < len(values)
+
+def parse_brl_column(values: Sequence[Any], blank: Optional[float] = 0.0) -> Tuple[List[Optional[float]], List[CurrencyParseError]]:
+    """
+    Parses a column of cells in one call. Returns the parsed values (blanks become
+    `blank`, invalid cells None) and one CurrencyParseError per invalid cell.
+    """
+    if len(values) < BATCH_MIN_CELLS:
+        return _parse_cells(values, blank, dedupe=False)
+
+    dedupe = _mostly_repeated(values)
+    if blank == 0.0:
+        if dedupe:
+            try:
+                unique = list(dict.fromkeys(values))
+            except TypeError:
+                unique = None
+            parsed = _parse_joined(unique) if unique is not None else None
+            if parsed is not None:
+                lookup = dict(zip(unique, parsed))
+                return [lookup[value] for value in values], []
+        else:
+            parsed = _parse_joined(values)
+            if parsed is not None:
+                return parsed, []
+    return _parse_cells(values, blank, dedupe)
@@ -0,0 +1,195 @@
+"""
+Storage of despesa_history: paginated reads, indexes and retention.
+
+Reads are keyset pages for one despesa, newest first by (timestamp, id), served by
+composite indexes: (despesa_id, field, timestamp) when a field is given and
+(despesa_id, timestamp) otherwise. InnoDB appends the primary key to both, so the
+id tie-break is in the index as well and a page never sorts.
+
+Retention: the newest checkpoint taken at or before NOW() - HISTORY_RETENTION_DAYS
+already reflects every history row up to its last_history_id, so those rows are
+compacted into it and deleted, in chunks of HISTORY_PURGE_CHUNK_ROWS with one short
+transaction each. Checkpoints older than it are dropped the same way, and the ones
+inside the window beyond the newest SNAPSHOT_KEEP are thinned to one per day, so
+point-in-time reads anywhere inside the window still find a checkpoint before them;
+revert only reaches versions still inside it.
+
+The background job runs every SNAPSHOT_INTERVAL_SECONDS: it takes a checkpoint when
+the history grew, then drops old checkpoints and expired history.
+
+Maintenance:
+    python -m database.history purge   # run one retention pass now
+"""
+import os
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from database.pagination import clamp_page_size, decode_cursor, encode_cursor, keyset_clause
+from database.snapshots import checkpoint_if_stale, checkpoints_to_drop, horizon_checkpoint
+from database.storage import get_storage
+
+HISTORY_JOB_INTERVAL = float(os.getenv('SNAPSHOT_INTERVAL_SECONDS', '3600'))
+HISTORY_RETENTION_DAYS = int(os.getenv('HISTORY_RETENTION_DAYS', '90'))
+HISTORY_PURGE_CHUNK_ROWS = int(os.getenv('HISTORY_PURGE_CHUNK_ROWS', '1000'))
+HISTORY_PURGE_PAUSE = float(os.getenv('HISTORY_PURGE_PAUSE_SECONDS', '0.05'))
+
+# (name, columns); the single-column despesa_id index is a prefix of both and is dropped
+HISTORY_INDEXES = [
+    ('idx_history_despesa_field_ts', 'despesa_id, field, timestamp'),
+    ('idx_history_despesa_ts', 'despesa_id, timestamp'),
+]
+
+def ensure_history_indexes(cursor) -> None:
+    """Creates the composite history indexes, if missing, and drops the redundant despesa_id one."""
+    storage = get_storage()
+    existing = storage.index_names(cursor, 'despesa_history')
+    for name, columns in HISTORY_INDEXES:
+        if name not in existing:
+            cursor.execute(storage.create_index_sql(name, 'despesa_history', columns))
+    if 'despesa_id' in existing:
+        cursor.execute(storage.drop_index_sql('despesa_id', 'despesa_history'))
+
+def history_page(
+    cursor,
+    despesa_id: int,
+    field: Optional[str] = None,
+    limit: Optional[int] = None,
+    cursor_token: Optional[str] = None
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """One page of a despesa's history, newest first, and the token for the next page (None on the last)."""
+    limit = clamp_page_size(limit)
+    where = " WHERE despesa_id = %s"
+    params: List[Any] = [despesa_id]
+    if field:
+        where += " AND field = %s"
+        params.append(field)
+    if cursor_token:
+        last_value, last_id = decode_cursor(cursor_token, 'timestamp', 'desc')
+        clause, clause_params = keyset_clause('timestamp', 'desc', last_value, last_id)
+        where += f" AND {clause}"
+        params.extend(clause_params)
+
+    # One extra row tells whether another page exists
+    cursor.execute(
+        f"SELECT * FROM finacias.despesa_history{where} ORDER BY timestamp DESC, id DESC LIMIT %s",
+        params + [limit + 1]
+    )
+    rows = cursor.fetchall()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor('timestamp', 'desc', str(last['timestamp']), last['id'])
+    return rows, next_cursor
+
+def _delete_in_chunks(connection, sql: str, params: List[Any], chunk_rows: int, pause: float) -> int:
+    """Runs `sql` (a DELETE ... LIMIT %s) until it deletes less than a chunk, committing each chunk."""
+    deleted = 0
+    while True:
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params + [chunk_rows])
+            count = cursor.rowcount
+        connection.commit()
+        deleted += count
+        if count < chunk_rows:
+            return deleted
+        if pause:
+            time.sleep(pause)
+
+def purge_history(
+    connection,
+    retention_days: Optional[int] = None,
+    chunk_rows: Optional[int] = None,
+    pause: Optional[float] = None
+) -> Dict[str, int]:
+    """
+    Drops old checkpoints, then deletes the history already compacted into the newest
+    checkpoint before the retention horizon. retention_days=0 keeps all history.
+    """
+    retention_days = HISTORY_RETENTION_DAYS if retention_days is None else retention_days
+    chunk_rows = chunk_rows or HISTORY_PURGE_CHUNK_ROWS
+    pause = HISTORY_PURGE_PAUSE if pause is None else pause
+
+    with connection.cursor() as cursor:
+        horizon = horizon_checkpoint(cursor, retention_days) if retention_days > 0 else None
+        dropped = checkpoints_to_drop(cursor, protect_id=horizon['id'] if horizon else None)
+    connection.commit()
+
+    for checkpoint_id in dropped:
+        # The checkpoint entry goes first, so no read picks a half-deleted checkpoint
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM finacias.despesa_checkpoints WHERE id = %s", (checkpoint_id,))
+        connection.commit()
+        _delete_in_chunks(
+            connection, "DELETE FROM finacias.despesa_checkpoint_rows WHERE checkpoint_id = %s LIMIT %s",
+            [checkpoint_id], chunk_rows, pause
+        )
+
+    purged = 0
+    if horizon:
+        purged = _delete_in_chunks(
+            connection, "DELETE FROM finacias.despesa_history WHERE id <= %s ORDER BY id LIMIT %s",
+            [horizon['last_history_id']], chunk_rows, pause
+        )
+    return {"checkpoints": len(dropped), "history_rows": purged}
+
+def run_history_job(get_connection: Callable[[], Any]) -> Dict[str, Any]:
+    """One round of the background job: checkpoint if the history grew, then purge."""
+    connection = get_connection()
+    try:
+        with connection.cursor() as cursor:
+            checkpoint = checkpoint_if_stale(cursor)
+        connection.commit()
+        return {"checkpoint": checkpoint, **purge_history(connection)}
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+
+_job: Optional[threading.Thread] = None
+_stop_job = threading.Event()
+
+def start_history_job(get_connection: Callable[[], Any], interval: Optional[float] = None) -> None:
+    global _job
+    interval = interval or HISTORY_JOB_INTERVAL
+    if _job is not None or interval <= 0:
+        return
+    _stop_job.clear()
+
+    def _run() -> None:
+        while not _stop_job.wait(interval):
+            try:
+                run_history_job(get_connection)
+            except Exception:
+                pass
+
+    _job = threading.Thread(target=_run, name="despesa-history-job", daemon=True)
+    _job.start()
+
+def stop_history_job() -> None:
+    global _job
+    _stop_job.set()
+    if _job is not None:
+        _job.join(timeout=5)
+        _job = None
+
+def main(argv: List[str]) -> int:
+    from database.connection_db import get_connection
+
+    if argv[1:] != ['purge']:
+        print("Usage: python -m database.history purge")
+        return 2
+
+    connection = get_connection()
+    try:
+        result = purge_history(connection)
+        print(f"Dropped {result['checkpoints']} checkpoints and {result['history_rows']} history rows.")
+        return 0
+    finally:
+        connection.close()
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,137 @@
+"""
+Statement, row and time accounting for every cursor handed out by the pool.
+
+PooledConnection.cursor() wraps the driver cursor in an InstrumentedCursor. Each
+execute/executemany and each fetch is timed; the time is recorded per SQL verb in
+the process-wide metrics and added to the QueryStats of the current request,
+which the HTTP middleware installs in a context variable (run_in_db copies the
+context onto the DB executor, so async routes are counted too). Calls outside a
+request, like the history job, only reach the process-wide metrics.
+
+Rows are the rows fetched for statements that return a result set and the
+affected rows for the others. Statements slower than SLOW_QUERY_MS are also
+handed to the slow-query log (database/slow_queries.py).
+"""
+import time
+from contextvars import ContextVar
+from typing import Any, Optional
+
+from database.slow_queries import record_if_slow
+from monitoring.metrics import DB_ROWS, DB_STATEMENT_SECONDS
+
+VERBS = {'select', 'insert', 'update', 'delete'}
+
+
+class QueryStats:
+    __slots__ = ('statements', 'rows', 'seconds')
+
+    def __init__(self):
+        self.statements = 0
+        self.rows = 0
+        self.seconds = 0.0
+
+
+_current: ContextVar[Optional[QueryStats]] = ContextVar('query_stats', default=None)
+
+def begin_request_stats():
+    """Installs a fresh QueryStats for the current context; returns (stats, token for end_request_stats)."""
+    stats = QueryStats()
+    return stats, _current.set(stats)
+
+def end_request_stats(token) -> None:
+    _current.reset(token)
+
+def current_query_stats() -> Optional[QueryStats]:
+    return _current.get()
+
+def _verb(sql: str) -> str:
+    head = sql.lstrip()[:7].split(None, 1)
+    verb = head[0].lower() if head else ''
+    return verb if verb in VERBS else 'other'
+
+
+class InstrumentedCursor:
+    """Delegates to a pymysql cursor, timing statements and counting rows."""
+
+    __slots__ = ('_cursor', '_verb', '_stats')
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self._verb = 'other'
+        self._stats = _current.get()
+
+    def _record(self, seconds: float, rows: int) -> None:
+        DB_STATEMENT_SECONDS.observe((self._verb,), seconds)
+        if rows:
+            DB_ROWS.inc((self._verb,), rows)
+        stats = self._stats
+        if stats is not None:
+            stats.statements += 1
+            stats.rows += rows
+            stats.seconds += seconds
+
+    def _affected(self) -> int:
+        # Result sets are counted as they are fetched
+        if self._cursor.description is not None:
+            return 0
+        rowcount = self._cursor.rowcount
+        return rowcount if rowcount and rowcount > 0 else 0
+
+    def execute(self, query: str, args: Any = None) -> int:
+        self._verb = _verb(query)
+        start = time.perf_counter()
+        try:
+            return self._cursor.execute(query, args)
+        finally:
+            seconds = time.perf_counter() - start
+            self._record(seconds, self._affected())
+            record_if_slow(query, args, seconds)
+
+    def executemany(self, query: str, args: Any) -> Optional[int]:
+        self._verb = _verb(query)
+        start = time.perf_counter()
+        try:
+            return self._cursor.executemany(query, args)
+        finally:
+            seconds = time.perf_counter() - start
+            self._record(seconds, self._affected())
+            record_if_slow(query, args, seconds, many=True)
+
+    def fetchone(self) -> Any:
+        start = time.perf_counter()
+        row = self._cursor.fetchone()
+        self._record_fetch(start, 0 if row is None else 1)
+        return row
+
+    def fetchmany(self, size: Optional[int] = None) -> Any:
+        start = time.perf_counter()
+        rows = self._cursor.fetchmany(size) if size is not None else self._cursor.fetchmany()
+        self._record_fetch(start, len(rows))
+        return rows
+
+    def fetchall(self) -> Any:
+        start = time.perf_counter()
+        rows = self._cursor.fetchall()
+        self._record_fetch(start, len(rows))
+        return rows
+
+    def _record_fetch(self, start: float, rows: int) -> None:
+        seconds = time.perf_counter() - start
+        if rows:
+            DB_ROWS.inc((self._verb,), rows)
+        stats = self._stats
+        if stats is not None:
+            stats.rows += rows
+            stats.seconds += seconds
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def __enter__(self) -> 'InstrumentedCursor':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._cursor.close()
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._cursor, name)
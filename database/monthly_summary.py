@@ -0,0 +1,222 @@
+"""
+Incrementally maintained per-column aggregates of controle_financeira_teste.
+
+`despesa_monthly_summary` keeps, for each month column and for `total`, the
+sum, the number of non-NULL values and the min/max. Every write path calls
+`apply_summary_delta()` inside its own transaction, after touching the base
+table and before committing, so the summary is never visible out of sync.
+
+Sums and counts move by delta. Min/max move by delta too, except when a write
+removes the current extreme; only then is that column's MIN/MAX recomputed
+from the base table (one statement for all affected columns).
+
+Maintenance:
+    python -m database.monthly_summary rebuild   # recompute everything from the base table
+    python -m database.monthly_summary check     # report drift between summary and base table
+"""
+import sys
+from decimal import Decimal, InvalidOperation
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from database.constants import MESES
+
+SUMMARY_COLUMNS = MESES + ['total']
+
+CENT = Decimal('0.01')
+
+CREATE_SUMMARY_TABLE = """
+    CREATE TABLE IF NOT EXISTS finacias.despesa_monthly_summary (
+        column_name VARCHAR(20) PRIMARY KEY,
+        total_sum DECIMAL(15, 2) NOT NULL DEFAULT 0,
+        row_count INT NOT NULL DEFAULT 0,
+        min_value DECIMAL(10, 2),
+        max_value DECIMAL(10, 2),
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+    )
+"""
+
+RowChange = Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]
+
+def _to_decimal(value: Any) -> Optional[Decimal]:
+    if value is None:
+        return None
+    if isinstance(value, Decimal):
+        return value.quantize(CENT)
+    try:
+        return Decimal(str(value)).quantize(CENT)
+    except (InvalidOperation, ValueError):
+        return None
+
+def _upsert(cursor, rows: List[Tuple[str, Decimal, int, Optional[Decimal], Optional[Decimal]]]) -> None:
+    if not rows:
+        return
+    placeholders = ', '.join(['(%s, %s, %s, %s, %s)'] * len(rows))
+    sql = f"""
+        INSERT INTO finacias.despesa_monthly_summary (column_name, total_sum, row_count, min_value, max_value)
+        VALUES {placeholders}
+        ON DUPLICATE KEY UPDATE
+            total_sum = VALUES(total_sum), row_count = VALUES(row_count),
+            min_value = VALUES(min_value), max_value = VALUES(max_value)
+    """
+    cursor.execute(sql, [v for row in rows for v in row])
+
+def apply_summary_delta(cursor, changes: Iterable[RowChange]) -> None:
+    """
+    Folds row changes into the summary. Each change is (old, new): old is None for
+    an insert, new is None for a delete; for updates both hold the changed columns.
+    Must run in the same transaction as the base-table write it describes.
+    """
+    removed: Dict[str, List[Decimal]] = {}
+    added: Dict[str, List[Decimal]] = {}
+    for old, new in changes:
+        is_update = bool(old) and bool(new)
+        old = {k.lower(): v for k, v in old.items()} if old else {}
+        new = {k.lower(): v for k, v in new.items()} if new else {}
+        for col in SUMMARY_COLUMNS:
+            if is_update and _to_decimal(old.get(col)) == _to_decimal(new.get(col)):
+                continue
+            if col in old:
+                value = _to_decimal(old[col])
+                if value is not None:
+                    removed.setdefault(col, []).append(value)
+            if col in new:
+                value = _to_decimal(new[col])
+                if value is not None:
+                    added.setdefault(col, []).append(value)
+
+    touched = [col for col in SUMMARY_COLUMNS if col in removed or col in added]
+    if not touched:
+        return
+
+    placeholders = ', '.join(['%s'] * len(touched))
+    cursor.execute(
+        f"SELECT * FROM finacias.despesa_monthly_summary WHERE column_name IN ({placeholders}) FOR UPDATE",
+        touched
+    )
+    current = {row['column_name']: row for row in cursor.fetchall()}
+
+    updated = {}
+    recompute = []
+    for col in touched:
+        row = current.get(col) or {}
+        old_values = removed.get(col, [])
+        new_values = added.get(col, [])
+        total_sum = (row.get('total_sum') or Decimal('0')) + sum(new_values, Decimal('0')) - sum(old_values, Decimal('0'))
+        row_count = (row.get('row_count') or 0) + len(new_values) - len(old_values)
+        min_value, max_value = row.get('min_value'), row.get('max_value')
+
+        if row_count <= 0:
+            row_count, min_value, max_value = 0, None, None
+        elif (min_value is not None and any(v <= min_value for v in old_values)) or \
+             (max_value is not None and any(v >= max_value for v in old_values)):
+            # An extreme may have left the column: only a scan can tell the new one
+            recompute.append(col)
+        else:
+            candidates_min = [v for v in [min_value] + new_values if v is not None]
+            candidates_max = [v for v in [max_value] + new_values if v is not None]
+            min_value = min(candidates_min) if candidates_min else None
+            max_value = max(candidates_max) if candidates_max else None
+
+        updated[col] = [total_sum, row_count, min_value, max_value]
+
+    if recompute:
+        select = ', '.join(f"MIN({col}) AS min_{col}, MAX({col}) AS max_{col}" for col in recompute)
+        cursor.execute(f"SELECT {select} FROM finacias.controle_financeira_teste")
+        extremes = cursor.fetchone() or {}
+        for col in recompute:
+            updated[col][2] = extremes.get(f"min_{col}")
+            updated[col][3] = extremes.get(f"max_{col}")
+
+    _upsert(cursor, [(col, *values) for col, values in updated.items()])
+
+def _scan_aggregates(cursor) -> Dict[str, Dict[str, Any]]:
+    select = ', '.join(
+        f"COALESCE(SUM({col}), 0) AS sum_{col}, COUNT({col}) AS count_{col}, "
+        f"MIN({col}) AS min_{col}, MAX({col}) AS max_{col}"
+        for col in SUMMARY_COLUMNS
+    )
+    cursor.execute(f"SELECT {select} FROM finacias.controle_financeira_teste")
+    res = cursor.fetchone() or {}
+    return {
+        col: {
+            "total_sum": _to_decimal(res.get(f"sum_{col}")) or Decimal('0.00'),
+            "row_count": int(res.get(f"count_{col}") or 0),
+            "min_value": _to_decimal(res.get(f"min_{col}")),
+            "max_value": _to_decimal(res.get(f"max_{col}")),
+        }
+        for col in SUMMARY_COLUMNS
+    }
+
+def rebuild_summary(cursor) -> None:
+    """Recomputes every summary row from one scan of the base table (caller commits)."""
+    # Writers lock summary rows before folding their delta, so holding these locks while
+    # scanning means every concurrent write is either in the scan or applied after it.
+    cursor.execute("SELECT column_name FROM finacias.despesa_monthly_summary FOR UPDATE")
+    aggregates = _scan_aggregates(cursor)
+    _upsert(cursor, [
+        (col, agg["total_sum"], agg["row_count"], agg["min_value"], agg["max_value"])
+        for col, agg in aggregates.items()
+    ])
+
+def check_summary_drift(cursor) -> List[Dict[str, Any]]:
+    """Compares the stored summary against a fresh scan and lists every mismatching field."""
+    expected = _scan_aggregates(cursor)
+    cursor.execute("SELECT * FROM finacias.despesa_monthly_summary")
+    stored = {row['column_name']: row for row in cursor.fetchall()}
+
+    drift = []
+    for col in SUMMARY_COLUMNS:
+        row = stored.get(col)
+        for field, value in expected[col].items():
+            actual = row.get(field) if row else None
+            if field in ('total_sum', 'min_value', 'max_value'):
+                actual = _to_decimal(actual)
+            if actual != value:
+                drift.append({"column": col, "field": field, "stored": actual, "expected": value})
+    return drift
+
+def read_summary(cursor, columns: Optional[List[str]] = None) -> Dict[str, Dict[str, Any]]:
+    columns = columns or SUMMARY_COLUMNS
+    placeholders = ', '.join(['%s'] * len(columns))
+    cursor.execute(
+        f"SELECT * FROM finacias.despesa_monthly_summary WHERE column_name IN ({placeholders})", columns
+    )
+    return {row['column_name']: row for row in cursor.fetchall()}
+
+def ensure_summary(cursor) -> None:
+    """Creates the summary table and builds it once if it is still empty."""
+    cursor.execute(CREATE_SUMMARY_TABLE)
+    cursor.execute("SELECT COUNT(*) AS n FROM finacias.despesa_monthly_summary")
+    if not cursor.fetchone()['n']:
+        rebuild_summary(cursor)
+
+def main(argv: List[str]) -> int:
+    from database.connection_db import get_connection
+
+    command = argv[1] if len(argv) > 1 else ''
+    if command not in ('rebuild', 'check'):
+        print("Usage: python -m database.monthly_summary [rebuild|check]")
+        return 2
+
+    connection = get_connection()
+    try:
+        with connection.cursor() as cursor:
+            if command == 'rebuild':
+                cursor.execute(CREATE_SUMMARY_TABLE)
+                rebuild_summary(cursor)
+                connection.commit()
+                print("Summary rebuilt.")
+                return 0
+
+            drift = check_summary_drift(cursor)
+            if not drift:
+                print("OK: summary matches the base table.")
+                return 0
+            for item in drift:
+                print(f"DRIFT {item['column']}.{item['field']}: stored={item['stored']} expected={item['expected']}")
+            return 1
+    finally:
+        connection.close()
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,73 @@
+"""
+Keyset (cursor) pagination helpers for the despesa listings.
+
+A continuation token is an opaque, URL-safe string holding the sort column,
+the direction and the (sort value, id) of the last row served. The next page
+starts strictly after that pair, which MySQL resolves with a range scan on the
+composite (sort column, id) index instead of an OFFSET scan.
+"""
+import base64
+import json
+import os
+from decimal import Decimal
+from typing import Any, List, Optional, Tuple
+
+from database.constants import MESES
+from database.storage import get_storage
+
+SORTABLE_COLUMNS = ['id', 'despesa', 'total'] + MESES
+
+DEFAULT_PAGE_SIZE = int(os.getenv('PAGE_SIZE_DEFAULT', '100'))
+MAX_PAGE_SIZE = int(os.getenv('PAGE_SIZE_MAX', '1000'))
+
+def encode_cursor(order_by: str, direction: str, last_value: Any, last_id: int) -> str:
+    if isinstance(last_value, Decimal):
+        last_value = str(last_value)
+    payload = json.dumps({"o": order_by, "d": direction, "v": last_value, "i": last_id}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(token: str, order_by: str, direction: str) -> Tuple[Any, int]:
+    """Returns (last sort value, last id); raises ValueError for malformed or mismatched tokens."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        last_value, last_id = payload["v"], int(payload["i"])
+        token_order, token_direction = payload["o"], payload["d"]
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if token_order != order_by or token_direction != direction:
+        raise ValueError("Cursor does not match the requested ordering")
+    return last_value, last_id
+
+def keyset_clause(order_by: str, direction: str, last_value: Any, last_id: int) -> Tuple[str, List[Any]]:
+    """
+    Builds the "rows after (last_value, last_id)" predicate for ORDER BY order_by, id.
+    MySQL sorts NULLs first ascending and last descending, and the predicate follows that.
+    """
+    if order_by == 'id':
+        return ("id > %s" if direction == 'asc' else "id < %s"), [last_id]
+
+    if direction == 'asc':
+        if last_value is None:
+            return f"(({order_by} IS NULL AND id > %s) OR {order_by} IS NOT NULL)", [last_id]
+        return f"({order_by} > %s OR ({order_by} = %s AND id > %s))", [last_value, last_value, last_id]
+
+    if last_value is None:
+        return f"({order_by} IS NULL AND id < %s)", [last_id]
+    return f"({order_by} < %s OR ({order_by} = %s AND id < %s) OR {order_by} IS NULL)", [last_value, last_value, last_id]
+
+def clamp_page_size(limit: Optional[int]) -> int:
+    if not limit:
+        return DEFAULT_PAGE_SIZE
+    return max(1, min(int(limit), MAX_PAGE_SIZE))
+
+def ensure_sort_indexes(cursor) -> None:
+    """Creates the composite (column, id) index behind every sortable column, if missing."""
+    storage = get_storage()
+    existing = storage.index_names(cursor, 'controle_financeira_teste')
+    for col in SORTABLE_COLUMNS:
+        if col == 'id':
+            continue
+        index_name = f"idx_{col}_id"
+        if index_name not in existing:
+            cursor.execute(storage.create_index_sql(index_name, 'controle_financeira_teste', f"{col}, id"))
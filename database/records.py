@@ -0,0 +1,76 @@
+"""
+Compact despesa record for the listing paths.
+
+A DespesaRecord is one flat tuple (id, despesa, janeiro..dezembro, total): a
+single allocation per row instead of the DictCursor dict, its lowercased copy,
+the nested monthly_data dict and the Pydantic model. Records are built straight
+from tuple-cursor rows and encoded straight to DespesaResponseNested-shaped JSON
+bytes with orjson (`dump_records`); the routes keep their response_model for the
+OpenAPI schema (see routes/responses.py).
+"""
+from typing import Any, Dict, Mapping, NamedTuple, Optional, Sequence
+
+import orjson
+
+from database.constants import MESES
+
+class DespesaRecord(NamedTuple):
+    id: int
+    despesa: str
+    janeiro: Optional[float]
+    fevereiro: Optional[float]
+    marco: Optional[float]
+    abril: Optional[float]
+    maio: Optional[float]
+    junho: Optional[float]
+    julho: Optional[float]
+    agosto: Optional[float]
+    setembro: Optional[float]
+    outubro: Optional[float]
+    novembro: Optional[float]
+    dezembro: Optional[float]
+    total: float
+
+    @classmethod
+    def from_row(cls, row: Sequence[Any]) -> 'DespesaRecord':
+        """From a row shaped like FRAME_SELECT_SQL (extra trailing columns are ignored); total as calculate_total."""
+        months = [None if v is None else float(v) for v in row[2:2 + len(MESES)]]
+        total = round(sum(v for v in months if v is not None), 2)
+        return cls(row[0], row[1], *months, total)
+
+    @classmethod
+    def from_mapping(cls, row: Mapping[str, Any]) -> 'DespesaRecord':
+        """From a normalize_keys dict (lowercase keys, total already computed)."""
+        months = [None if row.get(mes) is None else float(row[mes]) for mes in MESES]
+        total = row.get('total')
+        return cls(row['id'], row['despesa'], *months, float(total) if total is not None else 0.0)
+
+    @property
+    def months(self) -> Sequence[Optional[float]]:
+        return self[2:14]
+
+    def to_nested(self) -> Dict[str, Any]:
+        """The format_response_nested dict, for callers that still want one."""
+        return {
+            "id": self[0],
+            "despesa": self[1],
+            "monthly_data": dict(zip(MESES, self[2:14])),
+            "annual_total": self[14]
+        }
+
+# Records per orjson.dumps call: keeps the transient per-row dicts of a large listing bounded
+DUMP_CHUNK_ROWS = 1000
+
+def dump_records(records: Sequence[DespesaRecord]) -> bytes:
+    """A JSON array of records in the DespesaResponseNested shape, encoded with orjson."""
+    if len(records) <= DUMP_CHUNK_ROWS:
+        return orjson.dumps([record.to_nested() for record in records])
+    parts = [
+        orjson.dumps([record.to_nested() for record in records[start:start + DUMP_CHUNK_ROWS]])[1:-1]
+        for start in range(0, len(records), DUMP_CHUNK_ROWS)
+    ]
+    return b'[' + b','.join(parts) + b']'
+
+def dump_page(records: Sequence[DespesaRecord], next_cursor: Optional[str]) -> bytes:
+    """The {"data": [...], "next_cursor": ...} body of GET /despesas."""
+    return b'{"data":' + dump_records(records) + b',"next_cursor":' + orjson.dumps(next_cursor) + b'}'
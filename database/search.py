@@ -0,0 +1,80 @@
+"""
+Full-text search over the expense name.
+
+Searches go through a FULLTEXT index built with MySQL's ngram parser, so they
+are index lookups instead of `LIKE '%term%'` scans and match inside words. Rows
+are selected with the whole term as one boolean-mode phrase: a natural-language
+query ORs the term's bigrams, so "medico" would also find "Mercado" through
+"me". The natural-language score is kept only to rank the matches. The index is
+built without stopwords, which would otherwise drop every bigram containing
+one ("a", "in", ...). Matching follows the column collation:
+with the MySQL 8 default (utf8mb4_0900_ai_ci) "convenio medico" finds
+"Convênio Médico" and "DR. CONSULTA" finds "Dr. Consulta".
+
+Backends without FULLTEXT (SQLite) always take the LIKE path: a scan, case-
+insensitive for ASCII only, every match with relevance 0 (newest first).
+"""
+from decimal import Decimal
+from typing import Any, List, Optional, Tuple
+
+from database.storage import get_storage
+
+SEARCH_INDEX_NAME = 'ft_despesa_ngram'
+
+# Default ngram_token_size; shorter terms produce no tokens and fall back to LIKE
+NGRAM_TOKEN_SIZE = 2
+
+MATCH_EXPRESSION = "MATCH(despesa) AGAINST (%s IN BOOLEAN MODE)"
+
+# Fixed-point, so the score in a continuation token compares exactly with the recomputed one
+RELEVANCE_EXPRESSION = "CAST(MATCH(despesa) AGAINST (%s IN NATURAL LANGUAGE MODE) AS DECIMAL(20, 6))"
+
+def normalize_term(term: Optional[str]) -> str:
+    return ' '.join((term or '').split())
+
+def _phrase(term: str) -> str:
+    # Quotes would end the phrase early; inside it, boolean operators are plain text
+    return '"' + normalize_term(term.replace('"', ' ')) + '"'
+
+def uses_fulltext(term: str) -> bool:
+    return get_storage().fulltext and len(term.replace(' ', '').replace('"', '')) >= NGRAM_TOKEN_SIZE
+
+def search_clause(term: str) -> Tuple[str, List[Any]]:
+    """WHERE fragment selecting rows that contain `term`."""
+    if uses_fulltext(term):
+        return MATCH_EXPRESSION, [_phrase(term)]
+    return "despesa LIKE %s", [f"%{term}%"]
+
+def relevance_select(term: str) -> Tuple[str, List[Any]]:
+    """SELECT-list expression for the relevance score (0 when the LIKE fallback is used)."""
+    if uses_fulltext(term):
+        return f"{RELEVANCE_EXPRESSION} AS relevance", [term]
+    return "0 AS relevance", []
+
+def relevance_keyset_clause(term: str, last_score: Any, last_id: int) -> Tuple[str, List[Any]]:
+    """
+    Rows after (last_score, last_id) in ORDER BY relevance DESC, id DESC. Scores are
+    DECIMAL(20, 6), carried as text in the token and sent back as a Decimal, so rows
+    tied on the score are told apart by id alone.
+    """
+    if not uses_fulltext(term):
+        return "id < %s", [last_id]
+    last_score = Decimal(str(last_score))
+    return (
+        f"({RELEVANCE_EXPRESSION} < %s OR ({RELEVANCE_EXPRESSION} = %s AND id < %s))",
+        [term, last_score, term, last_score, last_id]
+    )
+
+def ensure_search_index(cursor) -> None:
+    storage = get_storage()
+    if not storage.fulltext:
+        return
+    if SEARCH_INDEX_NAME not in storage.index_names(cursor, 'controle_financeira_teste'):
+        # The stopword setting is read when the index is built and kept with it
+        cursor.execute("SET SESSION innodb_ft_enable_stopword = OFF")
+        try:
+            cursor.execute(
+                f"CREATE FULLTEXT INDEX {SEARCH_INDEX_NAME} ON finacias.controle_financeira_teste (despesa) WITH PARSER ngram"
+            )
+        finally:
+            cursor.execute("SET SESSION innodb_ft_enable_stopword = DEFAULT")
@@ -0,0 +1,218 @@
+"""
+Slow-query log with EXPLAIN plans captured off the request path.
+
+InstrumentedCursor reports every statement whose execute took at least
+SLOW_QUERY_MS. For each one this module keeps, in a ring buffer of the last
+SLOW_QUERY_BUFFER entries: the normalized SQL (literals and placeholders turned
+into `?`, IN lists folded), the shapes of the bound parameters (types and
+lengths, never the values), the data-access function that issued it and the
+duration. It is also logged through the `database.slow_queries` logger.
+
+The EXPLAIN runs later on a single background thread with its own pooled
+connection and the original parameters, which are held only until then. Plans
+are reused per normalized statement for SLOW_QUERY_EXPLAIN_TTL seconds and the
+EXPLAIN queue is bounded, so a burst of slow queries never turns into a burst of
+EXPLAINs. Statements MySQL cannot EXPLAIN (DDL, SHOW, ...) are logged without a plan.
+On the SQLite backend the plan is the rows of EXPLAIN QUERY PLAN.
+
+Configuration (environment):
+- SLOW_QUERY_MS: threshold in milliseconds (default 200; 0 turns the log off).
+- SLOW_QUERY_BUFFER: entries kept for GET /admin/slow-queries (default 200).
+- SLOW_QUERY_EXPLAIN_TTL: seconds a captured plan is reused (default 300).
+- SLOW_QUERY_EXPLAIN_QUEUE: pending EXPLAINs before new ones are skipped (default 32).
+"""
+import logging
+import os
+import queue
+import re
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+SLOW_QUERY_SECONDS = float(os.getenv('SLOW_QUERY_MS', '200')) / 1000
+SLOW_QUERY_BUFFER = int(os.getenv('SLOW_QUERY_BUFFER', '200'))
+SLOW_QUERY_EXPLAIN_TTL = float(os.getenv('SLOW_QUERY_EXPLAIN_TTL', '300'))
+SLOW_QUERY_EXPLAIN_QUEUE = int(os.getenv('SLOW_QUERY_EXPLAIN_QUEUE', '32'))
+
+EXPLAINABLE = ('select', 'insert', 'update', 'delete', 'replace')
+
+logger = logging.getLogger(__name__)
+
+_STRING = re.compile(r"'(?:[^'\\]|\\.|'')*'")
+_NUMBER = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%s|%\(\w+\)s")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_VALUES_LIST = re.compile(r"(\(\?(?:, \?)*\))(?:\s*,\s*\1)+")
+_SPACE = re.compile(r"\s+")
+
+def normalize_sql(sql: str) -> str:
+    """Turns a statement into its shape: `WHERE id IN (1, 2, 3)` and `WHERE id IN (%s, %s)` both become `WHERE id IN (?+)`."""
+    sql = _SPACE.sub(' ', sql).strip()
+    sql = _STRING.sub('?', sql)
+    sql = _PLACEHOLDER.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _VALUES_LIST.sub(r'\1, ...', sql)
+    return _IN_LIST.sub('(?+)', sql)
+
+def _shape(value: Any) -> str:
+    if isinstance(value, (str, bytes)):
+        return f"{type(value).__name__}[{len(value)}]"
+    if isinstance(value, (list, tuple)):
+        kinds = sorted({_shape(v) if isinstance(v, (list, tuple, dict)) else type(v).__name__ for v in value})
+        return f"{type(value).__name__}[{len(value)}] of {'|'.join(kinds)}" if kinds else f"{type(value).__name__}[0]"
+    if isinstance(value, dict):
+        return "dict{" + ", ".join(f"{k}: {_shape(v)}" for k, v in value.items()) + "}"
+    return type(value).__name__
+
+def param_shapes(args: Any) -> Any:
+    """Types and lengths of the bound parameters, without their values."""
+    if args is None:
+        return None
+    if isinstance(args, dict):
+        return {key: _shape(value) for key, value in args.items()}
+    if isinstance(args, (list, tuple)):
+        return [_shape(value) for value in args]
+    return _shape(args)
+
+_SKIP_FILES = (
+    os.path.join('database', 'instrumentation.py'), os.path.join('database', 'slow_queries.py'),
+    os.path.join('database', 'storage.py'),
+)
+
+def calling_function() -> str:
+    """The first frame outside the driver and the instrumentation: the data-access function that ran the statement."""
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if not filename.endswith(_SKIP_FILES) and f"{os.sep}pymysql{os.sep}" not in filename:
+            module = frame.f_globals.get('__name__', '?')
+            return f"{module}.{frame.f_code.co_name}:{frame.f_lineno}"
+        frame = frame.f_back
+    return '?'
+
+
+class SlowQueryLog:
+    """Ring buffer of slow statements plus the background EXPLAIN worker."""
+
+    def __init__(self, maxlen: int = 200, explain_ttl: float = 300.0, explain_queue: int = 32):
+        self._entries: Deque[Dict[str, Any]] = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+        self._next_id = 1
+        self._total = 0
+        self._explain_ttl = explain_ttl
+        self._plans: Dict[str, Tuple[float, Any]] = {}
+        self._queue: 'queue.Queue[Tuple[Dict[str, Any], str, Any]]' = queue.Queue(maxsize=explain_queue)
+        self._worker: Optional[threading.Thread] = None
+
+    def record(self, sql: str, args: Any, seconds: float, many: bool = False) -> Dict[str, Any]:
+        normalized = normalize_sql(sql)
+        verb = normalized.split(' ', 1)[0].lower()
+        entry = {
+            "sql": normalized,
+            # executemany: the shape of the whole batch; its first row stands in for the EXPLAIN
+            "params": _shape(args) if many else param_shapes(args),
+            "caller": calling_function(),
+            "duration_ms": round(seconds * 1000, 3),
+            "at": datetime.now().isoformat(timespec='milliseconds'),
+            "plan": None,
+            "plan_status": "pending" if verb in EXPLAINABLE else "not_explainable",
+        }
+        with self._lock:
+            entry["id"] = self._next_id
+            self._next_id += 1
+            self._total += 1
+            cached = self._plans.get(normalized)
+            if entry["plan_status"] == "pending" and cached and cached[0] > time.monotonic():
+                entry["plan"], entry["plan_status"] = cached[1], "cached"
+            self._entries.append(entry)
+
+        logger.warning("slow query %.1f ms in %s: %s params=%s",
+                       entry["duration_ms"], entry["caller"], normalized, entry["params"])
+        if entry["plan_status"] == "pending":
+            if many:
+                args = args[0] if args else None
+            self._submit(entry, sql, args)
+        return entry
+
+    def _submit(self, entry: Dict[str, Any], sql: str, args: Any) -> None:
+        try:
+            self._queue.put_nowait((entry, sql, args))
+        except queue.Full:
+            entry["plan_status"] = "skipped"
+            return
+        if self._worker is None:
+            with self._lock:
+                if self._worker is None:
+                    self._worker = threading.Thread(target=self._explain_loop, name="slow-query-explain", daemon=True)
+                    self._worker.start()
+
+    def _explain_loop(self) -> None:
+        while True:
+            entry, sql, args = self._queue.get()
+            try:
+                self._explain(entry, sql, args)
+            finally:
+                self._queue.task_done()
+
+    def _explain(self, entry: Dict[str, Any], sql: str, args: Any) -> None:
+        with self._lock:
+            cached = self._plans.get(entry["sql"])
+        if cached and cached[0] > time.monotonic():
+            entry["plan"], entry["plan_status"] = cached[1], "cached"
+            return
+        from database.connection_db import get_connection
+
+        try:
+            connection = get_connection()
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute(f"EXPLAIN {sql}", args)
+                    plan = [dict(row) for row in cursor.fetchall()]
+                connection.rollback()
+            finally:
+                connection.close()
+        except Exception as e:
+            entry["plan"], entry["plan_status"] = str(e), "failed"
+            return
+        with self._lock:
+            self._plans[entry["sql"]] = (time.monotonic() + self._explain_ttl, plan)
+        entry["plan"], entry["plan_status"] = plan, "captured"
+
+    def wait_for_plans(self) -> None:
+        """Blocks until every queued EXPLAIN finished (for scripts and tests)."""
+        self._queue.join()
+
+    def entries(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Newest first."""
+        with self._lock:
+            entries = list(self._entries)
+        entries.reverse()
+        return [dict(entry) for entry in entries[:limit]]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._plans.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "threshold_ms": SLOW_QUERY_SECONDS * 1000,
+                "total": self._total,
+                "buffered": len(self._entries),
+                "explain_queue": self._queue.qsize(),
+            }
+
+
+_log = SlowQueryLog(SLOW_QUERY_BUFFER, SLOW_QUERY_EXPLAIN_TTL, SLOW_QUERY_EXPLAIN_QUEUE)
+
+def get_slow_query_log() -> SlowQueryLog:
+    return _log
+
+def record_if_slow(sql: str, args: Any, seconds: float, many: bool = False) -> None:
+    """Called by InstrumentedCursor after each execute; EXPLAIN statements are never recorded themselves."""
+    if SLOW_QUERY_SECONDS > 0 and seconds >= SLOW_QUERY_SECONDS and not sql.lstrip()[:7].upper().startswith('EXPLAIN'):
+        _log.record(sql, args, seconds, many)
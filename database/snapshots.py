@@ -0,0 +1,279 @@
+"""
+Point-in-time state of controle_financeira_teste, rebuilt from checkpoints and despesa_history.
+
+A checkpoint copies every row into `despesa_checkpoint_rows` and records the last
+history id it already reflects. The state as of T starts from the newest checkpoint
+taken at or before T and reads only the history written after it:
+- rows in the checkpoint roll forward through their changes up to T;
+- rows (re)created after the checkpoint (a '#created' entry up to T) take, for each
+  month, the old_value of its first change after T, or the current value when it has
+  not changed since. Deletes log every month's last value, so deleted rows rewind too.
+
+Every write path logs to despesa_history for this to hold: month changes as before,
+plus one '#created' entry per inserted row and, on delete, the month values and a
+'#deleted' entry. Only the months are versioned; totals are recomputed from them and
+names are the checkpoint's (or the current one for rows created after it).
+
+Checkpoints are taken at startup when there is none, on demand and by the history
+job in database/history.py, which also drops old checkpoints and expired history.
+
+Maintenance:
+    python -m database.snapshots checkpoint   # take a checkpoint now
+"""
+import os
+import sys
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from database.constants import MESES
+
+ROW_CREATED = '#created'
+ROW_DELETED = '#deleted'
+
+CHECKPOINT_KEEP = max(1, int(os.getenv('SNAPSHOT_KEEP', '48')))
+
+CREATE_CHECKPOINTS_TABLE = """
+    CREATE TABLE IF NOT EXISTS finacias.despesa_checkpoints (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        taken_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        last_history_id INT NOT NULL DEFAULT 0,
+        row_count INT NOT NULL DEFAULT 0,
+        INDEX (taken_at)
+    )
+"""
+
+CREATE_CHECKPOINT_ROWS_TABLE = f"""
+    CREATE TABLE IF NOT EXISTS finacias.despesa_checkpoint_rows (
+        checkpoint_id INT NOT NULL,
+        despesa_id INT NOT NULL,
+        despesa VARCHAR(100),
+        {', '.join(f'{mes} DECIMAL(10, 2)' for mes in MESES)},
+        PRIMARY KEY (checkpoint_id, despesa_id)
+    )
+"""
+
+HISTORY_INSERT = """
+    INSERT INTO finacias.despesa_history (despesa_id, field, old_value, new_value, user_id)
+    VALUES (%s, %s, %s, %s, %s)
+"""
+
+HistoryEntry = Tuple[int, str, Optional[Any], Optional[Any], Optional[int]]
+
+def created_entries(ids: Iterable[int], user_id: Optional[int] = None) -> List[HistoryEntry]:
+    return [(despesa_id, ROW_CREATED, None, None, user_id) for despesa_id in ids]
+
+def deleted_entries(rows: Iterable[Dict[str, Any]], user_id: Optional[int] = None) -> List[HistoryEntry]:
+    """The last value of every non-NULL month of each deleted row, then its '#deleted' marker."""
+    entries = []
+    for row in rows:
+        row = {k.lower(): v for k, v in row.items()}
+        entries.extend((row['id'], mes, row[mes], None, user_id) for mes in MESES if row.get(mes) is not None)
+        entries.append((row['id'], ROW_DELETED, None, None, user_id))
+    return entries
+
+def log_history(cursor, entries: List[HistoryEntry]) -> None:
+    """Writes history entries with one executemany (one multi-row INSERT)."""
+    if entries:
+        cursor.executemany(HISTORY_INSERT, entries)
+
+def take_checkpoint(cursor) -> Dict[str, Any]:
+    """
+    Copies the table into a new checkpoint (caller commits). INSERT ... SELECT holds
+    shared next-key locks on the whole table, so writers that touched a row have
+    committed (with their history) before the copy ends and new ones wait for the commit:
+    the copy reflects exactly the history up to the MAX(id) read after it.
+    """
+    cursor.execute("INSERT INTO finacias.despesa_checkpoints (last_history_id, row_count) VALUES (0, 0)")
+    checkpoint_id = cursor.lastrowid
+    months = ', '.join(MESES)
+    cursor.execute(f"""
+        INSERT INTO finacias.despesa_checkpoint_rows (checkpoint_id, despesa_id, despesa, {months})
+        SELECT %s, id, despesa, {months} FROM finacias.controle_financeira_teste
+    """, (checkpoint_id,))
+    row_count = cursor.rowcount
+    cursor.execute("SELECT COALESCE(MAX(id), 0) AS last_id FROM finacias.despesa_history")
+    last_history_id = cursor.fetchone()['last_id']
+    # Stamped after the copy, so no change it reflects is newer than taken_at
+    cursor.execute("""
+        UPDATE finacias.despesa_checkpoints SET taken_at = CURRENT_TIMESTAMP, last_history_id = %s, row_count = %s
+        WHERE id = %s
+    """, (last_history_id, row_count, checkpoint_id))
+    cursor.execute("SELECT * FROM finacias.despesa_checkpoints WHERE id = %s", (checkpoint_id,))
+    return cursor.fetchone()
+
+def checkpoint_if_stale(cursor) -> Optional[Dict[str, Any]]:
+    """Takes a checkpoint unless the newest one already reflects the whole history."""
+    # Locking read: the decision and the checkpoint are one write transaction, also on SQLite
+    cursor.execute("SELECT last_history_id FROM finacias.despesa_checkpoints ORDER BY id DESC LIMIT 1 FOR UPDATE")
+    latest = cursor.fetchone()
+    cursor.execute("SELECT COALESCE(MAX(id), 0) AS last_id FROM finacias.despesa_history")
+    if latest is not None and latest['last_history_id'] >= cursor.fetchone()['last_id']:
+        return None
+    return take_checkpoint(cursor)
+
+def horizon_checkpoint(cursor, retention_days: int) -> Optional[Dict[str, Any]]:
+    """The newest checkpoint taken at or before NOW() - retention_days (None if there is none)."""
+    cursor.execute("""
+        SELECT * FROM finacias.despesa_checkpoints WHERE taken_at <= NOW() - INTERVAL %s DAY
+        ORDER BY taken_at DESC, id DESC LIMIT 1
+    """, (retention_days,))
+    return cursor.fetchone()
+
+def checkpoints_to_drop(cursor, keep: Optional[int] = None, protect_id: Optional[int] = None) -> List[int]:
+    """
+    Ids of the checkpoints to drop. The newest `keep` stay (at least one); older ones
+    are thinned to the newest of each day, so a point-in-time read anywhere in the
+    retention window finds a checkpoint at most a day before it. `protect_id` (the
+    retention horizon) always stays and every checkpoint older than it goes.
+    """
+    keep = max(1, keep or CHECKPOINT_KEEP)
+    cursor.execute("SELECT id, taken_at FROM finacias.despesa_checkpoints ORDER BY taken_at DESC, id DESC")
+    days_kept = set()
+    drop = []
+    past_horizon = False
+    for position, checkpoint in enumerate(cursor.fetchall()):
+        day = checkpoint['taken_at'].date()
+        if checkpoint['id'] == protect_id:
+            past_horizon = True
+        elif past_horizon or (position >= keep and day in days_kept):
+            drop.append(checkpoint['id'])
+            continue
+        days_kept.add(day)
+    return drop
+
+def list_checkpoints(cursor) -> List[Dict[str, Any]]:
+    cursor.execute("SELECT * FROM finacias.despesa_checkpoints ORDER BY id DESC")
+    return cursor.fetchall()
+
+def ensure_snapshots(cursor) -> None:
+    """Creates the checkpoint tables and takes the first checkpoint if there is none."""
+    cursor.execute(CREATE_CHECKPOINTS_TABLE)
+    cursor.execute(CREATE_CHECKPOINT_ROWS_TABLE)
+    cursor.execute("SELECT COUNT(*) AS n FROM finacias.despesa_checkpoints")
+    if not cursor.fetchone()['n']:
+        take_checkpoint(cursor)
+
+def replay(
+    checkpoint_rows: Dict[int, Dict[str, Any]],
+    forward: List[Dict[str, Any]],
+    after: List[Dict[str, Any]],
+    current_rows: Dict[int, Dict[str, Any]]
+) -> Dict[int, Dict[str, Any]]:
+    """
+    Rebuilds {id: row} as of T. `forward` holds the history after the checkpoint up to
+    T, `after` the entries after T of the rows (re)created in between, both in id
+    order; `current_rows` the current rows for those ids.
+    """
+    state = {despesa_id: dict(row) for despesa_id, row in checkpoint_rows.items()}
+    reborn = set()
+    for entry in forward:
+        despesa_id, field = entry['despesa_id'], entry['field']
+        if field == ROW_CREATED:
+            state[despesa_id] = {'id': despesa_id}
+            reborn.add(despesa_id)
+        elif field == ROW_DELETED:
+            state.pop(despesa_id, None)
+            reborn.discard(despesa_id)
+        elif despesa_id in state and field in MESES and despesa_id not in reborn:
+            state[despesa_id][field] = entry['new_value']
+
+    # Rewind until the row's first delete after T: a month it did not log was NULL, and
+    # the current row (if any) is a later incarnation
+    first_after: Dict[Tuple[int, str], Any] = {}
+    ended = set()
+    for entry in after:
+        despesa_id = entry['despesa_id']
+        if despesa_id in ended:
+            continue
+        if entry['field'] == ROW_DELETED:
+            ended.add(despesa_id)
+        elif entry['field'] in MESES:
+            first_after.setdefault((despesa_id, entry['field']), entry['old_value'])
+
+    for despesa_id in reborn:
+        current = current_rows.get(despesa_id) or {}
+        row = state[despesa_id]
+        row['despesa'] = current.get('despesa', '')
+        for mes in MESES:
+            key = (despesa_id, mes)
+            if key in first_after:
+                row[mes] = first_after[key]
+            else:
+                row[mes] = None if despesa_id in ended else current.get(mes)
+    return state
+
+def nearest_checkpoint(cursor, at: datetime) -> Dict[str, Any]:
+    cursor.execute(
+        "SELECT * FROM finacias.despesa_checkpoints WHERE taken_at <= %s ORDER BY taken_at DESC, id DESC LIMIT 1",
+        (at,)
+    )
+    checkpoint = cursor.fetchone()
+    if checkpoint is None:
+        raise ValueError(f"No checkpoint at or before {at}")
+    return checkpoint
+
+def state_as_of(cursor, at: datetime, ids: Optional[List[int]] = None) -> Tuple[Dict[str, Any], Dict[int, Dict[str, Any]]]:
+    """(checkpoint used, {id: row with despesa and months}) as of `at`, for every row or only `ids`."""
+    checkpoint = nearest_checkpoint(cursor, at)
+    months = ', '.join(MESES)
+    id_filter, id_params = '', []
+    if ids is not None:
+        if not ids:
+            return checkpoint, {}
+        id_filter = f" AND despesa_id IN ({', '.join(['%s'] * len(ids))})"
+        id_params = list(ids)
+
+    cursor.execute(
+        f"SELECT despesa_id AS id, despesa, {months} FROM finacias.despesa_checkpoint_rows "
+        f"WHERE checkpoint_id = %s{id_filter}",
+        [checkpoint['id']] + id_params
+    )
+    checkpoint_rows = {row['id']: row for row in cursor.fetchall()}
+
+    # A primary-key range scan: only the history written after the checkpoint is read
+    cursor.execute(
+        "SELECT despesa_id, field, new_value FROM finacias.despesa_history "
+        f"WHERE id > %s AND timestamp <= %s{id_filter} ORDER BY id",
+        [checkpoint['last_history_id'], at] + id_params
+    )
+    forward = cursor.fetchall()
+
+    created = list(dict.fromkeys(e['despesa_id'] for e in forward if e['field'] == ROW_CREATED))
+    after: List[Dict[str, Any]] = []
+    current_rows: Dict[int, Dict[str, Any]] = {}
+    if created:
+        placeholders = ', '.join(['%s'] * len(created))
+        cursor.execute(
+            "SELECT despesa_id, field, old_value FROM finacias.despesa_history "
+            f"WHERE despesa_id IN ({placeholders}) AND id > %s AND timestamp > %s ORDER BY id",
+            created + [checkpoint['last_history_id'], at]
+        )
+        after = cursor.fetchall()
+        cursor.execute(
+            f"SELECT id, despesa, {months} FROM finacias.controle_financeira_teste WHERE id IN ({placeholders})",
+            created
+        )
+        current_rows = {row['id']: row for row in cursor.fetchall()}
+
+    return checkpoint, replay(checkpoint_rows, forward, after, current_rows)
+
+def main(argv: List[str]) -> int:
+    from database.connection_db import get_connection
+
+    if argv[1:] != ['checkpoint']:
+        print("Usage: python -m database.snapshots checkpoint")
+        return 2
+
+    connection = get_connection()
+    try:
+        with connection.cursor() as cursor:
+            checkpoint = take_checkpoint(cursor)
+            connection.commit()
+            print(f"Checkpoint {checkpoint['id']}: {checkpoint['row_count']} rows, "
+                  f"history up to id {checkpoint['last_history_id']}.")
+            return 0
+    finally:
+        connection.close()
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,319 @@
+"""
+Storage backends behind the data-access functions.
+
+The data-access modules are written in MySQL's dialect against the `finacias`
+schema and talk to a pymysql-style connection. A backend supplies that
+connection plus the few things that are not plain SQL: how to list and create
+indexes and whether a FULLTEXT index is available.
+
+- "mysql" (default): pymysql over the network, configured by the DB_* settings.
+- "sqlite": an embedded SQLite file in WAL mode, for single-user installs that
+  should not need a MySQL server. Each connection opens an in-memory main
+  database and attaches the file as `finacias`, so every `finacias.<table>` name
+  works unchanged. The connection adapter rewrites the MySQL-only syntax the
+  modules use (placeholders, FOR UPDATE, <=>, ON DUPLICATE KEY UPDATE,
+  NOW() - INTERVAL, DELETE ... LIMIT, AUTO_INCREMENT and inline INDEX in DDL,
+  EXPLAIN), returns DECIMAL columns as Decimal and TIMESTAMP columns as datetime,
+  and reports the first id of a multi-row INSERT as lastrowid, as MySQL does.
+  Transactions that write or lock rows start with BEGIN IMMEDIATE, so
+  `SELECT ... FOR UPDATE` keeps serializing writers; reads see a snapshot and do
+  not block them. Name search uses LIKE instead of the ngram index.
+
+Configuration (environment):
+- STORAGE_BACKEND: "mysql" (default) or "sqlite".
+- SQLITE_PATH: database file of the SQLite backend (default financial_control.sqlite3).
+- SQLITE_BUSY_TIMEOUT: seconds a writer waits for the write lock (default 30).
+"""
+import functools
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, List, Optional, Sequence, Set, Tuple
+
+import pymysql
+import pymysql.cursors
+
+SCHEMA = 'finacias'
+
+
+class MySQLStorage:
+    name = 'mysql'
+    fulltext = True
+
+    def connect(self) -> pymysql.connections.Connection:
+        return pymysql.connect(
+            host=os.environ['DB_HOST'],
+            port=int(os.getenv('DB_PORT', '3306')),
+            user=os.environ['DB_USER'],
+            password=os.environ['DB_PASSWORD'],
+            database=os.environ['DB_NAME'],
+            charset=os.environ['DB_CHARSET'],
+            cursorclass=pymysql.cursors.DictCursor
+        )
+
+    def index_names(self, cursor, table: str) -> Set[str]:
+        cursor.execute("""
+            SELECT DISTINCT index_name AS index_name FROM information_schema.statistics
+            WHERE table_schema = %s AND table_name = %s
+        """, (SCHEMA, table))
+        return {row['index_name'] for row in cursor.fetchall()}
+
+    def create_index_sql(self, name: str, table: str, columns: str) -> str:
+        return f"CREATE INDEX {name} ON {SCHEMA}.{table} ({columns})"
+
+    def drop_index_sql(self, name: str, table: str) -> str:
+        return f"DROP INDEX {name} ON {SCHEMA}.{table}"
+
+    def insert_id_step(self, cursor) -> int:
+        # Galera and multi-primary setups hand out ids every auto_increment_increment
+        cursor.execute("SELECT @@SESSION.auto_increment_increment AS step")
+        return int(cursor.fetchone()['step'])
+
+
+# -- SQLite dialect ---------------------------------------------------------
+
+CENT = Decimal('0.01')
+
+def _adapt_datetime(value: datetime) -> str:
+    # Same text pymysql sends: no time zone, microseconds only when present
+    text = f"{value:%Y-%m-%d %H:%M:%S}"
+    return f"{text}.{value.microsecond:06d}" if value.microsecond else text
+
+def _convert_decimal(raw: bytes) -> Decimal:
+    # Every DECIMAL column of the schema has two decimal places
+    return Decimal(raw.decode()).quantize(CENT)
+
+def _convert_timestamp(raw: bytes) -> datetime:
+    return datetime.fromisoformat(raw.decode())
+
+# Decimals go in as REAL so arithmetic on them (a range formula's division) never turns into integer math
+sqlite3.register_adapter(Decimal, float)
+sqlite3.register_adapter(datetime, _adapt_datetime)
+sqlite3.register_converter('DECIMAL', _convert_decimal)
+sqlite3.register_converter('TIMESTAMP', _convert_timestamp)
+
+# SQLite's CURRENT_TIMESTAMP is UTC; MySQL's is the session (server) time
+LOCAL_NOW = "(datetime('now', 'localtime'))"
+
+_REWRITES = [
+    (re.compile(r"\s+FOR UPDATE\b", re.I), ''),
+    (re.compile(r"\s+ON UPDATE CURRENT_TIMESTAMP\b", re.I), ''),
+    (re.compile(r"\bNOW\(\)\s*-\s*INTERVAL\s+%s\s+DAY\b", re.I), "datetime('now', 'localtime', '-' || %s || ' days')"),
+    (re.compile(r"\bCURRENT_TIMESTAMP\b|\bNOW\(\)", re.I), LOCAL_NOW),
+    (re.compile(r"<=>"), 'IS'),
+    (re.compile(r"\bINT AUTO_INCREMENT PRIMARY KEY\b", re.I), 'INTEGER PRIMARY KEY AUTOINCREMENT'),
+    (re.compile(r"^\s*EXPLAIN\s+", re.I), 'EXPLAIN QUERY PLAN '),
+]
+_UPSERT = re.compile(r"\bON DUPLICATE KEY UPDATE\b(.*)$", re.I | re.S)
+_UPSERT_VALUE = re.compile(r"\bVALUES\((\w+)\)", re.I)
+_DELETE_LIMIT = re.compile(
+    r"^\s*DELETE FROM ([\w.]+) WHERE (.+?)(\s+ORDER BY [\w, ]+?)?\s+LIMIT %s\s*$", re.I | re.S
+)
+_CREATE_TABLE = re.compile(r"^\s*CREATE TABLE IF NOT EXISTS (\w+)\.(\w+)", re.I)
+_INLINE_INDEX = re.compile(r",\s*INDEX \((\w+)\)", re.I)
+
+WRITE_VERBS = ('insert', 'update', 'delete', 'replace', 'create', 'drop', 'alter')
+
+@functools.lru_cache(maxsize=1024)
+def translate(sql: str) -> Tuple[str, Tuple[str, ...], bool]:
+    """
+    (SQLite statement, indexes to create with it, whether it writes or locks rows)
+    for a statement written for MySQL.
+    """
+    locks = bool(re.search(r"\bFOR UPDATE\b", sql, re.I))
+    extra: Tuple[str, ...] = ()
+    table = _CREATE_TABLE.match(sql)
+    if table:
+        # MySQL names an unnamed index after its first column
+        schema, name = table.groups()
+        extra = tuple(
+            f'CREATE INDEX IF NOT EXISTS {schema}."{column}" ON {name} ({column})'
+            for column in _INLINE_INDEX.findall(sql)
+        )
+        sql = _INLINE_INDEX.sub('', sql)
+
+    upsert = _UPSERT.search(sql)
+    if upsert:
+        assignments = _UPSERT_VALUE.sub(r"excluded.\1", upsert.group(1))
+        sql = sql[:upsert.start()] + f"ON CONFLICT DO UPDATE SET{assignments}"
+
+    delete = _DELETE_LIMIT.match(sql)
+    if delete:
+        target, where, order = delete.groups()
+        sql = f"DELETE FROM {target} WHERE rowid IN (SELECT rowid FROM {target} WHERE {where}{order or ''} LIMIT %s)"
+
+    for pattern, replacement in _REWRITES:
+        sql = pattern.sub(replacement, sql)
+    verb = sql.lstrip()[:7].split(None, 1)[0].lower() if sql.strip() else ''
+    return sql.replace('%s', '?'), extra, locks or verb in WRITE_VERBS
+
+
+class SQLiteCursor:
+    """pymysql-style cursor over sqlite3: `%s` parameters, dict or tuple rows."""
+
+    def __init__(self, connection: 'SQLiteConnection', as_dict: bool):
+        self._connection = connection
+        self._cursor = connection.raw.cursor()
+        self._as_dict = as_dict
+        self._names: Optional[List[str]] = None
+        self.lastrowid: Optional[int] = None
+        self.rowcount = -1
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def _run(self, sql: str, run) -> int:
+        statement, indexes, writes = translate(sql)
+        self._connection.begin(writes)
+        created = bool(indexes) and not self._connection.table_exists(sql)
+        run(statement)
+        if created:
+            for index in indexes:
+                self._connection.raw.execute(index)
+        description = self._cursor.description
+        self._names = [column[0] for column in description] if description else None
+        self.rowcount = self._cursor.rowcount
+        lastrowid = self._cursor.lastrowid
+        if writes and self.rowcount > 1 and statement.lstrip()[:6].upper() == 'INSERT':
+            # sqlite3 reports the last id of a multi-row INSERT; callers expect the first
+            lastrowid -= self.rowcount - 1
+        self.lastrowid = lastrowid
+        return self.rowcount
+
+    def execute(self, sql: str, args: Any = None) -> int:
+        params = () if args is None else args
+        return self._run(sql, lambda statement: self._cursor.execute(statement, params))
+
+    def executemany(self, sql: str, args: Sequence[Any]) -> int:
+        return self._run(sql, lambda statement: self._cursor.executemany(statement, args))
+
+    def _shape(self, row: Optional[tuple]) -> Any:
+        if row is None or not self._as_dict:
+            return row
+        return dict(zip(self._names, row))
+
+    def fetchone(self) -> Any:
+        return self._shape(self._cursor.fetchone())
+
+    def fetchmany(self, size: Optional[int] = None) -> List[Any]:
+        rows = self._cursor.fetchmany(size) if size is not None else self._cursor.fetchmany()
+        return [self._shape(row) for row in rows] if self._as_dict else rows
+
+    def fetchall(self) -> List[Any]:
+        rows = self._cursor.fetchall()
+        return [self._shape(row) for row in rows] if self._as_dict else rows
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def close(self) -> None:
+        self._cursor.close()
+
+    def __enter__(self) -> 'SQLiteCursor':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class SQLiteConnection:
+    """The subset of pymysql's Connection the data-access functions and the pool use."""
+
+    def __init__(self, path: str, busy_timeout: float):
+        # The pool hands a connection to one thread at a time, but not always the same one
+        self.raw = sqlite3.connect(
+            ':memory:', timeout=busy_timeout, isolation_level=None,
+            detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False
+        )
+        self.raw.execute(f"ATTACH DATABASE ? AS {SCHEMA}", (path,))
+        self.raw.execute(f"PRAGMA {SCHEMA}.journal_mode=WAL")
+        self.raw.execute(f"PRAGMA {SCHEMA}.synchronous=NORMAL")
+        self.open = True
+
+    def begin(self, writes: bool) -> None:
+        if not self.raw.in_transaction:
+            self.raw.execute("BEGIN IMMEDIATE" if writes else "BEGIN")
+
+    def table_exists(self, create_sql: str) -> bool:
+        schema, name = _CREATE_TABLE.match(create_sql).groups()
+        return self.raw.execute(
+            f"SELECT 1 FROM {schema}.sqlite_master WHERE type = 'table' AND name = ?", (name,)
+        ).fetchone() is not None
+
+    def cursor(self, cursorclass: Optional[type] = None) -> SQLiteCursor:
+        if not self.open:
+            raise pymysql.err.InterfaceError(0, "Connection is closed")
+        as_dict = cursorclass is None or issubclass(cursorclass, pymysql.cursors.DictCursorMixin)
+        return SQLiteCursor(self, as_dict)
+
+    def commit(self) -> None:
+        if self.raw.in_transaction:
+            self.raw.execute("COMMIT")
+
+    def rollback(self) -> None:
+        if self.raw.in_transaction:
+            self.raw.execute("ROLLBACK")
+
+    def ping(self, reconnect: bool = False) -> bool:
+        self.raw.execute("SELECT 1").fetchone()
+        return True
+
+    def close(self) -> None:
+        if self.open:
+            self.open = False
+            self.raw.close()
+
+
+class SQLiteStorage:
+    name = 'sqlite'
+    fulltext = False
+
+    def __init__(self, path: str, busy_timeout: float = 30.0):
+        self.path = path
+        self.busy_timeout = busy_timeout
+
+    def connect(self) -> SQLiteConnection:
+        return SQLiteConnection(self.path, self.busy_timeout)
+
+    def index_names(self, cursor, table: str) -> Set[str]:
+        cursor.execute(
+            f"SELECT name AS index_name FROM {SCHEMA}.sqlite_master WHERE type = 'index' AND tbl_name = %s", (table,)
+        )
+        return {row['index_name'] for row in cursor.fetchall()}
+
+    def create_index_sql(self, name: str, table: str, columns: str) -> str:
+        return f'CREATE INDEX {SCHEMA}."{name}" ON {table} ({columns})'
+
+    def drop_index_sql(self, name: str, table: str) -> str:
+        return f'DROP INDEX {SCHEMA}."{name}"'
+
+    def insert_id_step(self, cursor) -> int:
+        return 1
+
+
+def _build_storage():
+    backend_name = os.getenv('STORAGE_BACKEND', 'mysql').lower()
+    if backend_name == 'mysql':
+        return MySQLStorage()
+    if backend_name == 'sqlite':
+        return SQLiteStorage(
+            os.getenv('SQLITE_PATH', 'financial_control.sqlite3'),
+            float(os.getenv('SQLITE_BUSY_TIMEOUT', '30'))
+        )
+    raise ValueError(f"Unknown STORAGE_BACKEND: {backend_name}")
+
+_storage = None
+_storage_lock = threading.Lock()
+
+def get_storage():
+    """The process-wide backend, built from STORAGE_BACKEND on first use (after .env is loaded)."""
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                _storage = _build_storage()
+    return _storage
@@ -0,0 +1,218 @@
+"""
+Cache of user records for login and registration, keyed by email and by id.
+
+Each user row is stored under both keys (emails are lowercased, matching the
+case-insensitive collation of users.email), without its password hash: lookups
+through the cache never return password_hash. The shared entry carries a SHA-256
+digest of the hash instead, and `credentials()` (the login path) keeps the hash
+itself in process memory, using it only while it still matches the digest of
+the current entry; a password change, seen through the shared entry, makes the
+next login reload the row. A lookup for an unknown email is cached too, as a
+negative entry with a shorter TTL, so repeated guesses at unregistered emails
+(credential stuffing) stop reaching the database.
+
+Invalidation is explicit: after the commit, the write paths in connection_db
+(create, update, delete) call `invalidate` with every email and id they touched,
+old and new, so the next lookup reloads the row. The default backend is the
+shared SQLite file of database/cache.py, so an invalidation in one worker is seen
+by every worker on the host; with the per-process "memory" backend other workers
+only catch up when their entries expire (USER_CACHE_TTL, USER_CACHE_NEGATIVE_TTL).
+
+Configuration (environment):
+- USER_CACHE_BACKEND: "sqlite" (default, its own table in the ANALYTICS_CACHE_PATH
+  file), "memory" (per process, single-worker deployments) or "off".
+- USER_CACHE_TTL: seconds a found user stays cached (default 300).
+- USER_CACHE_NEGATIVE_TTL: seconds an unknown email stays cached (default 30).
+- USER_CACHE_MAX_ENTRIES: entries kept before the oldest are evicted (default 10000).
+"""
+import hashlib
+import os
+import threading
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from database.cache import _MISSING, InProcessBackend, SQLiteBackend, default_cache_path
+
+# Own table in the shared file, so the analytics cache's eviction and clear() leave user entries alone
+USER_CACHE_TABLE = 'user_cache_entries'
+
+# Stored for emails known not to exist; never handed to callers
+_ABSENT = {"__absent__": True}
+
+# Never written to the shared backend (only to the process-local hash store)
+UNCACHED_FIELDS = ('password_hash',)
+
+# Stored in place of the hash, to tell whether a hash held in memory is still current
+HASH_DIGEST_FIELD = '_password_digest'
+
+def _hash_digest(password_hash: str) -> str:
+    return hashlib.sha256(password_hash.encode('utf-8')).hexdigest()
+
+def _cacheable(user: Dict[str, Any]) -> Dict[str, Any]:
+    row = {k: v for k, v in user.items() if k not in UNCACHED_FIELDS}
+    if user.get('password_hash'):
+        row[HASH_DIGEST_FIELD] = _hash_digest(user['password_hash'])
+    return row
+
+def _public(row: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: v for k, v in row.items() if k != HASH_DIGEST_FIELD}
+
+
+def _email_key(email: str) -> str:
+    return f"users:email:{email.strip().lower()}"
+
+def _id_key(user_id: int) -> str:
+    return f"users:id:{int(user_id)}"
+
+
+class UserCache:
+    """Read-through cache of user rows with negative entries and hit/miss counters."""
+
+    def __init__(self, backend, ttl: float = 300.0, negative_ttl: float = 30.0, max_entries: int = 10000):
+        self.backend = backend
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        # Password hashes by email key; never leaves this process
+        self._hashes = InProcessBackend(max_entries)
+        self._hits = 0
+        self._negative_hits = 0
+        self._misses = 0
+        self._lock = threading.Lock()
+
+    def _lookup(self, key: str, load: Callable[[], Optional[Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+        value = self.backend.get(key)
+        if value is not _MISSING:
+            with self._lock:
+                if value == _ABSENT:
+                    self._negative_hits += 1
+                    return None
+                self._hits += 1
+            return _public(value)
+        with self._lock:
+            self._misses += 1
+        user = load()
+        if user is None:
+            self.backend.set(key, _ABSENT, self.negative_ttl)
+            return None
+        self.remember(user)
+        return _public(_cacheable(user))
+
+    def by_email(self, email: str, load: Callable[[], Optional[Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+        return self._lookup(_email_key(email), load)
+
+    def by_id(self, user_id: int, load: Callable[[], Optional[Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+        return self._lookup(_id_key(user_id), load)
+
+    def credentials(self, email: str, load: Callable[[], Optional[Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+        """
+        The user row with its password_hash, for login. Served without a database read when
+        the shared entry is cached and this process holds a hash matching its digest; otherwise
+        the row is loaded once and remembered.
+        """
+        key = _email_key(email)
+        value = self.backend.get(key)
+        if value is not _MISSING:
+            if value == _ABSENT:
+                with self._lock:
+                    self._negative_hits += 1
+                return None
+            password_hash = self._hashes.get(key)
+            if password_hash is not _MISSING and value.get(HASH_DIGEST_FIELD) == _hash_digest(password_hash):
+                with self._lock:
+                    self._hits += 1
+                return {**_public(value), 'password_hash': password_hash}
+        with self._lock:
+            self._misses += 1
+        user = load()
+        if user is None:
+            self._hashes.delete(key)
+            self.backend.set(key, _ABSENT, self.negative_ttl)
+            return None
+        self.remember(user)
+        return dict(user)
+
+    def remember(self, user: Dict[str, Any]) -> None:
+        """
+        Stores a user row (as read from the users table, minus UNCACHED_FIELDS) under its email
+        and id; its password_hash, when present, goes to this process's hash store only.
+        """
+        row = _cacheable(user)
+        self.backend.set(_email_key(row['email']), row, self.ttl)
+        self.backend.set(_id_key(row['id']), row, self.ttl)
+        if user.get('password_hash'):
+            self._hashes.set(_email_key(row['email']), user['password_hash'], self.ttl)
+
+    def invalidate(self, emails: Iterable[Optional[str]] = (), ids: Iterable[Optional[int]] = ()) -> None:
+        for email in emails:
+            if email:
+                self.backend.delete(_email_key(email))
+                self._hashes.delete(_email_key(email))
+        for user_id in ids:
+            if user_id is not None:
+                self.backend.delete(_id_key(user_id))
+
+    def clear(self) -> None:
+        self.backend.clear()
+        self._hashes.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits, negative_hits, misses = self._hits, self._negative_hits, self._misses
+        lookups = hits + negative_hits + misses
+        return {
+            "backend": type(self.backend).__name__,
+            "hits": hits,
+            "negative_hits": negative_hits,
+            "misses": misses,
+            "hit_ratio": round((hits + negative_hits) / lookups, 4) if lookups else 0.0,
+            "entries": self.backend.size(),
+        }
+
+
+class _NoBackend:
+    """USER_CACHE_BACKEND=off: every lookup goes to the database."""
+
+    def get(self, key: str) -> Any:
+        return _MISSING
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        pass
+
+    def delete(self, key: str) -> None:
+        pass
+
+    def clear(self) -> None:
+        pass
+
+    def size(self) -> int:
+        return 0
+
+
+def _build_user_cache() -> UserCache:
+    backend_name = os.getenv('USER_CACHE_BACKEND', 'sqlite').lower()
+    max_entries = int(os.getenv('USER_CACHE_MAX_ENTRIES', '10000'))
+    if backend_name == 'sqlite':
+        path = os.getenv('ANALYTICS_CACHE_PATH') or default_cache_path()
+        backend = SQLiteBackend(path, max_entries, table=USER_CACHE_TABLE)
+    elif backend_name == 'memory':
+        backend = InProcessBackend(max_entries)
+    elif backend_name == 'off':
+        backend = _NoBackend()
+    else:
+        raise ValueError(f"Unknown USER_CACHE_BACKEND: {backend_name}")
+    return UserCache(
+        backend,
+        ttl=float(os.getenv('USER_CACHE_TTL', '300')),
+        negative_ttl=float(os.getenv('USER_CACHE_NEGATIVE_TTL', '30')),
+        max_entries=max_entries,
+    )
+
+_user_cache: Optional[UserCache] = None
+_user_cache_lock = threading.Lock()
+
+def get_user_cache() -> UserCache:
+    global _user_cache
+    if _user_cache is None:
+        with _user_cache_lock:
+            if _user_cache is None:
+                _user_cache = _build_user_cache()
+    return _user_cache
@@ -1,4 +1,5 @@
 import uvicorn
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from routes.get.router_get import router as get_router
 from routes.post.router_post import router as post_router
@@ -9,11 +10,30 @@ from routes.post.create_user import router as user_router
 from routes.batch.router_batch import router as batch_router
 from routes.analytics.router_analytics import router as analytics_router
 from routes.excel.router_excel import router as excel_router
-from database.connection_db import init_db
+from routes.snapshots.router_snapshots import router as snapshots_router
+from routes.metrics.router_metrics import router as metrics_router
+from routes.admin.router_admin import router as admin_router
+from database.connection_db import init_db, close_pool, get_connection
+from database.async_operations import shutdown_executor
+from database.history import start_history_job, stop_history_job
+from security.passwords import shutdown_password_pool
+from monitoring.metrics import METRICS_ENABLED
+from monitoring.middleware import MetricsMiddleware
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    init_db()
+    start_history_job(get_connection)
+    yield
+    stop_history_job()
+    shutdown_password_pool()
+    shutdown_executor()
+    close_pool()
 
-init_db()
+app = FastAPI(lifespan=lifespan)
+
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
 
 app.include_router(get_router)
 app.include_router(post_router)
@@ -24,6 +44,9 @@ app.include_router(user_router)
 app.include_router(batch_router)
 app.include_router(analytics_router)
 app.include_router(excel_router)
+app.include_router(snapshots_router)
+app.include_router(metrics_router)
+app.include_router(admin_router)
 
 if __name__ == '__main__':
     uvicorn.run('main:app', host="localhost", port=8000, reload=True)
@@ -1,6 +1,7 @@
 from pydantic import BaseModel, Field, validator
 from typing import List, Optional, Any, Dict
 from enum import Enum
+from datetime import datetime
 
 class FormulaType(str, Enum):
     MULTIPLY = "multiply"
@@ -62,6 +63,22 @@ class FilterParams(BaseModel):
     max_month_val: Optional[float] = None
     despesa_like: Optional[str] = None
 
+class RangeFormulaRequest(BaseModel):
+    ids: Optional[List[int]] = Field(None, description="Target rows; use either ids or filter")
+    filter: Optional[FilterParams] = Field(None, description="Target every row matching the filter ({} for all rows)")
+    months: List[MonthEnum] = Field(..., min_length=1)
+    formula: FormulaType
+    value: float
+
+class RestoreRequest(BaseModel):
+    at: datetime
+    ids: Optional[List[int]] = Field(None, description="Rows to restore; every row when omitted")
+
+class ImportFailurePolicy(str, Enum):
+    SKIP_ROW = "skip_row"
+    ABORT_CHUNK = "abort_chunk"
+    ABORT_FILE = "abort_file"
+
 class SortDirection(str, Enum):
     ASC = "asc"
     DESC = "desc"
@@ -0,0 +1,25 @@
+import hmac
+import os
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status
+from database.slow_queries import get_slow_query_log
+
+router = APIRouter(prefix="/admin")
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    # Fails closed: without ADMIN_TOKEN the admin endpoints don't exist (they expose raw SQL)
+    token = os.getenv('ADMIN_TOKEN')
+    if not token:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if x_admin_token is None or not hmac.compare_digest(x_admin_token.encode('utf-8'), token.encode('utf-8')):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid admin token")
+
+@router.get('/slow-queries', dependencies=[Depends(require_admin)])
+def list_slow_queries(limit: Optional[int] = Query(None, ge=1)):
+    log = get_slow_query_log()
+    return {**log.stats(), "queries": log.entries(limit)}
+
+@router.delete('/slow-queries', status_code=status.HTTP_204_NO_CONTENT, dependencies=[Depends(require_admin)])
+def clear_slow_queries():
+    get_slow_query_log().clear()
+    return None
@@ -1,6 +1,7 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Response
 from typing import List, Dict
-from database.batch_operations import get_monthly_analytics, get_top_expenses
+from database.async_operations import get_monthly_analytics, get_top_expenses
+from routes.responses import despesas_response
 from models.schemas import DespesaResponseNested
 
 router = APIRouter(prefix="/despesas/analytics", tags=["Analytics & Reports"])
@@ -8,21 +9,21 @@ router = APIRouter(prefix="/despesas/analytics", tags=["Analytics & Reports"])
 @router.get("/monthly")
 async def monthly_analytics():
     try:
-        return get_monthly_analytics()
+        return await get_monthly_analytics()
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.get("/top", response_model=List[DespesaResponseNested])
-async def top_expenses(limit: int = Query(10, gt=0)):
+async def top_expenses(response: Response, limit: int = Query(10, gt=0)):
     try:
-        return get_top_expenses(limit)
+        return despesas_response(await get_top_expenses(limit), response)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.get("/trends")
 async def analytics_trends():
     try:
-        monthly = get_monthly_analytics()
+        monthly = await get_monthly_analytics()
         if not monthly:
             return {"highest": None, "lowest": None}
         
@@ -1,31 +1,32 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Response
 from typing import List
 from models.excel_schemas import BatchUpdateRequest, BatchDeleteRequest, UpdateItem
 from models.schemas import DespesaCreate, DespesaResponseNested
-from database.batch_operations import batch_update_despessas, batch_delete_despessas, batch_create_despessas
+from database.async_operations import batch_update_despessas, batch_delete_despessas, batch_create_despessas
+from routes.responses import despesas_response
 
 router = APIRouter(prefix="/despesas/batch", tags=["Batch Operations"])
 
 @router.post("/update", response_model=List[DespesaResponseNested])
-async def update_batch(request: BatchUpdateRequest):
+async def update_batch(request: BatchUpdateRequest, response: Response):
     try:
         updates = [item.dict() for item in request.updates]
-        return batch_update_despessas(updates)
+        return despesas_response(await batch_update_despessas(updates), response)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.post("/delete")
 async def delete_batch(request: BatchDeleteRequest):
     try:
-        count = batch_delete_despessas(request.ids)
+        count = await batch_delete_despessas(request.ids)
         return {"message": f"Deleted {count} despesas", "deleted_count": count}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.post("/create", response_model=List[DespesaResponseNested])
-async def create_batch(despessas: List[DespesaCreate]):
+async def create_batch(despessas: List[DespesaCreate], response: Response):
     try:
         items = [item.dict() for item in despessas]
-        return batch_create_despessas(items)
+        return despesas_response(await batch_create_despessas(items), response)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
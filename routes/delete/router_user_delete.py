@@ -1,11 +1,12 @@
 from fastapi import APIRouter, HTTPException, status
+from database.async_operations import run_in_db
 from database.connection_db import delete_user
 
 router = APIRouter()
 
 @router.delete('/users/{user_id}', status_code=status.HTTP_204_NO_CONTENT)
-def delete_user_endpoint(user_id: int):
-    if not delete_user(user_id):
+async def delete_user_endpoint(user_id: int):
+    if not await run_in_db(delete_user, user_id):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
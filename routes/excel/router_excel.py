@@ -1,16 +1,18 @@
-import csv
-import io
-from fastapi import APIRouter, HTTPException, Query, UploadFile, File
+import itertools
+from fastapi import APIRouter, HTTPException, Query, Response, UploadFile, File
 from fastapi.responses import StreamingResponse
 from typing import List, Optional
-from models.excel_schemas import FormulaRequest, MonthEnum, FilterParams, SortDirection, RevertRequest
+from models.excel_schemas import FormulaRequest, RangeFormulaRequest, MonthEnum, FilterParams, SortDirection, RevertRequest, ImportFailurePolicy
 from models.schemas import DespesaResponseNested, DespesaCreate
-from database.batch_operations import (
-    calculate_column_sum, calculate_column_average, apply_excel_formula,
-    get_despesa_history, revert_cell_value, filter_expenses, sort_expenses,
-    batch_create_despessas, check_consistency, detect_anomalies, find_duplicates
+from database.async_operations import (
+    calculate_column_sum, calculate_column_average, apply_excel_formula, apply_range_formula,
+    get_despesa_history, revert_cell_value, paginate_expenses,
+    batch_create_despessas, check_consistency, detect_anomalies, find_duplicates,
+    import_despesas_csv, run_in_db
 )
-from database.connection_db import get_all_despesas
+from database.batch_operations import stream_despesas_csv
+from database.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from routes.responses import despesas_page_response, despesas_response
 
 router = APIRouter(prefix="/despesas", tags=["Excel-like Features"])
 
@@ -18,7 +20,7 @@ router = APIRouter(prefix="/despesas", tags=["Excel-like Features"])
 @router.get("/calculate/sum")
 async def get_sum(column: str = Query(..., description="Column to sum (e.g. janeiro, total)")):
     try:
-        total = calculate_column_sum(column)
+        total = await calculate_column_sum(column)
         return {"column": column, "sum": total}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -26,7 +28,7 @@ async def get_sum(column: str = Query(..., description="Column to sum (e.g. jane
 @router.get("/calculate/average")
 async def get_average(column: str = Query(..., description="Column to average")):
     try:
-        avg = calculate_column_average(column)
+        avg = await calculate_column_average(column)
         return {"column": column, "average": avg}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -34,93 +36,45 @@ async def get_average(column: str = Query(..., description="Column to average"))
 @router.post("/formulas/apply", response_model=DespesaResponseNested)
 async def apply_formula(request: FormulaRequest):
     try:
-        return apply_excel_formula(request.target_id, request.target_month.value, request.formula.value, request.value)
+        return await apply_excel_formula(request.target_id, request.target_month.value, request.formula.value, request.value)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/formulas/apply-range", response_model=List[DespesaResponseNested])
+async def apply_formula_range(request: RangeFormulaRequest, response: Response):
+    try:
+        filters = request.filter.model_dump(mode="json") if request.filter is not None else None
+        months = [month.value for month in request.months]
+        return despesas_response(
+            await apply_range_formula(months, request.formula.value, request.value, request.ids, filters), response
+        )
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 # 2. Import/Export
 @router.post("/import/csv")
-async def import_csv(file: UploadFile = File(...)):
+async def import_csv(
+    file: UploadFile = File(...),
+    chunk_size: Optional[int] = Query(None, gt=0, le=5000, description="Rows per INSERT/commit"),
+    on_error: ImportFailurePolicy = Query(ImportFailurePolicy.SKIP_ROW, description="What a bad row does: skip it, drop its chunk or stop the import")
+):
     if not file.filename.endswith('.csv'):
         raise HTTPException(status_code=400, detail="File must be a CSV")
     
     try:
-        content = await file.read()
-        stream = io.StringIO(content.decode('utf-8'))
-        reader = csv.DictReader(stream)
-        
-        to_import = []
-        errors = []
-        for i, row in enumerate(reader):
-            try:
-                # Mapping CSV headers to schema keys
-                # Expected format: Despesa,Jan,Fev,Mar,Abr,Mai,Jun,Jul,Ago,Set,Out,Nov,Dez
-                # We normalize to the model keys
-                mapping = {
-                    'Despesa': 'despesa', 'Jan': 'janeiro', 'Fev': 'fevereiro', 'Mar': 'marco',
-                    'Abr': 'abril', 'Mai': 'maio', 'Jun': 'junho', 'Jul': 'julho',
-                    'Ago': 'agosto', 'Set': 'setembro', 'Out': 'outubro', 'Nov': 'novembro', 'Dez': 'dezembro'
-                }
-                
-                mapped_row = {}
-                for csv_key, model_key in mapping.items():
-                    val = row.get(csv_key)
-                    if model_key == 'despesa':
-                        mapped_row[model_key] = val
-                    else:
-                        mapped_row[model_key] = float(val.replace(',', '.')) if val else 0.0
-                
-                to_import.append(mapped_row)
-            except Exception as row_error:
-                errors.append(f"Row {i+1}: {str(row_error)}")
-        
-        if to_import:
-            batch_create_despessas(to_import)
-            
-        return {
-            "status": "success",
-            "imported_count": len(to_import),
-            "errors": errors
-        }
+        # Parsed straight from the spooled upload, chunk by chunk, off the event loop
+        return await import_despesas_csv(file.file, chunk_size, on_error.value)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.get("/export/csv")
 async def export_csv():
     try:
-        data = get_all_despesas() # This returns formatted nested data
-        
-        output = io.StringIO()
-        writer = csv.writer(output)
-        
-        # Headers
-        headers = ['id', 'despesa', 'janeiro', 'fevereiro', 'marco', 'abril', 'maio', 'junho', 
-                   'julho', 'agosto', 'setembro', 'outubro', 'novembro', 'dezembro', 'total_anual']
-        writer.writerow(headers)
-        
-        for item in data:
-            row = [
-                item['id'],
-                item['despesa'],
-                item['monthly_data']['janeiro'],
-                item['monthly_data']['fevereiro'],
-                item['monthly_data']['marco'],
-                item['monthly_data']['abril'],
-                item['monthly_data']['maio'],
-                item['monthly_data']['junho'],
-                item['monthly_data']['julho'],
-                item['monthly_data']['agosto'],
-                item['monthly_data']['setembro'],
-                item['monthly_data']['outubro'],
-                item['monthly_data']['novembro'],
-                item['monthly_data']['dezembro'],
-                item['annual_total']
-            ]
-            writer.writerow(row)
-        
-        output.seek(0)
+        chunks = stream_despesas_csv()
+        # Pull the first chunk (header + first rows) up front so query errors still map to a 400
+        first_chunk = await run_in_db(next, chunks)
         return StreamingResponse(
-            iter([output.getvalue()]),
+            itertools.chain([first_chunk], chunks),
             media_type="text/csv",
             headers={"Content-Disposition": "attachment; filename=despesas_export.csv"}
         )
@@ -128,23 +82,28 @@ async def export_csv():
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.post("/import/json")
-async def import_json(despessas: List[DespesaCreate]):
+async def import_json(
+    despessas: List[DespesaCreate],
+    chunk_size: Optional[int] = Query(None, gt=0, le=5000, description="Rows per INSERT/commit")
+):
     try:
         items = [item.dict() for item in despessas]
-        results = batch_create_despessas(items)
-        return {"imported_count": len(results), "data": results}
+        results = await batch_create_despessas(items, chunk_size)
+        return {"imported_count": len(results), "data": [record.to_nested() for record in results]}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 # 3. Filters & Searches
-@router.get("/filter", response_model=List[DespesaResponseNested])
+@router.get("/filter")
 async def filter_despesas(
     min_total: Optional[float] = None,
     max_total: Optional[float] = None,
     month: Optional[MonthEnum] = None,
     min_val: Optional[float] = None,
     max_val: Optional[float] = None,
-    despesa_like: Optional[str] = None
+    despesa_like: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, gt=0, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page")
 ):
     try:
         filters = {
@@ -155,32 +114,42 @@ async def filter_despesas(
             "max_month_val": max_val,
             "despesa_like": despesa_like
         }
-        return filter_expenses(filters)
+        data, next_cursor = await paginate_expenses('id', 'asc', limit, cursor, filters)
+        return despesas_page_response(data, next_cursor)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
-@router.get("/sort", response_model=List[DespesaResponseNested])
+@router.get("/sort")
 async def sort_despesas(
     order_by: str = Query("id"),
-    direction: SortDirection = SortDirection.ASC
+    direction: SortDirection = SortDirection.ASC,
+    limit: int = Query(DEFAULT_PAGE_SIZE, gt=0, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page")
 ):
     try:
-        return sort_expenses(order_by, direction.value)
+        data, next_cursor = await paginate_expenses(order_by, direction.value, limit, cursor)
+        return despesas_page_response(data, next_cursor)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 # 4. History
 @router.get("/{id}/history")
-async def get_history(id: int):
+async def get_history(
+    id: int,
+    field: Optional[str] = Query(None, description="Only this field (e.g. janeiro)"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, gt=0, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page")
+):
     try:
-        return get_despesa_history(id)
+        data, next_cursor = await get_despesa_history(id, field, limit, cursor)
+        return {"data": data, "next_cursor": next_cursor}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.post("/{id}/revert", response_model=DespesaResponseNested)
 async def revert_value(id: int, request: RevertRequest):
     try:
-        return revert_cell_value(id, request.field, request.version)
+        return await revert_cell_value(id, request.field, request.version)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -188,20 +157,20 @@ async def revert_value(id: int, request: RevertRequest):
 @router.get("/{id}/check-consistency")
 async def get_consistency(id: int):
     try:
-        return check_consistency(id)
+        return await check_consistency(id)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.get("/{id}/anomalies")
 async def get_anomalies(id: int, threshold: float = 200.0):
     try:
-        return detect_anomalies(id, threshold)
+        return await detect_anomalies(id, threshold)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.get("/validate/duplicates")
 async def get_duplicates(name: str = Query(...)):
     try:
-        return find_duplicates(name)
+        return await find_duplicates(name)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
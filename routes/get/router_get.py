@@ -1,13 +1,25 @@
-from fastapi import APIRouter, HTTPException
-from database.connection_db import get_all_despesas, get_despesa_by_id
+from fastapi import APIRouter, HTTPException, Query
+from typing import Optional
+from database.connection_db import get_despesa_by_id
+from database.batch_operations import paginate_expenses
+from database.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from routes.responses import despesas_page_response
 
 router = APIRouter()
 
 @router.get('/despesas')
-def read_all_despesas():
-    return {"data": get_all_despesas()}
+def read_all_despesas(
+    limit: int = Query(DEFAULT_PAGE_SIZE, gt=0, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page")
+):
+    try:
+        data, next_cursor = paginate_expenses('id', 'desc', limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return despesas_page_response(data, next_cursor)
 
-@router.get('/despesas/{despesa_id}')
+# :int so /despesas/filter and /despesas/sort reach their own routes
+@router.get('/despesas/{despesa_id:int}')
 def read_despesa(despesa_id: int):
     despesa = get_despesa_by_id(despesa_id)
     if not despesa:
@@ -1,17 +1,18 @@
 from fastapi import APIRouter, HTTPException, status
 from typing import List
+from database.async_operations import run_in_db
 from database.connection_db import get_all_users, get_user_by_id
 from models.user_schemas import UserResponse
 
 router = APIRouter()
 
 @router.get('/users', response_model=List[UserResponse])
-def read_all_users():
-    return get_all_users()
+async def read_all_users():
+    return await run_in_db(get_all_users)
 
 @router.get('/users/{user_id}', response_model=UserResponse)
-def read_user(user_id: int):
-    user = get_user_by_id(user_id)
+async def read_user(user_id: int):
+    user = await run_in_db(get_user_by_id, user_id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
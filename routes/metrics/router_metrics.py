@@ -0,0 +1,54 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from database.cache import get_cache
+from database.connection_db import pool_stats
+from database.slow_queries import get_slow_query_log
+from database.user_cache import get_user_cache
+from monitoring.metrics import register_collector, render_metrics
+from security.passwords import password_pool_stats
+
+router = APIRouter()
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+def _pool_families():
+    stats = pool_stats()
+    if stats is None:
+        return
+    for key in ("size", "idle", "in_use", "min_size", "max_size"):
+        yield f"db_pool_{key}", "gauge", f"Connection pool {key.replace('_', ' ')}.", [({}, stats[key])]
+    for key in ("checkouts", "created", "discarded", "waits"):
+        yield f"db_pool_{key}_total", "counter", f"Connection pool {key} since start.", [({}, stats[key])]
+
+def _cache_families():
+    caches = [("analytics", get_cache().stats()), ("users", get_user_cache().stats())]
+    yield "cache_hits_total", "counter", "Cache hits.", [({"cache": name}, stats["hits"]) for name, stats in caches]
+    yield "cache_misses_total", "counter", "Cache misses.", [({"cache": name}, stats["misses"]) for name, stats in caches]
+    yield "cache_entries", "gauge", "Entries currently cached.", [({"cache": name}, stats["entries"]) for name, stats in caches]
+    yield "cache_negative_hits_total", "counter", "Lookups answered by a cached 'not found'.", [
+        ({"cache": "users"}, caches[1][1]["negative_hits"])
+    ]
+
+def _password_families():
+    stats = password_pool_stats()
+    yield "password_pool_pending", "gauge", "Hash/verify jobs running or queued.", [({}, stats["pending"])]
+    yield "password_pool_max_pending", "gauge", "Queue limit before 503.", [({}, stats["max_pending"])]
+    yield "password_pool_rejected_total", "counter", "Jobs refused because the queue was full.", [({}, stats["rejected"])]
+    for kind, help in (("hash", "Time inside bcrypt.hashpw."), ("verify", "Time inside bcrypt.checkpw."),
+                       ("queue_wait", "Time from submit to a worker starting the job.")):
+        timing = stats[kind]
+        yield f"password_{kind}_total", "counter", f"Jobs timed for: {help}", [({}, timing["count"])]
+        yield f"password_{kind}_seconds_total", "counter", help, [({}, timing["total_seconds"])]
+        yield f"password_{kind}_seconds_max", "gauge", f"Slowest so far: {help}", [({}, timing["max_seconds"])]
+
+def _slow_query_families():
+    stats = get_slow_query_log().stats()
+    yield "db_slow_queries_total", "counter", "Statements slower than SLOW_QUERY_MS.", [({}, stats["total"])]
+    yield "db_slow_query_explain_queue", "gauge", "EXPLAINs waiting for the background worker.", [({}, stats["explain_queue"])]
+
+for _collect in (_pool_families, _cache_families, _password_families, _slow_query_families):
+    register_collector(_collect)
+
+@router.get('/metrics', response_class=PlainTextResponse)
+def metrics():
+    return PlainTextResponse(render_metrics(), media_type=PROMETHEUS_CONTENT_TYPE)
@@ -1,13 +1,17 @@
+import logging
 from fastapi import APIRouter, HTTPException, status
-import bcrypt
 from models.user_schemas import UserLogin
-from database.connection_db import get_user_by_email
+from database.async_operations import run_in_db
+from database.connection_db import get_user_credentials
+from security.passwords import PasswordPoolBusy, PasswordPoolUnavailable, verify_password
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
 @router.post('/login')
-def login(user_credentials: UserLogin):
-    user = get_user_by_email(user_credentials.email)
+async def login(user_credentials: UserLogin):
+    user = await run_in_db(get_user_credentials, user_credentials.email)
     
     if not user:
         raise HTTPException(
@@ -15,16 +19,20 @@ def login(user_credentials: UserLogin):
             detail="Invalid credentials"
         )
     
-    # Verify password
+    # Verify password (on the hashing process pool)
     try:
-        if not bcrypt.checkpw(user_credentials.password.encode('utf-8'), user['password_hash'].encode('utf-8')):
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid credentials"
-            )
-    except Exception as e:
-        # If encoding fails or format is wrong
-        print(f"Login verification error: {e}")
+        valid = await verify_password(user_credentials.password, user['password_hash'])
+    except (PasswordPoolBusy, PasswordPoolUnavailable) as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e), headers={"Retry-After": "1"})
+    except UnicodeEncodeError:
+        # A password that can't be encoded can't match any stored hash (malformed hashes never match either)
+        valid = False
+    except Exception:
+        # Not a credential failure: answering 401 would lock every user out while it lasts
+        logger.exception("Login verification error")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error verifying password")
+
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid credentials"
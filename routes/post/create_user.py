@@ -1,30 +1,31 @@
 from fastapi import APIRouter, HTTPException, status
-import bcrypt
 from models.user_schemas import UserCreate, UserResponse
+from database.async_operations import run_in_db
 from database.connection_db import create_user_db, get_user_by_email
+from security.passwords import PasswordPoolBusy, PasswordPoolUnavailable, hash_password
 
 router = APIRouter()
 
 @router.post('/users', response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-def create_new_user(user: UserCreate):
+async def create_new_user(user: UserCreate):
     # Check if user already exists
-    if get_user_by_email(user.email):
+    if await run_in_db(get_user_by_email, user.email):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
         )
     
-    # Hash password
+    # Hash password (on the hashing process pool)
     try:
-        # bcrypt requires bytes
-        hashed_bytes = bcrypt.hashpw(user.password.encode('utf-8'), bcrypt.gensalt())
-        hashed_password = hashed_bytes.decode('utf-8') # Store as string
+        hashed_password = await hash_password(user.password)
+    except (PasswordPoolBusy, PasswordPoolUnavailable) as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e), headers={"Retry-After": "1"})
     except Exception as e:
         raise HTTPException(status_code=500, detail="Error processing password")
     
     # Save to DB
     try:
-        new_user = create_user_db(user.username, user.email, hashed_password)
+        new_user = await run_in_db(create_user_db, user.username, user.email, hashed_password)
     except Exception as e:
         raise HTTPException(status_code=500, detail="Database error")
     
@@ -6,7 +6,6 @@ router = APIRouter()
 
 @router.put('/despesas/{despesa_id}', response_model=DespesaResponseNested)
 def update_despesa_endpoint(despesa_id: int, despesa: DespesaUpdate):
-    print("Passou por aqui")
     despesa_dict = despesa.model_dump(exclude_unset=True)
     result = update_despesa(despesa_id, despesa_dict)
     
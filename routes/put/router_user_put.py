@@ -1,34 +1,36 @@
 from fastapi import APIRouter, HTTPException, status
-import bcrypt
 from typing import Optional
+from database.async_operations import run_in_db
 from database.connection_db import update_user, get_user_by_email
 from models.user_schemas import UserUpdate, UserResponse
+from security.passwords import PasswordPoolBusy, PasswordPoolUnavailable, hash_password
 
 router = APIRouter()
 
 @router.put('/users/{user_id}', response_model=UserResponse)
-def update_user_endpoint(user_id: int, user: UserUpdate):
+async def update_user_endpoint(user_id: int, user: UserUpdate):
     data = user.model_dump(exclude_unset=True)
     
-    # Handle password hashing if present
+    # Handle password hashing if present (on the hashing process pool)
     if 'password' in data and data['password']:
         try:
-            hashed_bytes = bcrypt.hashpw(data['password'].encode('utf-8'), bcrypt.gensalt())
-            data['password_hash'] = hashed_bytes.decode('utf-8')
+            data['password_hash'] = await hash_password(data['password'])
             del data['password']
+        except (PasswordPoolBusy, PasswordPoolUnavailable) as e:
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e), headers={"Retry-After": "1"})
         except Exception:
             raise HTTPException(status_code=500, detail="Error processing password")
             
     # Check email uniqueness if email is being updated
     if 'email' in data:
-        existing_user = get_user_by_email(data['email'])
+        existing_user = await run_in_db(get_user_by_email, data['email'])
         if existing_user and existing_user['id'] != user_id:
              raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Email already registered"
             )
 
-    updated_user = update_user(user_id, data)
+    updated_user = await run_in_db(update_user, user_id, data)
     
     if not updated_user:
         raise HTTPException(
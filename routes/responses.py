@@ -0,0 +1,27 @@
+"""
+Responses for the endpoints that return lists of despesas.
+
+With FAST_JSON_RESPONSES on (the default) the data layer's DespesaRecords are
+encoded straight to JSON bytes with orjson and returned as a Response, so FastAPI
+skips response_model validation and serialization. With it off, the same data
+goes back as dicts through the route's response_model, which makes the two
+paths easy to compare under load. The OpenAPI schema is the same either way.
+"""
+import os
+from typing import Optional, Sequence
+
+from fastapi import Response
+
+from database.records import DespesaRecord, dump_page, dump_records
+
+FAST_JSON_RESPONSES = os.getenv('FAST_JSON_RESPONSES', '1').lower() not in ('0', 'false', 'no', 'off')
+
+def despesas_response(records: Sequence[DespesaRecord], response: Response):
+    if FAST_JSON_RESPONSES:
+        return Response(content=dump_records(records), media_type="application/json")
+    return [record.to_nested() for record in records]
+
+def despesas_page_response(records: Sequence[DespesaRecord], next_cursor: Optional[str]):
+    if FAST_JSON_RESPONSES:
+        return Response(content=dump_page(records, next_cursor), media_type="application/json")
+    return {"data": [record.to_nested() for record in records], "next_cursor": next_cursor}
@@ -0,0 +1,47 @@
+from datetime import datetime
+from fastapi import APIRouter, HTTPException, Query, Response
+from typing import List
+from models.excel_schemas import RestoreRequest
+from models.schemas import DespesaResponseNested
+from database.async_operations import get_despesas_as_of, restore_despesas_as_of, create_checkpoint, get_checkpoints
+from routes.responses import despesas_response
+
+router = APIRouter(prefix="/despesas/snapshots", tags=["Snapshots"])
+
+@router.get("/as-of", response_model=List[DespesaResponseNested])
+async def despesas_as_of(response: Response, at: datetime = Query(..., description="Point in time, on the database clock")):
+    try:
+        return despesas_response(await get_despesas_as_of(at), response)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/as-of/{despesa_id}", response_model=DespesaResponseNested)
+async def despesa_as_of(despesa_id: int, at: datetime = Query(..., description="Point in time, on the database clock")):
+    try:
+        records = await get_despesas_as_of(at, [despesa_id])
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not records:
+        raise HTTPException(status_code=404, detail="Despesa não encontrada nesse momento")
+    return records[0].to_nested()
+
+@router.post("/restore")
+async def restore(request: RestoreRequest):
+    try:
+        return await restore_despesas_as_of(request.at, request.ids)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/checkpoints")
+async def checkpoints():
+    try:
+        return await get_checkpoints()
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/checkpoints", status_code=201)
+async def new_checkpoint():
+    try:
+        return await create_checkpoint()
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
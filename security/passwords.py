@@ -0,0 +1,161 @@
+"""
+Password hashing and verification on a dedicated, bounded process pool.
+
+bcrypt is CPU-bound by design, so hashpw/checkpw never run on the event loop or on
+FastAPI's request threadpool: each call is a job on a ProcessPoolExecutor of
+PASSWORD_HASH_WORKERS processes. At most PASSWORD_HASH_MAX_PENDING jobs may be
+running or queued; past that `hash_password`/`verify_password` raise
+PasswordPoolBusy straight away and the routes answer 503, so a login burst sheds
+load instead of piling up behind the pool.
+
+A worker that dies (killed for memory, crashed) leaves the executor broken for
+good: every later job fails with BrokenProcessPool. The broken executor is then
+dropped and a new one started, and the job is retried once; if that fails too
+PasswordPoolUnavailable is raised, which the routes also answer with 503.
+
+BCRYPT_ROUNDS sets the cost of new hashes (existing hashes keep their own).
+`password_pool_stats()` reports hash/verify latency (time inside the worker),
+queue wait (submit to start) and rejections.
+"""
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Optional, Tuple
+
+import bcrypt
+
+BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', '12'))
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', str(min(4, os.cpu_count() or 1))))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv('PASSWORD_HASH_MAX_PENDING', str(PASSWORD_HASH_WORKERS * 8)))
+
+if not 4 <= BCRYPT_ROUNDS <= 31:
+    raise ValueError("BCRYPT_ROUNDS must be between 4 and 31")
+
+class PasswordPoolBusy(Exception):
+    """Raised when the hashing pool already holds PASSWORD_HASH_MAX_PENDING jobs."""
+
+class PasswordPoolUnavailable(Exception):
+    """Raised when a job fails on a broken pool twice, the second time on a freshly started one."""
+
+# Worker side: module-level so the spawned processes can unpickle them.
+# Each returns (result, wall-clock start, seconds spent hashing).
+
+def _hash_job(password: bytes, rounds: int) -> Tuple[bytes, float, float]:
+    started = time.time()
+    begin = time.perf_counter()
+    hashed = bcrypt.hashpw(password, bcrypt.gensalt(rounds))
+    return hashed, started, time.perf_counter() - begin
+
+def _verify_job(password: bytes, hashed: bytes) -> Tuple[bool, float, float]:
+    started = time.time()
+    begin = time.perf_counter()
+    try:
+        matches = bcrypt.checkpw(password, hashed)
+    except ValueError:
+        # A malformed stored hash never matches
+        matches = False
+    return matches, started, time.perf_counter() - begin
+
+class _Timing:
+    __slots__ = ('count', 'total', 'max')
+
+    def __init__(self):
+        self.count, self.total, self.max = 0, 0.0, 0.0
+
+    def add(self, seconds: float) -> None:
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "total_seconds": round(self.total, 6),
+            "avg_seconds": round(self.total / self.count, 6) if self.count else 0.0,
+            "max_seconds": round(self.max, 6),
+        }
+
+_executor: Optional[ProcessPoolExecutor] = None
+_lock = threading.Lock()
+_pending = 0
+_rejected = 0
+_restarts = 0
+_timings = {"hash": _Timing(), "verify": _Timing(), "queue_wait": _Timing()}
+
+def get_password_pool() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                # spawn: the parent runs threads (DB pool, executors), which fork does not copy safely
+                _executor = ProcessPoolExecutor(
+                    max_workers=PASSWORD_HASH_WORKERS, mp_context=multiprocessing.get_context('spawn')
+                )
+    return _executor
+
+def _discard_pool(broken: ProcessPoolExecutor) -> None:
+    """Forgets a broken executor so the next job starts a new one (only once, however many jobs saw it break)."""
+    global _executor, _restarts
+    with _lock:
+        if _executor is not broken:
+            return
+        _executor = None
+        _restarts += 1
+    broken.shutdown(wait=False)
+
+def shutdown_password_pool() -> None:
+    global _executor
+    with _lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+            _executor = None
+
+async def _run(kind: str, job, *args: Any) -> Any:
+    global _pending, _rejected
+    with _lock:
+        if _pending >= PASSWORD_HASH_MAX_PENDING:
+            _rejected += 1
+            raise PasswordPoolBusy("Password hashing is busy, try again shortly")
+        _pending += 1
+    submitted = time.time()
+    try:
+        loop = asyncio.get_running_loop()
+        for attempt in range(2):
+            pool = get_password_pool()
+            try:
+                result, started, seconds = await loop.run_in_executor(pool, job, *args)
+                break
+            except BrokenProcessPool as e:
+                _discard_pool(pool)
+                if attempt:
+                    raise PasswordPoolUnavailable("Password hashing is unavailable, try again shortly") from e
+    finally:
+        with _lock:
+            _pending -= 1
+    with _lock:
+        _timings[kind].add(seconds)
+        _timings["queue_wait"].add(max(0.0, started - submitted))
+    return result
+
+async def hash_password(password: str) -> str:
+    hashed = await _run("hash", _hash_job, password.encode('utf-8'), BCRYPT_ROUNDS)
+    return hashed.decode('utf-8')
+
+async def verify_password(password: str, password_hash: str) -> bool:
+    return await _run("verify", _verify_job, password.encode('utf-8'), password_hash.encode('utf-8'))
+
+def password_pool_stats() -> Dict[str, Any]:
+    with _lock:
+        return {
+            "workers": PASSWORD_HASH_WORKERS,
+            "max_pending": PASSWORD_HASH_MAX_PENDING,
+            "pending": _pending,
+            "rejected": _rejected,
+            "restarts": _restarts,
+            "bcrypt_rounds": BCRYPT_ROUNDS,
+            **{kind: timing.as_dict() for kind, timing in _timings.items()},
+        }
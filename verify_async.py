@@ -0,0 +1,57 @@
+import asyncio
+import sys
+import time
+
+from database import batch_operations
+from routes.analytics.router_analytics import monthly_analytics, top_expenses
+
+SLOW_QUERY_SECONDS = 1.0
+
+def slow_monthly_analytics():
+    # Stands in for a blocking aggregate that holds a pymysql call for a while
+    time.sleep(SLOW_QUERY_SECONDS)
+    return {"janeiro": 100.0}
+
+def fast_top_expenses(limit: int = 10):
+    return []
+
+async def test_concurrency():
+    print("Testing that a slow query does not block the event loop...")
+
+    batch_operations.get_monthly_analytics = slow_monthly_analytics
+    batch_operations.get_top_expenses = fast_top_expenses
+
+    start = time.perf_counter()
+    finished = {}
+
+    async def timed(name, coro):
+        await coro
+        finished[name] = time.perf_counter() - start
+
+    ticks = 0
+    async def heartbeat():
+        nonlocal ticks
+        while time.perf_counter() - start < SLOW_QUERY_SECONDS:
+            ticks += 1
+            await asyncio.sleep(0.01)
+
+    await asyncio.gather(
+        timed("slow", monthly_analytics()),
+        *[timed(f"fast-{i}", top_expenses(10)) for i in range(5)],
+        heartbeat()
+    )
+
+    fast_times = [t for name, t in finished.items() if name.startswith("fast")]
+    print(f"Slow request: {finished['slow']:.3f}s, slowest fast request: {max(fast_times):.3f}s, loop ticks: {ticks}")
+
+    if max(fast_times) >= finished["slow"] or max(fast_times) > SLOW_QUERY_SECONDS / 2:
+        print("FAIL: Fast requests waited for the slow query.")
+        sys.exit(1)
+    if ticks < 10:
+        print("FAIL: Event loop was blocked while the slow query ran.")
+        sys.exit(1)
+
+    print("SUCCESS: Concurrent requests progressed while the slow query ran.")
+
+if __name__ == "__main__":
+    asyncio.run(test_concurrency())
@@ -0,0 +1,56 @@
+import os
+import sys
+import tempfile
+
+# One shared file for both caches, with a small analytics limit to force evictions
+os.environ['ANALYTICS_CACHE_BACKEND'] = 'sqlite'
+os.environ['USER_CACHE_BACKEND'] = 'sqlite'
+os.environ['ANALYTICS_CACHE_PATH'] = os.path.join(tempfile.mkdtemp(prefix='verify-cache-'), 'cache.sqlite3')
+os.environ['ANALYTICS_CACHE_MAX_ENTRIES'] = '5'
+
+from database.cache import get_cache
+from database.user_cache import get_user_cache
+
+USERS = 40
+
+def check(condition, message):
+    if not condition:
+        print(f"FAIL: {message}")
+        sys.exit(1)
+
+# Ids the user cache had to load, i.e. lookups that would have reached the database
+loads = []
+
+def load_user(user_id):
+    loads.append(user_id)
+    return {"id": user_id, "username": f"user{user_id}", "email": f"user{user_id}@example.com"}
+
+def verify_cache():
+    analytics, users = get_cache(), get_user_cache()
+    check(analytics.backend.path == users.backend.path, "the caches do not share one file")
+
+    print(f"Caching {USERS} users, then overflowing the analytics cache...")
+    for user_id in range(USERS):
+        users.by_id(user_id, lambda: load_user(user_id))
+    for n in range(20):
+        analytics.call("square", "t", lambda x: x * x, (n,), {})
+    check(analytics.backend.size() == 5, f"analytics cache holds {analytics.backend.size()} entries, limit 5")
+    check(users.backend.size() == 2 * USERS, f"user cache holds {users.backend.size()} entries after analytics evictions")
+
+    print("Lookups after the evictions...")
+    loads.clear()
+    for user_id in range(USERS):
+        check(users.by_id(user_id, lambda: load_user(user_id))['id'] == user_id, f"user {user_id}")
+    check(not loads, f"{len(loads)} user lookups went to the database")
+
+    print("Clearing one cache...")
+    analytics.backend.clear()
+    check(users.backend.size() == 2 * USERS, "clearing the analytics cache removed user entries")
+    users.clear()
+    check(users.backend.size() == 0, "user cache not cleared")
+    analytics.call("square", "t", lambda x: x * x, (3,), {})
+    check(analytics.backend.size() == 1, "analytics entry missing after clearing the user cache")
+    print("SUCCESS: Both caches share one file without evicting, clearing or counting each other's entries.")
+
+if __name__ == "__main__":
+    verify_cache()
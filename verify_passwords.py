@@ -0,0 +1,39 @@
+import asyncio
+import os
+import signal
+import sys
+
+os.environ.setdefault('BCRYPT_ROUNDS', '4')
+
+from security import passwords
+
+def check(condition, message):
+    if not condition:
+        print(f"FAIL: {message}")
+        sys.exit(1)
+
+def kill_workers():
+    """Kills every worker of the current pool, as the OOM killer would."""
+    for process in list(passwords.get_password_pool()._processes.values()):
+        os.kill(process.pid, signal.SIGKILL)
+        process.join()
+
+async def verify_passwords():
+    print("Hashing and verifying on the pool...")
+    hashed = await passwords.hash_password("s3nha")
+    check(await passwords.verify_password("s3nha", hashed), "the right password does not match")
+    check(not await passwords.verify_password("errada", hashed), "a wrong password matches")
+    check(not await passwords.verify_password("s3nha", "not-a-bcrypt-hash"), "a malformed hash matches")
+
+    print("Killing the workers...")
+    for round_number in range(1, 3):
+        kill_workers()
+        results = await asyncio.gather(*(passwords.verify_password("s3nha", hashed) for _ in range(8)))
+        check(all(results), f"verification after the workers died returned {results}")
+        check(passwords.password_pool_stats()['restarts'] == round_number,
+              f"restarts {passwords.password_pool_stats()['restarts']} after {round_number} crashes")
+    passwords.shutdown_password_pool()
+    print("SUCCESS: The hashing pool is replaced after its workers die and the jobs are retried.")
+
+if __name__ == "__main__":
+    asyncio.run(verify_passwords())
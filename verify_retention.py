@@ -0,0 +1,104 @@
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+# A short window and a small SNAPSHOT_KEEP, so the run crosses the horizon many times
+RETENTION_DAYS = 20
+SNAPSHOT_KEEP = 4
+DAYS = 50
+STEPS_PER_DAY = 3
+
+os.environ['STORAGE_BACKEND'] = 'sqlite'
+os.environ['SQLITE_PATH'] = os.path.join(tempfile.mkdtemp(prefix='verify-retention-'), 'financial_control.sqlite3')
+os.environ['SNAPSHOT_INTERVAL_SECONDS'] = '0'
+os.environ['HISTORY_RETENTION_DAYS'] = str(RETENTION_DAYS)
+os.environ['SNAPSHOT_KEEP'] = str(SNAPSHOT_KEEP)
+os.environ['HISTORY_PURGE_PAUSE_SECONDS'] = '0'
+
+from database import batch_operations as ops
+from database import connection_db as db
+from database.history import run_history_job
+
+def check(condition, message):
+    if not condition:
+        print(f"FAIL: {message}")
+        sys.exit(1)
+
+def age(hours):
+    """Moves every history entry and checkpoint `hours` into the past, as if that much time went by."""
+    connection = db.get_connection()
+    try:
+        with connection.cursor() as cursor:
+            for table, column in (('despesa_history', 'timestamp'), ('despesa_checkpoints', 'taken_at')):
+                cursor.execute(f"SELECT id, {column} AS at FROM finacias.{table}")
+                cursor.executemany(
+                    f"UPDATE finacias.{table} SET {column} = %s WHERE id = %s",
+                    [(row['at'] - timedelta(hours=hours), row['id']) for row in cursor.fetchall()]
+                )
+        connection.commit()
+    finally:
+        connection.close()
+
+def history_span():
+    connection = db.get_connection()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) AS n FROM finacias.despesa_history")
+            count = cursor.fetchone()['n']
+            # Not MIN(timestamp): SQLite only converts plain columns back to datetime
+            cursor.execute("SELECT timestamp FROM finacias.despesa_history ORDER BY timestamp, id LIMIT 1")
+            return count, cursor.fetchone()['timestamp']
+    finally:
+        connection.close()
+
+def verify_retention():
+    print(f"Simulating {DAYS} days of writes and history jobs ({RETENTION_DAYS}-day retention)...")
+    db.init_db()
+    despesa_id = db.create_despesa({"despesa": "verify-retention", "janeiro": 0})['id']
+
+    # The last value written each day and how many hours before the end of the run that was.
+    # Time moves a whole day at once, so every checkpoint stays on its calendar day.
+    written = []
+    purged_rows = dropped_checkpoints = 0
+    value = 0
+    for day in range(DAYS):
+        for _ in range(STEPS_PER_DAY):
+            value += 1
+            db.update_despesa(despesa_id, {"janeiro": value})
+            job = run_history_job(db.get_connection)
+            purged_rows += job['history_rows']
+            dropped_checkpoints += job['checkpoints']
+        written.append((value, (DAYS - day) * 24))
+        age(24)
+
+    now = datetime.now()
+    count, oldest = history_span()
+    print(f"    purged {purged_rows} history rows and {dropped_checkpoints} checkpoints; "
+          f"{count} history rows left, oldest {oldest}")
+    check(purged_rows > 0, "the retention job never deleted history")
+    # The horizon checkpoint is at most a day older than the horizon itself
+    check(oldest >= now - timedelta(days=RETENTION_DAYS + 1), f"history older than the window is left: {oldest}")
+
+    checkpoints = ops.get_checkpoints()
+    oldest_checkpoint = min(c['taken_at'] for c in checkpoints)
+    print(f"    {len(checkpoints)} checkpoints, oldest {oldest_checkpoint}")
+    check(len(checkpoints) <= SNAPSHOT_KEEP + RETENTION_DAYS + 2, f"{len(checkpoints)} checkpoints kept")
+    check(oldest_checkpoint <= now - timedelta(days=RETENTION_DAYS), "no checkpoint reaches back to the horizon")
+
+    print("Point-in-time reads across the whole window...")
+    reads = 0
+    for value, hours_ago in written:
+        at = now - timedelta(hours=hours_ago) + timedelta(hours=1)
+        if at < now - timedelta(days=RETENTION_DAYS):
+            continue
+        rows = {r.id: r for r in ops.get_despesas_as_of(at)}
+        check(despesa_id in rows and rows[despesa_id].janeiro == value,
+              f"as of {at} janeiro was {value}, read {rows.get(despesa_id)}")
+        reads += 1
+    check(reads >= RETENTION_DAYS - 1, f"only {reads} reads inside the window")
+    db.close_pool()
+    print(f"SUCCESS: Expired history is purged and {reads} point-in-time reads across the window match.")
+
+if __name__ == "__main__":
+    verify_retention()
@@ -0,0 +1,167 @@
+import re
+import sys
+from decimal import Decimal
+
+from fastapi.testclient import TestClient
+
+from database import batch_operations, connection_db
+from database.constants import MESES
+
+# Per write: at most 2 statements against the despesas table, 1 history INSERT and 2
+# for the summary (the locked read and the upsert), 5 in all
+MAX_BASE_STATEMENTS = 2
+MAX_STATEMENTS = 5
+# When a removed value was a column's minimum or maximum, the summary also scans the table for the new one
+MAX_STATEMENTS_WITH_RECOMPUTE = 6
+
+TABLES = {
+    "controle_financeira_teste": "base",
+    "despesa_history": "history",
+    "despesa_monthly_summary": "summary",
+}
+
+def stored_row(despesa_id):
+    row = {"id": despesa_id, "despesa": f"Despesa {despesa_id}"}
+    row.update({mes: Decimal("100.00") for mes in MESES})
+    row["total"] = Decimal("1200.00")
+    return row
+
+def summary_row(column, extreme):
+    # Stored rows hold 100.00 a month (1200.00 in total); with extreme=True that is also every column's minimum
+    stored = stored_row(0)[column]
+    low = stored if extreme else stored / 2
+    return {"column_name": column, "total_sum": stored * 100, "row_count": 100,
+            "min_value": low, "max_value": stored * 5}
+
+class CountingCursor:
+    """Stands in for a DictCursor: records every statement and answers with plausible rows."""
+
+    def __init__(self, log, extreme=False):
+        self.log = log
+        self.extreme = extreme
+        self.lastrowid = None
+        self._rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def _record(self, sql):
+        # The first table named in the statement (the JOIN in revert reads base and history together)
+        table = next((t for t in re.findall(r"finacias\.(\w+)", sql)), None)
+        self.log.append((TABLES.get(table, table), " ".join(sql.split())[:90]))
+
+    def execute(self, sql, params=None):
+        self._record(sql)
+        params = list(params or [])
+        self._rows = []
+        if sql.lstrip().upper().startswith("INSERT"):
+            self.lastrowid = 42
+        elif "despesa_history h" in sql:
+            self._rows = [{**stored_row(params[1]), "reverted_value": Decimal("55.50")}]
+        elif re.search(r"FROM finacias\.controle_financeira_teste WHERE id (=|IN)", sql):
+            self._rows = [stored_row(i) for i in params]
+        elif "FROM finacias.despesa_monthly_summary WHERE column_name" in sql:
+            self._rows = [summary_row(column, self.extreme) for column in params]
+        return len(self._rows)
+
+    def executemany(self, sql, seq):
+        self._record(sql)
+
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+    def fetchall(self):
+        return list(self._rows)
+
+class CountingConnection:
+    def __init__(self, log, extreme=False):
+        self.log = log
+        self.extreme = extreme
+
+    def cursor(self, cursorclass=None):
+        return CountingCursor(self.log, self.extreme)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+def count_calls(calls, log, max_base, max_total):
+    failed = False
+    for name, call in calls:
+        log.clear()
+        response = call()
+        counts = {kind: sum(1 for k, _ in log if k == kind) for kind in ("base", "history", "summary")}
+        print(f"{name:38} status={response.status_code} base={counts['base']} "
+              f"history={counts['history']} summary={counts['summary']} total={len(log)}")
+        if response.status_code >= 400:
+            print(f"FAIL: {name} returned {response.status_code}: {response.text}")
+            failed = True
+        if (max_base is not None and counts["base"] > max_base) or len(log) > max_total:
+            print(f"FAIL: {name} issued {len(log)} statements, {counts['base']} against the despesas table:")
+            for kind, sql in log:
+                print(f"    [{kind}] {sql}")
+            failed = True
+    return failed
+
+def verify_statements():
+    print("Counting statements per write endpoint...")
+    log = []
+    state = {"extreme": False}
+    connection_db.get_connection = lambda: CountingConnection(log, state["extreme"])
+    batch_operations.get_connection = lambda: CountingConnection(log, state["extreme"])
+
+    from main import app
+    client = TestClient(app)
+
+    months = {mes: 100.0 for mes in MESES}
+    calls = [
+        ("POST /despesas", lambda: client.post("/despesas", json={"despesa": "Nova", **months})),
+        ("PUT /despesas/{id}", lambda: client.put("/despesas/7", json={"janeiro": 250.0})),
+        ("DELETE /despesas/{id}", lambda: client.delete("/despesas/7")),
+        ("POST /despesas/formulas/apply", lambda: client.post("/despesas/formulas/apply", json={
+            "target_id": 7, "target_month": "janeiro", "formula": "add", "value": 10.005})),
+        ("POST /despesas/{id}/revert", lambda: client.post("/despesas/7/revert", json={"field": "janeiro", "version": 3})),
+        ("POST /despesas/formulas/apply-range", lambda: client.post("/despesas/formulas/apply-range", json={
+            "ids": [7, 8, 9], "months": ["outubro", "novembro", "dezembro"], "formula": "percentage", "value": 105})),
+        ("POST /despesas/batch/update", lambda: client.post("/despesas/batch/update", json={
+            "updates": [{"id": 7, "janeiro": 1.0}, {"id": 8, "fevereiro": 2.0}]})),
+    ]
+
+    failed = count_calls(calls, log, MAX_BASE_STATEMENTS, MAX_STATEMENTS)
+
+    print("Again, with every changed value being its column's minimum...")
+    state["extreme"] = True
+    failed = count_calls(calls, log, None, MAX_STATEMENTS_WITH_RECOMPUTE) or failed
+    state["extreme"] = False
+
+    # The returned row is the one built in memory: amounts rounded as DECIMAL(10, 2) stores them
+    log.clear()
+    body = client.post("/despesas/formulas/apply", json={
+        "target_id": 7, "target_month": "janeiro", "formula": "add", "value": 10.005}).json()
+    if body["monthly_data"]["janeiro"] != 110.01 or body["annual_total"] != 1210.01:
+        print(f"FAIL: formula response does not match the stored row: {body}")
+        failed = True
+
+    # A range formula returns every target row with the SQL arithmetic redone in memory
+    body = client.post("/despesas/formulas/apply-range", json={
+        "ids": [7, 8], "months": ["janeiro", "fevereiro"], "formula": "divide", "value": 3}).json()
+    if [(row["monthly_data"]["janeiro"], row["annual_total"]) for row in body] != [(33.33, 1066.66)] * 2:
+        print(f"FAIL: range formula response does not match the stored rows: {body}")
+        failed = True
+
+    if failed:
+        sys.exit(1)
+    print(f"SUCCESS: Every write endpoint issues at most {MAX_STATEMENTS} statements ({MAX_BASE_STATEMENTS} against the "
+          f"despesas table, {MAX_STATEMENTS_WITH_RECOMPUTE} when a summary extreme must be rescanned) "
+          "and returns the row without re-reading it.")
+
+if __name__ == "__main__":
+    verify_statements()
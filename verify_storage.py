@@ -0,0 +1,278 @@
+import argparse
+import io
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+READS = 2000
+MAX_READ_P50_MS = 1.0
+
+def check(condition, message):
+    if not condition:
+        print(f"FAIL: {message}")
+        sys.exit(1)
+
+def stored(despesa_id):
+    from database.connection_db import get_despesa_by_id
+    row = get_despesa_by_id(despesa_id)
+    check(row is not None, f"row {despesa_id} is missing")
+    return row
+
+def same(a, b):
+    """Nested rows with equal amounts (write paths answer with floats and 0.0, reads with Decimals and None)."""
+    values = lambda row: (row['id'], row['despesa'], float(row['annual_total']),
+                          {mes: round(float(v or 0), 2) for mes, v in row['monthly_data'].items()})
+    return values(a) == values(b)
+
+def check_total(row, expected=None):
+    months = row['monthly_data']
+    total = round(sum(float(v) for v in months.values() if v is not None), 2)
+    check(abs(float(row['annual_total']) - total) < 0.005, f"row {row['id']}: total {row['annual_total']} != months {total}")
+    if expected is not None:
+        check(abs(float(row['annual_total']) - expected) < 0.005, f"row {row['id']}: total {row['annual_total']} != {expected}")
+
+def all_pages(order_by='id', direction='asc', filters=None):
+    """Every row of a listing, walking the keyset pages."""
+    from database.batch_operations import paginate_expenses
+
+    records, token = [], None
+    while True:
+        page, token = paginate_expenses(order_by, direction, 2, token, filters)
+        records.extend(page)
+        if not token:
+            return records
+
+def summary_drift():
+    from database.connection_db import get_connection
+    from database.monthly_summary import check_summary_drift
+
+    connection = get_connection()
+    try:
+        with connection.cursor() as cursor:
+            return check_summary_drift(cursor)
+    finally:
+        connection.close()
+
+def skew_total(despesa_id, amount):
+    """Leaves a stored total that no longer matches its months, with the summary rebuilt to agree with the table."""
+    from database.connection_db import get_connection
+    from database.monthly_summary import rebuild_summary
+
+    connection = get_connection()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("UPDATE finacias.controle_financeira_teste SET total = total + %s WHERE id = %s", (amount, despesa_id))
+            rebuild_summary(cursor)
+        connection.commit()
+    finally:
+        connection.close()
+
+def run_suite(backend):
+    from database import batch_operations as ops
+    from database import connection_db as db
+    from database.history import purge_history, run_history_job
+    from database.user_cache import UserCache, get_user_cache
+
+    db.init_db()
+    # A second init must find every table and index in place
+    db.init_db()
+    tag = f"verify-storage-{int(time.time() * 1000)}"
+
+    print("CRUD...")
+    created = db.create_despesa({"despesa": f"{tag} aluguel", "janeiro": 100.5, "fevereiro": 200})
+    check_total(created, 300.5)
+    despesa_id = created['id']
+    check(same(stored(despesa_id), created), "read back differs from the created row")
+    updated = db.update_despesa(despesa_id, {"fevereiro": 50.25, "marco": 10})
+    check_total(updated, 160.75)
+    check(same(stored(despesa_id), updated), "read back differs from the updated row")
+    check(db.update_despesa(10 ** 9, {"janeiro": 1}) is None, "update of a missing row")
+
+    print("Batch create / update / delete...")
+    batch = ops.batch_create_despessas([{"despesa": f"{tag} lote {i}", "janeiro": i * 10.0, "abril": 1.1} for i in range(1, 6)], chunk_size=2)
+    ids = [record.id for record in batch]
+    check(len(ids) == 5 and ids == sorted(ids) and len(set(ids)) == 5, f"bulk insert ids {ids}")
+    for record in batch:
+        check_total(stored(record.id), record.total)
+    storage = ops.get_storage()
+    storage.insert_id_step = lambda cursor: 2  # the block read-back misses, so the chunk is inserted row by row
+    try:
+        fallback = ops.batch_create_despessas([{"despesa": f"{tag} lote {i}", "janeiro": 1.0} for i in (6, 7)])
+    finally:
+        del storage.insert_id_step
+    check([r.despesa for r in fallback] == [f"{tag} lote 6", f"{tag} lote 7"], f"row-by-row fallback {fallback}")
+    for record in fallback:
+        check_total(stored(record.id), record.total)
+    check(ops.batch_delete_despessas([r.id for r in fallback]) == 2, "delete of the fallback rows")
+    result = ops.batch_update_despessas([{"id": ids[0], "maio": 5.55}, {"id": ids[1], "janeiro": 0}, {"id": ids[0], "junho": 1}])
+    check({r.id: r.total for r in result} == {ids[0]: 17.65, ids[1]: 1.1}, f"batch update totals {result}")
+    for record in result:
+        check_total(stored(record.id), record.total)
+    # Every write path folds the stored row into the summary, not one with a recomputed total
+    skew_total(ids[2], 7)
+    ops.batch_update_despessas([{"id": ids[2], "maio": 1}])
+    check(not summary_drift(), "batch update with a stale stored total drifted the summary")
+
+    print("Formulas and revert...")
+    ops.apply_excel_formula(despesa_id, "janeiro", "percentage", 50, user_id=None)
+    check_total(stored(despesa_id), 110.5)
+    skew_total(ids[3], 7)
+    records = ops.apply_range_formula(["janeiro", "abril"], "divide", 3, ids=ids[2:])
+    check(not summary_drift(), "range formula with a stale stored total drifted the summary")
+    for record in records:
+        row = stored(record.id)
+        check([float(row['monthly_data'][mes]) for mes in ('janeiro', 'abril')] == [record.janeiro, record.abril],
+              f"range formula stored {row['monthly_data']} vs returned {record}")
+        check_total(row, record.total)
+    records = ops.apply_range_formula(["maio"], "add", 2.5, filters={"despesa_like": f"{tag} lote"})
+    check(len(records) == 5, f"range formula by filter touched {len(records)} rows")
+    history, _ = ops.get_despesa_history(despesa_id, "janeiro")
+    check(history and float(history[0]['old_value']) == 100.5, f"history of janeiro: {history}")
+    reverted = ops.revert_cell_value(despesa_id, "janeiro", history[0]['id'])
+    check_total(reverted, 160.75)
+    check(same(stored(despesa_id), reverted), "read back differs from the reverted row")
+
+    print("History pages...")
+    for _ in range(4):
+        ops.apply_excel_formula(despesa_id, "julho", "add", 1)
+    seen, token = [], None
+    while True:
+        page, token = ops.get_despesa_history(despesa_id, limit=3, cursor_token=token)
+        seen.extend(entry['id'] for entry in page)
+        if not token:
+            break
+    check(len(seen) == len(set(seen)) and seen == sorted(seen, reverse=True), f"history pages {seen}")
+
+    print("Listings, pages, sorting and search...")
+    mine = {record.id for record in db.get_all_despesas() if record.despesa.startswith(tag)}
+    check(mine == set(ids) | {despesa_id}, f"listing returned {mine}")
+    for order_by, direction in [('id', 'asc'), ('total', 'desc'), ('marco', 'asc')]:
+        seen = [record.id for record in all_pages(order_by, direction, {"despesa_like": tag} if order_by == 'marco' else None)]
+        check(len(seen) == len(set(seen)) and mine <= set(seen), f"pages by {order_by} {direction}: {seen}")
+    by_total = [r.total for r in all_pages('total', 'desc') if r.id in mine]
+    check(by_total == sorted(by_total, reverse=True), f"sort by total {by_total}")
+    found = {r.id for r in all_pages(filters={"despesa_like": f"{tag} lote"})}
+    check(found == set(ids), f"search found {found}")
+    check({r['id'] for r in ops.find_duplicates(f"{tag} aluguel")} == {despesa_id}, "find_duplicates")
+    check(all(r.id in mine for r in all_pages(filters={"min_total": 0.01, "despesa_like": tag})), "filter by total")
+
+    print("Analytics and summary...")
+    ops.clear_caches()
+    analytics = ops.get_monthly_analytics()
+    listing = db.get_all_despesas()
+    for index, mes in enumerate(db.MESES):
+        expected = round(sum(r.months[index] or 0 for r in listing), 2)
+        check(abs(analytics[mes] - expected) < 0.005, f"analytics {mes}: {analytics[mes]} != {expected}")
+    check(ops.get_top_expenses(1)[0].total == max(r.total for r in listing), "top expenses")
+    check(not summary_drift(), "summary drifted from the table")
+
+    print("Checkpoints, point-in-time reads and restore...")
+    checkpoint = ops.create_checkpoint()
+    check(checkpoint['row_count'] >= len(mine), f"checkpoint {checkpoint}")
+    before = {r.id: r for r in ops.get_despesas_as_of(datetime.now())}
+    check(all(before[i] == r for i, r in ((r.id, r) for r in db.get_all_despesas())), "as-of now differs from the table")
+    time.sleep(1.1)
+    mark = datetime.now()
+    time.sleep(1.1)
+    db.update_despesa(ids[0], {"dezembro": 999})
+    check(ops.batch_delete_despessas([ids[1]]) == 1, "batch delete")
+    extra = db.create_despesa({"despesa": f"{tag} nova", "janeiro": 1})
+    skew_total(ids[0], 7)
+    skew_total(extra['id'], 7)
+    restored = ops.restore_despesas_as_of(mark)
+    check(not summary_drift(), "restore with stale stored totals drifted the summary")
+    check((restored['updated'], restored['recreated'], restored['deleted']) >= (1, 1, 1), f"restore {restored}")
+    check(same(stored(ids[0]), before[ids[0]].to_nested()), "restore of an updated row")
+    check(same(stored(ids[1]), before[ids[1]].to_nested()), "restore of a deleted row")
+    check(db.get_despesa_by_id(extra['id']) is None, "restore of a created row")
+    job = run_history_job(db.get_connection)
+    check(job['checkpoint'] is not None, f"history job {job}")
+    connection = db.get_connection()
+    try:
+        purge_history(connection, retention_days=1, chunk_rows=2, pause=0)
+    finally:
+        connection.close()
+
+    print("CSV export and import...")
+    exported = "".join(ops.stream_despesas_csv(chunk_rows=2))
+    check(exported.splitlines()[0].startswith("id,despesa,janeiro"), "export header")
+    check(all(f",{tag} lote {i}," in exported for i in (1, 3, 4, 5)), "export rows")
+    csv_file = io.BytesIO(
+        ("Despesa,Jan,Fev,Mar,Abr,Mai,Jun,Jul,Ago,Set,Out,Nov,Dez\n"
+         f"{tag} import,\" R$ 1.248,81 \",\" R$ -   \",,,,,,,,,,\n").encode('utf-8')
+    )
+    report = ops.import_despesas_csv(csv_file)
+    check(report['imported_count'] == 1, f"import {report}")
+    imported = all_pages(filters={"despesa_like": f"{tag} import"})
+    check(len(imported) == 1 and imported[0].total == 1248.81, f"imported row {imported}")
+
+    print("Users...")
+    email = f"{tag}@example.com"
+    check(db.get_user_by_email(email) is None, "user exists before creation")
+    user = db.create_user_db("verify", email, "hash")
+    check(db.get_user_by_email(email)['id'] == user['id'], "user by email")
+    check('password_hash' not in db.get_user_by_email(email), "cached user carries the password hash")
+    check(db.get_user_credentials(email)['password_hash'] == "hash", "credentials")
+    load_user, loads = db._load_user, []
+    db._load_user = lambda column, value: loads.append(value) or load_user(column, value)
+    try:
+        check(db.get_user_credentials(email)['password_hash'] == "hash", "repeated credentials")
+        if os.getenv('USER_CACHE_BACKEND', 'sqlite') != 'off':
+            check(not loads, f"repeated login read the user {len(loads)} times")
+        # Another worker: same shared entries, its own hashes in memory
+        other_worker = UserCache(get_user_cache().backend)
+        check(other_worker.credentials(email, lambda: db._load_user('email', email))['password_hash'] == "hash", "other worker credentials")
+        db.update_user(user['id'], {"password_hash": "new-hash"})
+        check(db.get_user_credentials(email)['password_hash'] == "new-hash", "login reads a stale password hash")
+        loads.clear()
+        check(other_worker.credentials(email, lambda: db._load_user('email', email))['password_hash'] == "new-hash",
+              "another worker logs in with the old password hash")
+        check(loads == [email], f"login after a password change read the user {len(loads)} times")
+        check('password_hash' not in str(get_user_cache().backend.get(f"users:email:{email}")), "shared entry carries the hash")
+    finally:
+        db._load_user = load_user
+    check(db.update_user(user['id'], {"username": "renamed"})['username'] == "renamed", "update user")
+    check(db.get_user_by_id(user['id'])['username'] == "renamed", "user by id after update")
+    check(db.delete_user(user['id']) and db.get_user_by_email(email) is None, "delete user")
+
+    print("Sub-millisecond reads...")
+    for _ in range(100):
+        db.get_despesa_by_id(despesa_id)
+    timings = []
+    for _ in range(READS):
+        start = time.perf_counter()
+        db.get_despesa_by_id(despesa_id)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    p50, p99 = statistics.median(timings), timings[int(len(timings) * 0.99)]
+    print(f"    get_despesa_by_id: p50 {p50:.3f} ms, p99 {p99:.3f} ms over {READS} reads")
+    if backend == 'sqlite':
+        check(p50 < MAX_READ_P50_MS, f"p50 read latency {p50:.3f} ms on the embedded backend")
+
+    print("Cleanup...")
+    leftovers = [r.id for r in db.get_all_despesas() if r.despesa.startswith(tag)]
+    ops.batch_delete_despessas(leftovers)
+    check(not [r for r in db.get_all_despesas() if r.despesa.startswith(tag)], "cleanup left rows behind")
+    check(not summary_drift(), "summary drifted after cleanup")
+    db.close_pool()
+
+def main():
+    parser = argparse.ArgumentParser(description="Runs the data-access behavior suite against a storage backend.")
+    parser.add_argument('--backend', choices=['sqlite', 'mysql'], default='sqlite')
+    parser.add_argument('--sqlite-path', help="SQLite file (default: a fresh temporary file)")
+    args = parser.parse_args()
+
+    os.environ['STORAGE_BACKEND'] = args.backend
+    os.environ.setdefault('SNAPSHOT_INTERVAL_SECONDS', '0')
+    if args.backend == 'sqlite':
+        directory = tempfile.mkdtemp(prefix='verify-storage-')
+        os.environ['SQLITE_PATH'] = args.sqlite_path or os.path.join(directory, 'financial_control.sqlite3')
+    print(f"Running the storage behavior suite on {args.backend}...")
+    run_suite(args.backend)
+    print(f"SUCCESS: the {args.backend} backend passes the data-access behavior suite.")
+
+if __name__ == "__main__":
+    main()